@@ -1 +1,5 @@
 # This is the __init__.py file for the app module.
+from .logs import configure_logging
+
+# Every module logs under the "app" logger; set up its handler before any of them are imported
+configure_logging()
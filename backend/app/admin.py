@@ -0,0 +1,24 @@
+# This is the admin.py file for guarding the diagnostic (admin) endpoints and request flags.
+# Slow-query plans and profiles expose SQL with literal values and internals of the code, so they
+# require ADMIN_TOKEN in the X-Admin-Token header. Without ADMIN_TOKEN they are closed, unless
+# ADMIN_DEV_MODE=true (local development) or TESTING=true opens them.
+import os
+import secrets
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+ADMIN_DEV_MODE = any(os.getenv(name, "false").lower() == "true" for name in ("ADMIN_DEV_MODE", "TESTING"))
+
+
+def is_admin(token: Optional[str]) -> bool:
+    if not ADMIN_TOKEN:
+        return ADMIN_DEV_MODE
+    return secrets.compare_digest((token or "").encode(), ADMIN_TOKEN.encode())
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Route dependency for the /admin endpoints
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
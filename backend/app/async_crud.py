@@ -0,0 +1,69 @@
+# This is the async_crud.py file for CRUD operations called from async endpoints.
+# The queries live in crud, written against a sync Session. Given an AsyncSession (DATABASE_ASYNC=true)
+# they run through AsyncSession.run_sync, which drives the same ORM code over the async driver
+# without a thread. Given a plain Session they run in the threadpool, as a sync endpoint would.
+from typing import AsyncIterator, Callable, Optional, TypeVar, Union
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+T = TypeVar("T")
+
+
+async def run(db: Union[AsyncSession, Session], fn: Callable[..., T], *args, **kwargs) -> T:
+    # Calls fn(session, *args, **kwargs) without blocking the event loop
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(lambda session: fn(session, *args, **kwargs))
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+
+async def stream(db: Union[AsyncSession, Session], statement_fn: Callable, *args, batch_size: int, **kwargs) -> AsyncIterator[list]:
+    """
+    Yields the rows of the statement built by statement_fn(session, *args, **kwargs) in lists of up
+    to batch_size. The rows come from a server-side cursor (stream_results: a named cursor on
+    psycopg2, a cursor on asyncpg), so memory stays flat however many rows the statement returns.
+    """
+    options = {"stream_results": True, "yield_per": batch_size}
+    if isinstance(db, AsyncSession):
+        statement = await db.run_sync(lambda session: statement_fn(session, *args, **kwargs))
+        result = await db.stream(statement, execution_options=options)
+        try:
+            async for rows in result.partitions():
+                yield rows
+        finally:
+            await result.close()
+        return
+    statement = await run_in_threadpool(statement_fn, db, *args, **kwargs)
+    result = await run_in_threadpool(lambda: db.execute(statement, execution_options=options))
+    partitions = result.partitions()
+    try:
+        while (rows := await run_in_threadpool(next, partitions, None)) is not None:
+            yield rows
+    finally:
+        result.close()
+
+
+async def get_table_versions(db, tables: tuple[str, ...]) -> tuple[int, ...]:
+    return await run(db, crud.get_table_versions, tables)
+
+async def get_claimant_version(db, claimant_id: int) -> Optional[int]:
+    return await run(db, crud.get_claimant_version, claimant_id=claimant_id)
+
+async def get_claimant(db, claimant_id: int) -> Optional[models.Claimant]:
+    return await run(db, crud.get_claimant, claimant_id=claimant_id)
+
+async def get_services_reachable_by_claimant(db, claimant_id: int) -> list[models.Service]:
+    return await run(db, crud.get_services_reachable_by_claimant, claimant_id=claimant_id)
+
+async def get_nearest_services(db, latitude: float, longitude: float, columns: list, k: int, category: Optional[str] = None) -> list:
+    return await run(db, crud.get_nearest_services, latitude=latitude, longitude=longitude, columns=columns, k=k, category=category)
+
+async def get_services_reachable_by_claimants(db, claimant_ids: list[int], columns: list, **filters) -> tuple[dict, list]:
+    return await run(db, crud.get_services_reachable_by_claimants, claimant_ids, columns, **filters)
+
+async def get_service_tile(db, z: int, x: int, y: int, **filters) -> bytes:
+    return await run(db, crud.get_service_tile, z, x, y, **filters)
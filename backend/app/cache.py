@@ -0,0 +1,122 @@
+# This is the cache.py file for the in-process response cache of read endpoints.
+# Entries are keyed by endpoint, normalized query parameters and the change version of every
+# table the response reads (models.TableVersion). crud bumps a table's version with each write,
+# so stale entries are never looked up again; they simply age out of the LRU. The versions live
+# in the database, so a write through one worker process invalidates the caches of all of them.
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+DEFAULT_MAXSIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+DEFAULT_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+
+
+class _LeaderCancelled(Exception):
+    # Set on a flight whose leader was cancelled (e.g. its client went away); waiters take over
+    pass
+
+
+class ResponseCache:
+    """
+    An LRU cache with a per-entry time to live. get_or_compute_async coalesces concurrent misses
+    for the same key ("single flight"): the first caller computes the value while the others await
+    it, so a burst of identical requests runs one database query.
+    Errors are passed to every waiting caller and are not cached. Cancelling the leader cancels
+    only the leader: a waiter then takes over the computation.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict() # key -> (expires_at, value)
+        self._flights: dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock() # Also taken by clear() and stats(), which may run off the event loop
+        self._stats = dict.fromkeys(("hits", "misses", "coalesced", "evictions", "expirations"), 0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_compute_async(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        took_over = False
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry[0] > time.monotonic():
+                        self._entries.move_to_end(key)
+                        self._stats["hits"] += 1
+                        return entry[1]
+                    del self._entries[key]
+                    self._stats["expirations"] += 1
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = asyncio.get_running_loop().create_future()
+                    if not took_over: # Counted once per caller
+                        self._stats["misses"] += 1
+                elif not took_over:
+                    self._stats["coalesced"] += 1
+
+            if leader:
+                return await self._lead(key, flight, compute)
+            try:
+                # Shielded: a waiter being cancelled must not cancel the shared flight
+                return await asyncio.shield(flight)
+            except _LeaderCancelled:
+                took_over = True # Compute it ourselves, or wait for the waiter that got there first
+
+    async def _lead(self, key: Hashable, flight: asyncio.Future, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            flight.set_exception(_LeaderCancelled())
+            flight.exception() # Marks it retrieved, so a flight nobody waited for is not logged
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            flight.exception()
+            raise
+        else:
+            flight.set_result(value)
+            self._store(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), maxsize=self.maxsize, ttl_seconds=self.ttl_seconds)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["coalesced"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def make_key(endpoint: str, versions: tuple[int, ...], params: dict) -> tuple:
+    # Normalized: parameter order and unset (None) parameters do not matter, lists become tuples
+    normalized = tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in params.items() if value is not None
+    ))
+    return (endpoint, versions, normalized)
+
+
+# Process-wide cache used by the list endpoints in main
+response_cache = ResponseCache()
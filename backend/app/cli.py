@@ -0,0 +1,105 @@
+# This is the cli.py file for maintenance commands.
+# Usage (from the backend directory): python -m app.cli <command>
+import argparse
+import time
+
+from sqlalchemy import inspect, text
+
+from . import costs, crud, importer, models
+from .database import SessionLocal, engine
+
+
+def rebuild_reachability(args) -> None:
+    models.Base.metadata.create_all(bind=engine) # Make sure the reachability table exists
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        total = crud.rebuild_reachability(db, batch_size=args.batch_size)
+        print(f"Rebuilt claimant_service_reach: {total} rows in {time.perf_counter() - started:.2f}s")
+    finally:
+        db.close()
+
+
+def import_services(args) -> None:
+    models.Base.metadata.create_all(bind=engine)
+    file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "json")
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as stream:
+            result = importer.import_services_file(db, stream, file_format, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(
+        f"Imported {result['imported']} services ({result['failed']} failed) "
+        f"in {result['seconds']:.2f}s: {result['rows_per_second']:.0f} rows/s"
+    )
+    for error in result["errors"]:
+        print(f"  record {error['row']}: {error['error']}")
+
+
+def _add_missing_columns(table, column_names) -> None:
+    # create_all does not alter existing tables, so add columns introduced since the table was created
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as connection:
+        for name in column_names:
+            if name not in existing:
+                column_type = table.c[name].type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+                print(f"Added column {table.name}.{name}")
+        for index in table.indexes:
+            if index.columns and all(column.name in column_names for column in index.columns):
+                index.create(connection, checkfirst=True)
+
+
+def backfill_costs(args) -> None:
+    models.Base.metadata.create_all(bind=engine)
+    _add_missing_columns(models.Service.__table__, costs.COST_COLUMNS)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        total = crud.backfill_service_costs(db, batch_size=args.batch_size)
+        print(f"Parsed fees for {total} services in {time.perf_counter() - started:.2f}s")
+    finally:
+        db.close()
+
+
+def require_names(args) -> None:
+    # Tables created before names became NOT NULL: name the unnamed rows, then add the constraint,
+    # which keyset pagination by (name, id) relies on. SQLite cannot add it to an existing column.
+    with engine.begin() as connection:
+        for table in (models.Service.__table__, models.Claimant.__table__):
+            named = connection.execute(table.update().where(table.c.name.is_(None)).values(name=args.placeholder)).rowcount
+            print(f"Named {named} {table.name} rows {args.placeholder!r}")
+            if engine.dialect.name == "postgresql":
+                connection.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN name SET NOT NULL"))
+                print(f"{table.name}.name is NOT NULL")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Service Finder maintenance commands")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = subcommands.add_parser("rebuild-reachability", help="Regenerate the claimant/service reachability table")
+    rebuild.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT batch (JSON mode only)")
+    rebuild.set_defaults(func=rebuild_reachability)
+
+    import_parser = subcommands.add_parser("import-services", help="Bulk import an ORUK services dump (JSON or CSV)")
+    import_parser.add_argument("path", help="Path to the JSON or CSV file")
+    import_parser.add_argument("--format", choices=["json", "csv"], help="Defaults to the file extension")
+    import_parser.add_argument("--batch-size", type=int, default=importer.DEFAULT_BATCH_SIZE, help="Rows per batch/transaction")
+    import_parser.set_defaults(func=import_services)
+
+    backfill = subcommands.add_parser("backfill-costs", help="Parse existing services' fees into the structured cost columns")
+    backfill.add_argument("--batch-size", type=int, default=1000, help="Rows per UPDATE batch/transaction")
+    backfill.set_defaults(func=backfill_costs)
+
+    names = subcommands.add_parser("require-names", help="Name unnamed services and claimants and make name NOT NULL")
+    names.add_argument("--placeholder", default="(unnamed)", help="Name given to rows without one")
+    names.set_defaults(func=require_names)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
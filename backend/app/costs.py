@@ -0,0 +1,77 @@
+# This is the costs.py file for parsing free-text service fees into structured cost columns.
+# Service.fees stays as entered (it is what the directory publishes); is_free, min_cost, max_cost
+# and currency are derived from it on every write so cost filters can use indexes.
+import re
+from typing import Optional
+
+COST_COLUMNS = ("is_free", "min_cost", "max_cost", "currency")
+
+_FREE = re.compile(r"\b(?:free|no (?:charge|cost|fees?)|without charge)\b", re.IGNORECASE)
+
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+# Only numbers with a currency marker count as amounts, so "under 18s" or "per 30 minutes" are ignored.
+# Either a symbol/code before the number (optionally a range: "£5-10", "£5 to £10") or a unit after it ("50p").
+_AMOUNT = re.compile(
+    rf"(?:(?P<symbol>[£$€])|\b(?P<code>GBP|USD|EUR)\s?)(?P<value>{_NUMBER})"
+    rf"(?:\s*(?:-|–|to)\s*[£$€]?(?P<upper>{_NUMBER}))?"
+    rf"|(?P<bare>{_NUMBER})\s?(?P<unit>p|pence|pounds?|GBP|USD|EUR)\b",
+    re.IGNORECASE,
+)
+
+_SYMBOL_CURRENCIES = {"£": "GBP", "$": "USD", "€": "EUR"}
+
+
+def currency_code(currency: Optional[str]) -> Optional[str]:
+    # "£" -> "GBP"; codes are upper-cased
+    if not currency:
+        return None
+    currency = currency.strip()
+    return _SYMBOL_CURRENCIES.get(currency, currency.upper())
+
+
+def _number(text: str) -> float:
+    return float(text.replace(",", ""))
+
+
+def _amounts(fees: str) -> tuple[list[float], Optional[str]]:
+    amounts, currency = [], None
+    for match in _AMOUNT.finditer(fees):
+        if match.group("bare") is not None:
+            unit = match.group("unit").lower()
+            if unit in ("p", "pence"):
+                found, amount_currency = [_number(match.group("bare")) / 100], "GBP"
+            elif unit.startswith("pound"):
+                found, amount_currency = [_number(match.group("bare"))], "GBP"
+            else:
+                found, amount_currency = [_number(match.group("bare"))], unit.upper()
+        else:
+            found = [_number(match.group("value"))]
+            if match.group("upper") is not None:
+                found.append(_number(match.group("upper")))
+            amount_currency = currency_code(match.group("symbol") or match.group("code"))
+        amounts.extend(found)
+        currency = currency or amount_currency # The first currency mentioned wins
+    return amounts, currency
+
+
+def parse_fees(fees: Optional[str]) -> dict:
+    """
+    Returns the structured cost columns for a free-text fees description, for example
+    "Free" -> free, 0-0; "£5 - £10 per session" -> 5-10 GBP; "Free for under 18s, otherwise £3"
+    -> not free, 0-3 GBP. Text with neither a free mention nor an amount ("Donations welcome")
+    gives None everywhere: the cost is unknown, so cost filters leave the service out.
+    """
+    result = dict.fromkeys(COST_COLUMNS)
+    if not fees:
+        return result
+    amounts, currency = _amounts(fees)
+    mentions_free = _FREE.search(fees) is not None
+    if not amounts and not mentions_free:
+        return result
+    if mentions_free:
+        amounts.append(0.0) # The free option is the cheapest one
+    result["is_free"] = max(amounts) == 0
+    result["min_cost"] = min(amounts)
+    result["max_cost"] = max(amounts)
+    result["currency"] = currency
+    return result
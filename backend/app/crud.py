@@ -1,51 +1,301 @@
 # This is the crud.py file for CRUD operations.
+from sqlalchemy import and_, bindparam, case, delete, func, insert, null, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from typing import Optional # Import Optional
-from . import models, schemas
+from . import costs, models, pagination, schemas, tiles
+import numpy as np
+import shapely
 from shapely.geometry import Point, mapping # For creating Point and converting to GeoJSON
+from .spatial_index import EARTH_RADIUS_M, METRES_PER_DEGREE, radius_bbox, service_index
+from .text_index import NgramIndex, category_index, fees_index
+import json
+import logging
+import math
 # from shapely.ops import transform # If reprojecting, not used in simple buffer yet
 # import pyproj # For more accurate reprojection if needed, not used in simple buffer
 
+logger = logging.getLogger(__name__)
+
+
+# Table change versions (ETags and response cache keys)
+def bump_table_versions(db: Session, *tables: str) -> tuple[int, ...]:
+    # Call before committing a write, so the new version commits atomically with the change.
+    # Returns the new versions; the row stays locked until the commit, so no other write shares them.
+    upsert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    return tuple(
+        db.execute(
+            upsert(models.TableVersion)
+            .values(name=table, version=1)
+            .on_conflict_do_update(index_elements=["name"], set_={"version": models.TableVersion.version + 1})
+            .returning(models.TableVersion.version)
+        ).scalar_one()
+        for table in tables
+    )
+
+def get_table_versions(db: Session, tables: tuple[str, ...]) -> tuple[int, ...]:
+    # One primary key lookup; tables that have never been written are at version 0
+    versions = dict(db.query(models.TableVersion.name, models.TableVersion.version).filter(models.TableVersion.name.in_(tables)))
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+# In-process spatial index helpers (only used when models.USE_GEOMETRY is False)
+def _point_coordinates(location) -> Optional[tuple[float, float]]:
+    # JSON fallback stores {"type": "Point", "coordinates": [lon, lat]}
+    if not isinstance(location, dict) or location.get("type") != "Point":
+        return None
+    coordinates = location.get("coordinates") or []
+    if len(coordinates) < 2 or coordinates[0] is None or coordinates[1] is None:
+        return None
+    return float(coordinates[0]), float(coordinates[1])
+
+def _ensure_service_index(db: Session):
+    # (Re)build the index from the services table whenever the table version has moved on since
+    # the index was last brought up to date, as _ensure_text_index does. Writes from other workers,
+    # the importer, the CLI or plain SQL are only seen this way. The version is read first: rows
+    # committed after it only make the index newer, and the next lookup reloads anyway.
+    (version,) = get_table_versions(db, ("services",))
+    if service_index.loaded and service_index.version == version:
+        return service_index
+    with service_index._lock:
+        if not (service_index.loaded and service_index.version == version):
+            service_index.clear()
+            try:
+                rows = db.query(models.Service.id, models.Service.location).filter(models.Service.location.isnot(None))
+                for service_id, location in rows:
+                    point = _point_coordinates(location)
+                    if point is not None:
+                        service_index.insert(service_id, *point)
+            except Exception:
+                service_index.clear()
+                raise
+            service_index.version = version
+            service_index.loaded = True
+            logger.info("Loaded service locations into the spatial index", extra={"services": len(service_index)})
+    return service_index
+
+def warm_service_index(db: Session) -> None:
+    # Called at startup so the first spatial request does not pay for the load
+    if not models.USE_GEOMETRY:
+        _ensure_service_index(db)
+
+def _index_services(version: int, db_services=(), deleted_ids=()) -> None:
+    # Applies this process's own committed write, which moved the services table to version, to
+    # the loaded index so it need not be reloaded. Only when the index was at the version just
+    # before: otherwise another write came in between and the next lookup reloads the index.
+    if models.USE_GEOMETRY:
+        return
+    with service_index._lock:
+        if not service_index.loaded or service_index.version != version - 1:
+            return
+        for db_service in db_services:
+            point = _point_coordinates(db_service.location)
+            if point is None:
+                service_index.remove(db_service.id)
+            else:
+                service_index.insert(db_service.id, *point)
+        for service_id in deleted_ids:
+            service_index.remove(service_id)
+        service_index.version = version
+
+# In-process substring index helpers (only used when models.USE_GEOMETRY is False)
+def _ensure_text_index(db: Session, column, index: NgramIndex) -> NgramIndex:
+    # (Re)build the index from the column's distinct values whenever the services table version has
+    # moved on since the last load. Writes from other workers, the CLI or plain SQL are only seen this
+    # way, so a stale index never drops rows. The version is read first: values committed after it
+    # only make the index more complete, and the next lookup reloads anyway.
+    (version,) = get_table_versions(db, ("services",))
+    if index.loaded and index.version == version:
+        return index
+    with index._lock:
+        if not (index.loaded and index.version == version):
+            index.clear()
+            try:
+                for (value,) in db.query(column).filter(column.isnot(None)).distinct():
+                    index.add(value)
+            except Exception:
+                index.clear()
+                raise
+            index.version = version
+            index.loaded = True
+            logger.info("Loaded distinct values into the substring index", extra={"column": column.key, "values": len(index)})
+    return index
+
+def _substring_clause(db: Session, column, index: NgramIndex, substring: str):
+    # Case-insensitive partial match. PostgreSQL serves the ILIKE from the pg_trgm GIN index.
+    # In JSON mode the n-gram index finds the candidate distinct values so the column's b-tree index
+    # serves an IN, and the ILIKE is kept as the predicate on those rows. The index matches literally,
+    # so a substring with LIKE wildcards (% or _) is left to the plain ILIKE, as is one matching too
+    # many values (the scan is then no worse than the IN would be).
+    clause = column.ilike(f"%{substring}%")
+    if models.USE_GEOMETRY or "%" in substring or "_" in substring:
+        return clause
+    values = _ensure_text_index(db, column, index).search(substring)
+    if len(values) > _MAX_IDS_PER_QUERY:
+        return clause
+    return and_(column.in_(values), clause)
+
+# Default travel radius for new claimants: 5 miles
+METRES_PER_MILE = 1609.344
+DEFAULT_TRAVEL_RADIUS_M = 5.0 * METRES_PER_MILE
+
+# SQLite limits the number of bound parameters per statement, so large id lists are chunked
+_MAX_IDS_PER_QUERY = 500
+
+def _get_services_by_ids(db: Session, service_ids: list[int]) -> list[models.Service]:
+    services = []
+    for start in range(0, len(service_ids), _MAX_IDS_PER_QUERY):
+        chunk = service_ids[start:start + _MAX_IDS_PER_QUERY]
+        services.extend(db.query(models.Service).filter(models.Service.id.in_(chunk)).all())
+    services.sort(key=lambda service: service.id)
+    return services
+
+
+# Spatial filter clauses for services.
+# With PostGIS these use the GiST indexes on services.location (see models.py).
+# With the JSON fallback they use the indexed latitude/longitude columns instead.
+def _within_bbox_clause(min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+    if models.USE_GEOMETRY:
+        from sqlalchemy import func
+        envelope = func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326)
+        return func.ST_Intersects(models.Service.location, envelope)
+    return and_(
+        models.Service.latitude.between(min_lat, max_lat),
+        models.Service.longitude.between(min_lon, max_lon),
+    )
+
+def _within_radius_clauses(lon: float, lat: float, radius_m: float) -> list:
+    if models.USE_GEOMETRY:
+        from sqlalchemy import func, cast
+        from geoalchemy2 import Geography
+        # Cast matches the ix_services_location_geography expression so the index is used
+        home = cast(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326), Geography(srid=4326))
+        return [func.ST_DWithin(cast(models.Service.location, Geography(srid=4326)), home, radius_m)]
+
+    # Index-friendly bounding box first, then an equirectangular distance check on the
+    # same columns. Plain arithmetic keeps it portable (SQLite has no trig functions by default)
+    # and the error is negligible at travel-area scales.
+    min_lon, min_lat, max_lon, max_lat = radius_bbox(lon, lat, radius_m)
+    metres_per_degree_lon = METRES_PER_DEGREE * math.cos(math.radians(lat))
+    dy = (models.Service.latitude - lat) * METRES_PER_DEGREE
+    dx = (models.Service.longitude - lon) * metres_per_degree_lon
+    return [
+        _within_bbox_clause(min_lon, min_lat, max_lon, max_lat),
+        dx * dx + dy * dy <= radius_m * radius_m,
+    ]
+
+def _within_equirectangular(lon: float, lat: float, radius_m: float, point_lon: float, point_lat: float) -> bool:
+    # Python twin of the JSON-mode check in _within_radius_clauses, centred on (lon, lat)
+    metres_per_degree_lon = METRES_PER_DEGREE * math.cos(math.radians(lat))
+    dy = (point_lat - lat) * METRES_PER_DEGREE
+    dx = (point_lon - lon) * metres_per_degree_lon
+    return dx * dx + dy * dy <= radius_m * radius_m
+
 
 # Service CRUD operations
 def get_service(db: Session, service_id: int):
     return db.query(models.Service).filter(models.Service.id == service_id).first()
 
-def get_services(
+def _services_query(
     db: Session,
-    skip: int = 0,
-    limit: int = 100,
     category: Optional[str] = None,
     fees: Optional[str] = None, # Assuming 'fees' field represents cost information for now
-    # Add location filtering parameters here, e.g.,
-    # min_lat: Optional[float] = None, max_lat: Optional[float] = None,
-    # min_lon: Optional[float] = None, max_lon: Optional[float] = None,
-    # within_claimant_id: Optional[int] = None # For more complex spatial queries
+    # Bounding box filter (viewport of the map)
+    min_lat: Optional[float] = None, max_lat: Optional[float] = None,
+    min_lon: Optional[float] = None, max_lon: Optional[float] = None,
+    # Radius filter: services within radius_m metres of (near_lat, near_lon)
+    near_lat: Optional[float] = None, near_lon: Optional[float] = None,
+    radius_m: Optional[float] = None,
+    # Structured cost filters (see costs.parse_fees); services with an unknown cost are excluded
+    max_cost: Optional[float] = None, free_only: bool = False,
 ):
     query = db.query(models.Service)
 
     if category:
-        query = query.filter(models.Service.category.ilike(f"%{category}%")) # Case-insensitive partial match
+        query = query.filter(_substring_clause(db, models.Service.category, category_index, category))
 
     if fees: # This is a simple string match; real cost filtering might be numeric (e.g. <= amount)
-        query = query.filter(models.Service.fees.ilike(f"%{fees}%"))
-
-    # Placeholder for location-based filtering
-    # if min_lat is not None and max_lat is not None and min_lon is not None and max_lon is not None:
-    #     if models.USE_GEOMETRY: # Check if we are using real Geometry
-    #         from sqlalchemy import func # For ST_MakeEnvelope, ST_Within etc.
-    #         # Example: Bounding box filter (PostGIS specific)
-    #         # envelope = func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326)
-    #         # query = query.filter(func.ST_Within(models.Service.location, envelope))
-    #         pass # Implement actual spatial query here
-    #     else:
-    #         # If using JSON for location, filtering would be more complex and less efficient
-    #         # e.g., parse JSON and compare coordinates. Best to avoid complex queries on JSON.
-    #         print("Warning: Location filtering requested but using JSON fallback for location.")
-    #         pass
-
-    print(f"crud.get_services: Querying with session bound to engine: {db.get_bind()}")
-    return query.offset(skip).limit(limit).all()
+        query = query.filter(_substring_clause(db, models.Service.fees, fees_index, fees))
+
+    if free_only:
+        query = query.filter(models.Service.is_free.is_(True))
+
+    if max_cost is not None: # The cheapest option is within budget
+        query = query.filter(models.Service.min_cost <= max_cost)
+
+    if min_lat is not None and max_lat is not None and min_lon is not None and max_lon is not None:
+        query = query.filter(_within_bbox_clause(min_lon, min_lat, max_lon, max_lat))
+
+    if near_lat is not None and near_lon is not None and radius_m is not None:
+        query = query.filter(*_within_radius_clauses(near_lon, near_lat, radius_m))
+
+    return query
+
+def get_services(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    order_by: str = "id", # One of pagination.SORT_KEYS
+    after: Optional[list] = None, # Sort key of the last row of the previous page (keyset pagination)
+    columns: Optional[list] = None, # Select just these columns, as row tuples instead of ORM objects
+    **filters,
+):
+    query = _services_query(db, **filters)
+    if columns is not None:
+        query = query.with_entities(*columns)
+    query = pagination.apply_keyset(query, pagination.sort_columns(models.Service, order_by), after)
+    if after is None:
+        query = query.offset(skip) # Offset paging is kept for existing clients; cursors replace it
+    logger.debug("Querying services", extra={"order_by": order_by, "limit": limit, "filters": sorted(k for k, v in filters.items() if v is not None)})
+    return query.limit(limit).all()
+
+def get_services_export_statement(db: Session, columns: list, **filters):
+    # Every service matching the list filters, in id order; the caller streams it (see async_crud.stream)
+    return _services_query(db, **filters).with_entities(*columns).order_by(models.Service.id).statement
+
+def get_service_tile(db: Session, z: int, x: int, y: int, **filters) -> bytes:
+    """
+    The services in tile z/x/y as a Mapbox Vector Tile with one layer (tiles.LAYER) of points,
+    carrying tiles.PROPERTIES as attributes. Filters are those of get_services (category, fees,
+    max_cost, free_only). PostGIS builds the tile with ST_AsMVT; in JSON mode the points come
+    from the in-process spatial index and are encoded by tiles.encode_points.
+    """
+    min_lon, min_lat, max_lon, max_lat = tiles.tile_bounds(z, x, y, tiles.BUFFER)
+    properties = [getattr(models.Service, name) for name in tiles.PROPERTIES]
+
+    if models.USE_GEOMETRY:
+        envelope = func.ST_TileEnvelope(z, x, y)
+        geom = func.ST_AsMVTGeom(func.ST_Transform(models.Service.location, 3857), envelope, tiles.EXTENT, tiles.BUFFER, True)
+        features = (
+            _services_query(db, min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon, **filters)
+            .with_entities(geom.label("geom"), models.Service.id, *properties)
+            .subquery("features")
+        )
+        tile = db.execute(
+            select(func.ST_AsMVT(features.table_valued(), tiles.LAYER, tiles.EXTENT, "geom", "id"))
+            .where(features.c.geom.isnot(None))
+        ).scalar()
+        return bytes(tile or b"")
+
+    index = _ensure_service_index(db)
+    service_ids = index.query_bbox(min_lon, min_lat, max_lon, max_lat)
+    features = []
+    for start in range(0, len(service_ids), _MAX_IDS_PER_QUERY):
+        chunk = service_ids[start:start + _MAX_IDS_PER_QUERY]
+        rows = _services_query(db, **filters).filter(models.Service.id.in_(chunk)).with_entities(models.Service.id, *properties)
+        for service_id, *values in rows:
+            point = index.get_point(service_id)
+            if point is not None: # Deleted since the bounding box lookup
+                features.append((service_id, *tiles.tile_point(*point, z, x, y), dict(zip(tiles.PROPERTIES, values))))
+    features.sort(key=lambda feature: feature[0])
+    return tiles.encode_points(tiles.LAYER, features)
+
+def count_services(db: Session, **filters) -> int:
+    # Approximate on PostgreSQL (planner statistics), exact elsewhere
+    return pagination.estimate_count(db, _services_query(db, **filters))
 
 def create_service(db: Session, service: schemas.ServiceCreate):
     # For services with locations, you'll need to handle the conversion
@@ -53,7 +303,8 @@ def create_service(db: Session, service: schemas.ServiceCreate):
     # For JSON fallback, it would just store the JSON.
 
     # Example with new fields, still basic location handling:
-    db_service_data = service.model_dump(exclude={"latitude", "longitude"}) # Exclude lat/lon as they are not direct model fields
+    db_service_data = service.model_dump() # latitude/longitude are also stored as plain columns
+    db_service_data.update(costs.parse_fees(service.fees))
 
     location_data = None
     if service.latitude is not None and service.longitude is not None:
@@ -62,80 +313,287 @@ def create_service(db: Session, service: schemas.ServiceCreate):
             # Creating a WKT string for simplicity here.
             # Ensure srid is 4326 for consistency, though the column definition should enforce it.
             location_data = f'SRID=4326;POINT({service.longitude} {service.latitude})'
-            print(f"crud.create_service: Using WKT for location: {location_data}")
+            logger.debug("Using WKT for location", extra={"location": location_data})
         else:
             # For JSON fallback in tests
             location_data = {"type": "Point", "coordinates": [service.longitude, service.latitude]}
-            print(f"crud.create_service: Using JSON for location: {location_data}")
+            logger.debug("Using JSON for location", extra={"location": location_data})
+    else:
+        # Keep the plain columns consistent with location: both set or both empty
+        db_service_data['latitude'] = None
+        db_service_data['longitude'] = None
 
     db_service_data['location'] = location_data
 
     db_service = models.Service(**db_service_data)
     db.add(db_service)
+    db.flush() # Assigns db_service.id for the reachability rows
+    _refresh_service_reach(db, db_service)
+    (version,) = bump_table_versions(db, "services") # Invalidates cached service lists and their ETags
     db.commit()
     db.refresh(db_service)
+    _index_services(version, [db_service])
     return db_service
 
-def update_service(db: Session, service_id: int, service_update: schemas.ServiceUpdate) -> Optional[models.Service]:
-    db_service = get_service(db, service_id=service_id)
-    if not db_service:
-        return None
+def _service_location_values(latitude: Optional[float], longitude: Optional[float]) -> dict:
+    # location and the plain latitude/longitude columns, all set or all cleared
+    if latitude is None or longitude is None:
+        return {"location": None, "latitude": None, "longitude": None}
+    if models.USE_GEOMETRY:
+        location = f'SRID=4326;POINT({longitude} {latitude})'
+        logger.debug("Updating WKT for location", extra={"location": location})
+    else:
+        location = {"type": "Point", "coordinates": [longitude, latitude]}
+        logger.debug("Updating JSON for location", extra={"location": location})
+    return {"location": location, "latitude": latitude, "longitude": longitude}
+
+def _update_rows_returning(db: Session, model, row_ids: list[int], values: dict) -> list:
+    """
+    Applies the same values to every listed row with UPDATE ... RETURNING and returns the updated
+    objects; ids with no row are simply absent. The version column is bumped by hand, as the ORM
+    only does that for flushes.
+    """
+    rows = []
+    for start in range(0, len(row_ids), _MAX_IDS_PER_QUERY):
+        statement = (
+            update(model).where(model.id.in_(row_ids[start:start + _MAX_IDS_PER_QUERY]))
+            .values(**values, version=model.version + 1)
+            .returning(model)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        rows.extend(db.scalars(statement))
+    return rows
+
+def _update_returning(db: Session, model, row_id: int, values: dict):
+    # One UPDATE ... RETURNING for the row instead of SELECT, UPDATE and a refresh SELECT; None when there is no such row
+    rows = _update_rows_returning(db, model, [row_id], values)
+    return rows[0] if rows else None
+
+def _delete_rows_returning_ids(db: Session, model, reach_column, row_ids: list[int]) -> set[int]:
+    # Deletes the listed rows and their reachability rows; returns the ids that existed
+    deleted = set()
+    for start in range(0, len(row_ids), _MAX_IDS_PER_QUERY):
+        chunk = row_ids[start:start + _MAX_IDS_PER_QUERY]
+        db.execute(delete(models.ClaimantServiceReach).where(reach_column.in_(chunk)))
+        deleted.update(db.scalars(
+            delete(model).where(model.id.in_(chunk)).returning(model.id).execution_options(synchronize_session=False)
+        ))
+    return deleted
+
+def _group_by_values(items: list[tuple[int, dict]]) -> list[tuple[dict, list[int]]]:
+    # Rows getting identical changes share one set-based UPDATE: [(values, ids)] in first-seen order
+    groups = {}
+    for row_id, values in items:
+        key = json.dumps(values, sort_keys=True, default=str)
+        groups.setdefault(key, (values, []))[1].append(row_id)
+    return list(groups.values())
+
+def _delete_returning(db: Session, model, row_id: int):
+    # DELETE ... RETURNING: the removed object, or None when there was no such row
+    statement = delete(model).where(model.id == row_id).returning(model).execution_options(synchronize_session=False)
+    return db.scalars(statement).one_or_none()
+
+def _commit_detached(db: Session, obj):
+    # Commit without expiring obj, so returning it does not cost another SELECT to reload it
+    db.expunge(obj)
+    db.commit()
+    return obj
+
+def _service_update_values(service_id: int, service_update: schemas.ServiceUpdate) -> dict:
+    # Column values for a PATCH; location columns are included only when the location changes
+    values = service_update.model_dump(exclude_unset=True, exclude={"id"}) # Pydantic v2, only get provided fields
+    if 'fees' in values:
+        values.update(costs.parse_fees(values['fees']))
+
+    # Location changes only when both lat and lon are given; null in either clears it
+    moved = 'latitude' in values and 'longitude' in values
+    if moved:
+        values.update(_service_location_values(values.pop('latitude'), values.pop('longitude')))
+    elif 'latitude' in values or 'longitude' in values:
+        # If only one of lat/lon is provided, it's an invalid partial update for location; ignore it
+        values.pop('latitude', None)
+        values.pop('longitude', None)
+        logger.info("Incomplete lat/lon in update, ignoring location change", extra={"service_id": service_id})
+    return values
 
-    update_data = service_update.model_dump(exclude_unset=True) # Pydantic v2, only get provided fields
+def update_service(db: Session, service_id: int, service_update: schemas.ServiceUpdate) -> Optional[models.Service]:
+    values = _service_update_values(service_id, service_update)
+    if not values:
+        return get_service(db, service_id=service_id) # Nothing to write
 
-    # Handle location update if lat/lon are provided
-    if 'latitude' in update_data and 'longitude' in update_data:
-        lat = update_data.pop('latitude')
-        lon = update_data.pop('longitude')
-        if lat is not None and lon is not None:
-            if models.USE_GEOMETRY:
-                db_service.location = f'SRID=4326;POINT({lon} {lat})'
-                print(f"crud.update_service: Updating WKT for location: {db_service.location}")
-            else:
-                db_service.location = {"type": "Point", "coordinates": [lon, lat]}
-                print(f"crud.update_service: Updating JSON for location: {db_service.location}")
-        else: # If one is provided but not the other, or they are null, clear location? Or error?
-              # For now, if lat/lon are in update_data but null/incomplete, we could choose to clear location or ignore.
-              # Let's assume if lat/lon are present in payload, they must be valid together, or location is set to None if one is missing.
-              # If only one is provided, this logic makes it None. If both are None, it also makes it None.
-            db_service.location = None
-            print(f"crud.update_service: Lat/lon provided for update were incomplete/null, clearing location.")
-
-    elif 'latitude' in update_data or 'longitude' in update_data:
-        # If only one of lat/lon is provided, it's an invalid partial update for location.
-        # Decide behavior: ignore, error, or clear location. For now, let's ignore partial lat/lon.
-        # Or, ensure ServiceUpdate schema handles this (e.g. with a validator).
-        # Current Pydantic model doesn't enforce they must come together if one is present.
-        # We'll remove them to prevent individual application if only one is set.
-        update_data.pop('latitude', None)
-        update_data.pop('longitude', None)
-        print("crud.update_service: Incomplete lat/lon in update, ignoring location change.")
-
-
-    for key, value in update_data.items():
-        setattr(db_service, key, value)
-
-    db.add(db_service) # Not strictly necessary if db_service is already managed, but good practice.
-    db.commit()
-    db.refresh(db_service)
+    db_service = _update_returning(db, models.Service, service_id, values)
+    if db_service is None:
+        return None
+    if "location" in values:
+        _refresh_service_reach(db, db_service)
+    (version,) = bump_table_versions(db, "services")
+    _commit_detached(db, db_service)
+    _index_services(version, [db_service])
     return db_service
 
 def delete_service(db: Session, service_id: int) -> Optional[models.Service]:
-    db_service = get_service(db, service_id=service_id)
-    if not db_service:
+    # Reachability rows first: they reference the service
+    db.execute(delete(models.ClaimantServiceReach).where(models.ClaimantServiceReach.service_id == service_id))
+    db_service = _delete_returning(db, models.Service, service_id)
+    if db_service is None:
+        db.rollback()
         return None
-    db.delete(db_service)
-    db.commit()
+    (version,) = bump_table_versions(db, "services")
+    _commit_detached(db, db_service)
+    _index_services(version, deleted_ids=[service_id])
     return db_service
 
+def _existing_ids(db: Session, model, row_ids: list[int]) -> set[int]:
+    found = set()
+    for start in range(0, len(row_ids), _MAX_IDS_PER_QUERY):
+        found.update(db.scalars(select(model.id).where(model.id.in_(row_ids[start:start + _MAX_IDS_PER_QUERY]))))
+    return found
+
+def batch_update_services(db: Session, updates: list[schemas.ServiceBatchUpdate]) -> set[int]:
+    """
+    Applies a list of PATCH-style changes in one transaction and returns the ids that exist (and
+    were updated). Items with identical changes, e.g. the same new category for many services,
+    share one UPDATE ... WHERE id IN (...). The table version is bumped once for the whole batch.
+    """
+    updated, unchanged = [], []
+    for values, service_ids in _group_by_values([(item.id, _service_update_values(item.id, item)) for item in updates]):
+        if not values:
+            unchanged.extend(service_ids)
+            continue
+        rows = _update_rows_returning(db, models.Service, service_ids, values)
+        if "location" in values:
+            for db_service in rows:
+                _refresh_service_reach(db, db_service)
+        updated.extend(rows)
+    found = _existing_ids(db, models.Service, unchanged) if unchanged else set()
+    if updated:
+        (version,) = bump_table_versions(db, "services")
+        for db_service in updated:
+            db.expunge(db_service)
+    db.commit()
+    if updated:
+        _index_services(version, updated)
+    return found | {db_service.id for db_service in updated}
+
+def batch_delete_services(db: Session, service_ids: list[int]) -> set[int]:
+    # Deletes the services in one transaction with set-based DELETEs; returns the ids that existed
+    deleted = _delete_rows_returning_ids(db, models.Service, models.ClaimantServiceReach.service_id, service_ids)
+    if deleted:
+        (version,) = bump_table_versions(db, "services")
+    db.commit()
+    if deleted:
+        _index_services(version, deleted_ids=deleted)
+    return deleted
+
+def backfill_service_costs(db: Session, batch_size: int = 1000) -> int:
+    """
+    Re-parses fees into the structured cost columns for every service, one transaction per
+    batch_size rows, and returns the number of rows updated. For rows written before the
+    columns existed or by direct database edits, and after changes to costs.parse_fees.
+    """
+    table = models.Service.__table__
+    # executemany UPDATE by primary key; the version is bumped by hand as this bypasses the ORM
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("service_id"))
+        .values({**{column: bindparam(column) for column in costs.COST_COLUMNS}, "version": table.c.version + 1})
+    )
+    total, last_id = 0, 0
+    while True:
+        rows = (
+            db.query(models.Service.id, models.Service.fees)
+            .filter(models.Service.id > last_id)
+            .order_by(models.Service.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return total
+        db.execute(statement, [{"service_id": row.id, **costs.parse_fees(row.fees)} for row in rows])
+        bump_table_versions(db, "services")
+        db.commit()
+        total += len(rows)
+        last_id = rows[-1].id
+
+
+# Nearest-N services to a point, e.g. a claimant's home
+# Most candidates the JSON-mode nearest search examines (see get_nearest_services)
+MAX_NEAREST_CANDIDATES = 5000
+
+def get_nearest_services(
+    db: Session,
+    latitude: float,
+    longitude: float,
+    columns: list,
+    k: int = 10,
+    category: Optional[str] = None,
+) -> list[tuple[tuple, float]]:
+    """
+    Returns up to k (row of columns, distance in metres) pairs, closest first; columns are
+    selected for a serializer (see serializers.RowSerializer.select_columns). Services without a
+    location are ignored. Under PostGIS the KNN operator (<->) on location::geography lets the
+    GiST index return rows in distance order without a full scan; otherwise a best-first search
+    over the in-process spatial index is used.
+    """
+    if models.USE_GEOMETRY:
+        from sqlalchemy import func, cast
+        from geoalchemy2 import Geography
+        home = cast(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326), Geography(srid=4326))
+        location = cast(models.Service.location, Geography(srid=4326))
+        query = db.query(*columns, func.ST_Distance(location, home).label("distance_m")).filter(
+            models.Service.location.isnot(None)
+        )
+        if category:
+            query = query.filter(models.Service.category.ilike(f"%{category}%"))
+        return [(tuple(row)[:-1], row[-1]) for row in query.order_by(location.op("<->")(home)).limit(k)]
+
+    # Pull candidates in distance order and keep the ones that pass the filters, in batches
+    # so a category filter costs one query per batch rather than one per candidate. Batches
+    # double in size, and the search stops after MAX_NEAREST_CANDIDATES with what it has found,
+    # so a filter that matches little or nothing does not walk the whole index.
+    results = []
+    examined = 0
+    batch_size = max(k * 4, 50)
+    candidates = _ensure_service_index(db).iter_nearest(longitude, latitude)
+    while len(results) < k and examined < MAX_NEAREST_CANDIDATES:
+        batch = [candidate for _, candidate in zip(range(min(batch_size, MAX_NEAREST_CANDIDATES - examined)), candidates)]
+        if not batch:
+            break
+        examined += len(batch)
+        batch_size = min(batch_size * 2, _MAX_IDS_PER_QUERY)
+        query = db.query(models.Service.id, *columns).filter(models.Service.id.in_([service_id for _, service_id in batch]))
+        if category:
+            query = query.filter(models.Service.category.ilike(f"%{category}%"))
+        rows_by_id = {service_id: tuple(row) for service_id, *row in query}
+        for distance, service_id in batch:
+            if service_id in rows_by_id:
+                results.append((rows_by_id[service_id], distance))
+    return results[:k]
+
 
 # Claimant CRUD operations
+def get_claimant_version(db: Session, claimant_id: int) -> Optional[int]:
+    # The row version alone, for conditional GETs that must not load the row
+    return db.query(models.Claimant.version).filter(models.Claimant.id == claimant_id).scalar()
+
 def get_claimant(db: Session, claimant_id: int):
-    print(f"crud.get_claimant: Querying for claimant {claimant_id} with session bound to engine: {db.get_bind()}")
+    logger.debug("Querying claimant", extra={"claimant_id": claimant_id})
     return db.query(models.Claimant).filter(models.Claimant.id == claimant_id).first()
 
-def get_claimants(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Claimant).offset(skip).limit(limit).all()
+def get_claimants(
+    db: Session, skip: int = 0, limit: int = 100, order_by: str = "id", after: Optional[list] = None, columns: Optional[list] = None
+):
+    query = db.query(*columns) if columns is not None else db.query(models.Claimant)
+    query = pagination.apply_keyset(query, pagination.sort_columns(models.Claimant, order_by), after)
+    if after is None:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def get_claimants_export_statement(db: Session, columns: list):
+    return select(*columns).order_by(models.Claimant.id)
+
+def count_claimants(db: Session) -> int:
+    return pagination.estimate_count(db, db.query(models.Claimant))
 
 # Define a helper function to create a circular buffer
 # This function is now at the module level
@@ -154,85 +612,197 @@ def create_circular_buffer_geojson(latitude: float, longitude: float, radius_mil
     return mapping(buffer_polygon)
 
 
-def create_claimant(db: Session, claimant: schemas.ClaimantCreate):
-    # Default travel radius in miles
-    DEFAULT_TRAVEL_RADIUS_MILES = 5.0
-
-    travel_extent = create_circular_buffer_geojson(
-        claimant.home_latitude,
-        claimant.home_longitude,
-        DEFAULT_TRAVEL_RADIUS_MILES
+def create_travel_extents_geojson(latitudes, longitudes, radii_m, segments: int = 32) -> list[Optional[dict]]:
+    """
+    Geodesic travel-area polygons for many homes at once: the points radius_m metres from each
+    home along `segments` evenly spaced bearings (destination-point formula on a sphere), so the
+    area is correct in longitude at any latitude. All rings are computed with numpy broadcasting
+    and built/validated with a single Shapely array call; invalid polygons (e.g. a radius that
+    wraps a pole or the antimeridian) come back as None.
+    """
+    phi1 = np.radians(np.asarray(latitudes, dtype=float))[:, None]
+    lambda1 = np.radians(np.asarray(longitudes, dtype=float))[:, None]
+    angular_distance = (np.asarray(radii_m, dtype=float) / EARTH_RADIUS_M)[:, None]
+    bearings = np.linspace(0.0, 2 * np.pi, segments, endpoint=False)[None, :]
+
+    phi2 = np.arcsin(
+        np.sin(phi1) * np.cos(angular_distance)
+        + np.cos(phi1) * np.sin(angular_distance) * np.cos(bearings)
+    )
+    lambda2 = lambda1 + np.arctan2(
+        np.sin(bearings) * np.sin(angular_distance) * np.cos(phi1),
+        np.cos(angular_distance) - np.sin(phi1) * np.sin(phi2),
     )
+    rings = np.stack([np.degrees(lambda2), np.degrees(phi2)], axis=-1) # (n, segments, 2) as lon, lat
+    rings = np.concatenate([rings, rings[:, :1]], axis=1) # Close each ring
+
+    valid = shapely.is_valid(shapely.polygons(rings))
+    return [
+        {"type": "Polygon", "coordinates": [ring.tolist()]} if is_valid else None
+        for ring, is_valid in zip(rings, valid)
+    ]
+
+def create_travel_extent_geojson(latitude: float, longitude: float, radius_m: float, segments: int = 32) -> Optional[dict]:
+    return create_travel_extents_geojson([latitude], [longitude], [radius_m], segments=segments)[0]
+
+def get_travel_extent(db: Session, db_claimant: models.Claimant) -> Optional[dict]:
+    # Returns the claimant's travel area polygon, generating and storing it on first request
+    if db_claimant.travel_extent_geojson is None and db_claimant.travel_radius_m is not None:
+        db_claimant.travel_extent_geojson = create_travel_extent_geojson(
+            db_claimant.home_latitude, db_claimant.home_longitude, db_claimant.travel_radius_m
+        )
+        bump_table_versions(db, "claimants") # The extent is part of the claimant list response
+        db.commit()
+        db.refresh(db_claimant)
+    return db_claimant.travel_extent_geojson
+
 
+def create_claimant(db: Session, claimant: schemas.ClaimantCreate):
     db_claimant_data = claimant.model_dump()
-    db_claimant_data['travel_extent_geojson'] = travel_extent
+    if db_claimant_data['travel_radius_m'] is None:
+        db_claimant_data['travel_radius_m'] = DEFAULT_TRAVEL_RADIUS_M
+    # The travel_extent_geojson polygon is generated lazily when the map asks for it
 
     db_claimant = models.Claimant(**db_claimant_data)
-    # db_claimant = models.Claimant(
-    #     name=claimant.name,
-    #     home_latitude=claimant.home_latitude,
-    #     home_longitude=claimant.home_longitude,
-    #     travel_extent_geojson=travel_extent
-    # )
     db.add(db_claimant)
+    db.flush() # Assigns db_claimant.id for the reachability rows
+    _refresh_claimant_reach(db, db_claimant)
+    bump_table_versions(db, "claimants")
     db.commit()
     db.refresh(db_claimant)
     return db_claimant
 
-def update_claimant(db: Session, claimant_id: int, claimant_update: schemas.ClaimantUpdate) -> Optional[models.Claimant]:
-    db_claimant = get_claimant(db, claimant_id=claimant_id)
-    if not db_claimant:
-        return None
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}" for e in error.errors())
 
-    update_data = claimant_update.model_dump(exclude_unset=True)
-
-    recalculate_extent = False
-    if "home_latitude" in update_data and db_claimant.home_latitude != update_data["home_latitude"]:
-        setattr(db_claimant, "home_latitude", update_data["home_latitude"])
-        recalculate_extent = True
-    if "home_longitude" in update_data and db_claimant.home_longitude != update_data["home_longitude"]:
-        setattr(db_claimant, "home_longitude", update_data["home_longitude"])
-        recalculate_extent = True
-
-    if "name" in update_data:
-        setattr(db_claimant, "name", update_data["name"])
-
-    if recalculate_extent:
-        # Default travel radius in miles (should ideally be configurable or part of update payload)
-        DEFAULT_TRAVEL_RADIUS_MILES = 5.0
-        new_extent = create_circular_buffer_geojson(
-            db_claimant.home_latitude, # Use the potentially updated lat/lon
-            db_claimant.home_longitude,
-            DEFAULT_TRAVEL_RADIUS_MILES
-        )
-        db_claimant.travel_extent_geojson = new_extent
-        print(f"crud.update_claimant: Recalculated travel_extent_geojson: {new_extent}")
+def bulk_create_claimants(db: Session, claimant_rows: list, batch_size: int = 500) -> tuple[list[int], list[dict]]:
+    """
+    Creates claimants from raw rows (dicts from JSON or CSV) in batches of batch_size, one
+    transaction per batch. Returns the created ids and a list of {"row": n, "error": msg} for the
+    rows that failed (1-based row numbers); a bad row never aborts the rest of its batch.
+    """
+    created_ids, errors = [], []
+    for start in range(0, len(claimant_rows), batch_size):
+        batch = []
+        for row_number, raw in enumerate(claimant_rows[start:start + batch_size], start=start + 1):
+            try:
+                batch.append((row_number, schemas.ClaimantCreate.model_validate(raw)))
+            except ValidationError as e:
+                errors.append({"row": row_number, "error": _validation_message(e)})
+        if batch:
+            created_ids.extend(_insert_claimant_batch(db, batch, errors))
+    errors.sort(key=lambda error: error["row"])
+    return created_ids, errors
+
+def _insert_claimant_batch(db: Session, batch: list, errors: list) -> list[int]:
+    values = [claimant.model_dump() for _, claimant in batch]
+    for value in values:
+        if value["travel_radius_m"] is None:
+            value["travel_radius_m"] = DEFAULT_TRAVEL_RADIUS_M
+    # Onboarded caseloads go straight to the map, so build every extent now in one array operation
+    extents = create_travel_extents_geojson(
+        [v["home_latitude"] for v in values], [v["home_longitude"] for v in values], [v["travel_radius_m"] for v in values]
+    )
+    for value, extent in zip(values, extents):
+        value["travel_extent_geojson"] = extent
 
-    db.add(db_claimant)
-    db.commit()
-    db.refresh(db_claimant)
-    return db_claimant
+    try:
+        # executemany INSERT ... RETURNING: one round trip for the whole batch
+        claimant_ids = list(db.scalars(
+            insert(models.Claimant).returning(models.Claimant.id, sort_by_parameter_order=True), values
+        ))
+        _insert_claimants_reach(db, claimant_ids)
+        bump_table_versions(db, "claimants")
+        db.commit()
+        return claimant_ids
+    except SQLAlchemyError as e:
+        db.rollback()
+        if len(batch) == 1:
+            errors.append({"row": batch[0][0], "error": str(getattr(e, "orig", e))})
+            return []
+        # Retry row by row to isolate the rows the database rejected
+        claimant_ids = []
+        for item in batch:
+            claimant_ids.extend(_insert_claimant_batch(db, [item], errors))
+        return claimant_ids
+
+_TRAVEL_COLUMNS = ("home_latitude", "home_longitude", "travel_radius_m")
+
+def _claimant_update_values(claimant_update: schemas.ClaimantUpdate) -> dict:
+    values = claimant_update.model_dump(exclude_unset=True, exclude={"id"})
+    if values.get("travel_radius_m", 0) is None:
+        del values["travel_radius_m"] # A null radius leaves the current one
+    return values
+
+def _with_extent_reset(values: dict) -> dict:
+    travel_values = {name: values[name] for name in _TRAVEL_COLUMNS if name in values}
+    if not travel_values:
+        return values
+    # Drop the cached polygon only if the home or radius actually changes; it is regenerated
+    # from the new values when next requested. Decided in the UPDATE, so no prior SELECT is needed.
+    changed = or_(*(getattr(models.Claimant, name).is_distinct_from(value) for name, value in travel_values.items()))
+    return dict(values, travel_extent_geojson=case((changed, null()), else_=models.Claimant.travel_extent_geojson))
+
+def update_claimant(db: Session, claimant_id: int, claimant_update: schemas.ClaimantUpdate) -> Optional[models.Claimant]:
+    values = _claimant_update_values(claimant_update)
+    if not values:
+        return get_claimant(db, claimant_id=claimant_id) # Nothing to write
+
+    db_claimant = _update_returning(db, models.Claimant, claimant_id, _with_extent_reset(values))
+    if db_claimant is None:
+        return None
+    if any(name in values for name in _TRAVEL_COLUMNS):
+        _refresh_claimant_reach(db, db_claimant)
+    bump_table_versions(db, "claimants")
+    return _commit_detached(db, db_claimant)
 
 def delete_claimant(db: Session, claimant_id: int) -> Optional[models.Claimant]:
-    db_claimant = get_claimant(db, claimant_id=claimant_id)
-    if not db_claimant:
+    db.execute(delete(models.ClaimantServiceReach).where(models.ClaimantServiceReach.claimant_id == claimant_id))
+    db_claimant = _delete_returning(db, models.Claimant, claimant_id)
+    if db_claimant is None:
+        db.rollback()
         return None
-    db.delete(db_claimant)
+    bump_table_versions(db, "claimants")
+    return _commit_detached(db, db_claimant)
+
+def batch_update_claimants(db: Session, updates: list[schemas.ClaimantBatchUpdate]) -> set[int]:
+    # As batch_update_services: grouped set-based UPDATEs, one transaction, one version bump
+    updated, unchanged = [], []
+    for values, claimant_ids in _group_by_values([(item.id, _claimant_update_values(item)) for item in updates]):
+        if not values:
+            unchanged.extend(claimant_ids)
+            continue
+        rows = _update_rows_returning(db, models.Claimant, claimant_ids, _with_extent_reset(values))
+        if any(name in values for name in _TRAVEL_COLUMNS):
+            for db_claimant in rows:
+                _refresh_claimant_reach(db, db_claimant)
+        updated.extend(rows)
+    found = _existing_ids(db, models.Claimant, unchanged) if unchanged else set()
+    if updated:
+        bump_table_versions(db, "claimants")
     db.commit()
-    return db_claimant
+    return found | {db_claimant.id for db_claimant in updated}
+
+def batch_delete_claimants(db: Session, claimant_ids: list[int]) -> set[int]:
+    deleted = _delete_rows_returning_ids(db, models.Claimant, models.ClaimantServiceReach.claimant_id, claimant_ids)
+    if deleted:
+        bump_table_versions(db, "claimants")
+    db.commit()
+    return deleted
 
 
 # For US6: Get services within a given GeoJSON geometry
 def get_services_within_geojson(db: Session, geometry_filter: dict) -> list[models.Service]:
     """
     Retrieves services that are geographically within the provided GeoJSON geometry.
-    This implementation assumes PostGIS with ST_GeomFromGeoJSON and ST_Within.
+    With PostGIS this uses ST_GeomFromGeoJSON and ST_Within; with the JSON fallback for
+    location it uses the in-process spatial index (bounding box filter, then exact polygon test).
     """
     if not models.USE_GEOMETRY: # models.USE_GEOMETRY is True if not TESTING or if USE_GEOMETRY_FOR_TESTS is true
-        print("Warning: get_services_within_geojson called in an environment where USE_GEOMETRY is False (e.g., testing with JSON fallback). Spatial query will be skipped and return no results.")
-        # Fallback: return an empty list, as JSON querying for spatial containment is complex and inefficient.
-        # For a real test of this function, a PostGIS database would be required.
-        return []
+        service_ids = _ensure_service_index(db).query_geojson(geometry_filter)
+        if not service_ids:
+            return []
+        return _get_services_by_ids(db, service_ids)
 
     from sqlalchemy import func # For ST_GeomFromGeoJSON, ST_SetSRID, ST_Within
     import json # To convert dict to JSON string for ST_GeomFromGeoJSON
@@ -251,8 +821,167 @@ def get_services_within_geojson(db: Session, geometry_filter: dict) -> list[mode
             func.ST_Within(models.Service.location, filter_geom)
         )
         return query.all()
-    except Exception as e:
-        print(f"Error in get_services_within_geojson: {e}")
+    except Exception:
+        logger.exception("Error in get_services_within_geojson")
         # Depending on how robust you want this, you might raise the error
         # or return an empty list / specific error response.
         return []
+
+
+# Claimant <-> service reachability (materialized in models.ClaimantServiceReach).
+# A service is reachable when it is within travel_radius_m of the claimant's home.
+
+# Key of the PostgreSQL advisory lock that serializes reachability maintenance
+REACH_LOCK_KEY = 0x5EAC4
+
+def _lock_reachability(db: Session) -> None:
+    """
+    Each side's incremental maintenance only sees rows the other side has committed, so under READ
+    COMMITTED a claimant and a service written concurrently would each miss the other and never get
+    their pair. A transaction-scoped advisory lock, held until commit, serializes the maintenance:
+    whichever transaction takes it second sees the first one's row. SQLite serializes writers anyway.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(REACH_LOCK_KEY)))
+
+def _services_within_travel_radius_ids(db: Session, db_claimant) -> list[int]:
+    if db_claimant.travel_radius_m is None or db_claimant.home_latitude is None or db_claimant.home_longitude is None:
+        return []
+    rows = db.query(models.Service.id).filter(
+        *_within_radius_clauses(db_claimant.home_longitude, db_claimant.home_latitude, db_claimant.travel_radius_m)
+    )
+    return [service_id for (service_id,) in rows]
+
+def _claimants_reaching_point_ids(db: Session, latitude: float, longitude: float) -> list[int]:
+    # Only claimants whose home is within the largest travel radius can reach the point
+    max_radius_m = db.query(func.max(models.Claimant.travel_radius_m)).scalar()
+    if max_radius_m is None:
+        return []
+    min_lon, min_lat, max_lon, max_lat = radius_bbox(longitude, latitude, max_radius_m)
+    candidates = db.query(models.Claimant.id).filter(
+        models.Claimant.home_latitude.between(min_lat, max_lat),
+        models.Claimant.home_longitude.between(min_lon, max_lon),
+    )
+    if models.USE_GEOMETRY:
+        from sqlalchemy import cast
+        from geoalchemy2 import Geography
+        home = cast(func.ST_SetSRID(func.ST_MakePoint(models.Claimant.home_longitude, models.Claimant.home_latitude), 4326), Geography(srid=4326))
+        point = cast(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326), Geography(srid=4326))
+        return [claimant_id for (claimant_id,) in candidates.filter(func.ST_DWithin(point, home, models.Claimant.travel_radius_m))]
+
+    candidates = candidates.with_entities(
+        models.Claimant.id, models.Claimant.home_longitude, models.Claimant.home_latitude, models.Claimant.travel_radius_m
+    ).filter(models.Claimant.travel_radius_m.isnot(None))
+    return [
+        claimant_id for claimant_id, home_lon, home_lat, radius_m in candidates
+        if _within_equirectangular(home_lon, home_lat, radius_m, longitude, latitude)
+    ]
+
+def _insert_reach_rows(db: Session, rows: list[dict]) -> None:
+    for start in range(0, len(rows), _MAX_IDS_PER_QUERY):
+        db.execute(insert(models.ClaimantServiceReach), rows[start:start + _MAX_IDS_PER_QUERY])
+
+def _refresh_service_reach(db: Session, db_service: models.Service) -> None:
+    # Replace the rows for one service; leaves every other row untouched
+    _lock_reachability(db)
+    db.execute(delete(models.ClaimantServiceReach).where(models.ClaimantServiceReach.service_id == db_service.id))
+    if db_service.latitude is None or db_service.longitude is None:
+        return
+    claimant_ids = _claimants_reaching_point_ids(db, db_service.latitude, db_service.longitude)
+    _insert_reach_rows(db, [{"claimant_id": claimant_id, "service_id": db_service.id} for claimant_id in claimant_ids])
+
+def _refresh_claimant_reach(db: Session, db_claimant: models.Claimant) -> None:
+    # Replace the rows for one claimant; leaves every other row untouched
+    _lock_reachability(db)
+    db.execute(delete(models.ClaimantServiceReach).where(models.ClaimantServiceReach.claimant_id == db_claimant.id))
+    service_ids = _services_within_travel_radius_ids(db, db_claimant)
+    _insert_reach_rows(db, [{"claimant_id": db_claimant.id, "service_id": service_id} for service_id in service_ids])
+
+def _reach_pairs_select(claimant_ids: Optional[list[int]] = None):
+    # PostGIS only: (claimant_id, service_id) for every service within each claimant's travel radius
+    from sqlalchemy import select, cast
+    from geoalchemy2 import Geography
+    home = cast(func.ST_SetSRID(func.ST_MakePoint(models.Claimant.home_longitude, models.Claimant.home_latitude), 4326), Geography(srid=4326))
+    pairs = select(models.Claimant.id, models.Service.id).join(
+        models.Service,
+        func.ST_DWithin(cast(models.Service.location, Geography(srid=4326)), home, models.Claimant.travel_radius_m),
+    )
+    if claimant_ids is not None:
+        pairs = pairs.where(models.Claimant.id.in_(claimant_ids))
+    return pairs
+
+def _insert_claimants_reach(db: Session, claimant_ids: list[int]) -> None:
+    # Reachability rows for newly inserted claimants (no existing rows to replace)
+    if not claimant_ids:
+        return
+    _lock_reachability(db)
+    if models.USE_GEOMETRY:
+        db.execute(insert(models.ClaimantServiceReach).from_select(["claimant_id", "service_id"], _reach_pairs_select(claimant_ids)))
+        return
+    claimants = db.query(
+        models.Claimant.id, models.Claimant.home_latitude, models.Claimant.home_longitude, models.Claimant.travel_radius_m
+    ).filter(models.Claimant.id.in_(claimant_ids)).all()
+    rows = []
+    for claimant in claimants:
+        rows.extend({"claimant_id": claimant.id, "service_id": service_id} for service_id in _services_within_travel_radius_ids(db, claimant))
+    _insert_reach_rows(db, rows)
+
+def get_services_reachable_by_claimant(db: Session, claimant_id: int) -> list[models.Service]:
+    # Indexed read of the materialized reachability rows (primary key prefix on claimant_id)
+    return (
+        db.query(models.Service)
+        .join(models.ClaimantServiceReach, models.ClaimantServiceReach.service_id == models.Service.id)
+        .filter(models.ClaimantServiceReach.claimant_id == claimant_id)
+        .order_by(models.Service.id)
+        .all()
+    )
+
+def get_services_reachable_by_claimants(db: Session, claimant_ids: list[int], columns: list, **filters) -> tuple[dict, list]:
+    """
+    For a caseload: returns {claimant_id: travel_radius_m} for the claimants that exist, and a
+    (claimant_id, *columns) row for every reachable service, ordered by claimant then service.
+    The rows come from one join of the reachability table with services, however many claimants
+    there are; filters are those of get_services (category, fees, max_cost, free_only, ...).
+    """
+    radii = dict(db.query(models.Claimant.id, models.Claimant.travel_radius_m).filter(models.Claimant.id.in_(claimant_ids)))
+    rows = (
+        _services_query(db, **filters)
+        .join(models.ClaimantServiceReach, models.ClaimantServiceReach.service_id == models.Service.id)
+        .filter(models.ClaimantServiceReach.claimant_id.in_(claimant_ids))
+        .with_entities(models.ClaimantServiceReach.claimant_id, *columns)
+        .order_by(models.ClaimantServiceReach.claimant_id, models.Service.id)
+        .all()
+    )
+    return radii, rows
+
+def rebuild_reachability(db: Session, batch_size: int = 1000) -> int:
+    """
+    Regenerates the whole claimant_service_reach table in one transaction and returns the
+    number of rows written. Use after bulk loads or direct database edits that bypass crud
+    (`python -m app.cli rebuild-reachability`).
+    """
+    _lock_reachability(db)
+    db.execute(delete(models.ClaimantServiceReach))
+    if models.USE_GEOMETRY:
+        # One set-based spatial join; the GiST index on location::geography drives it
+        result = db.execute(
+            insert(models.ClaimantServiceReach).from_select(["claimant_id", "service_id"], _reach_pairs_select())
+        )
+        total = result.rowcount
+    else:
+        total = 0
+        rows = []
+        claimants = db.query(
+            models.Claimant.id, models.Claimant.home_latitude, models.Claimant.home_longitude, models.Claimant.travel_radius_m
+        ).all()
+        for claimant in claimants:
+            rows.extend({"claimant_id": claimant.id, "service_id": service_id} for service_id in _services_within_travel_radius_ids(db, claimant))
+            if len(rows) >= batch_size:
+                _insert_reach_rows(db, rows)
+                total += len(rows)
+                rows = []
+        _insert_reach_rows(db, rows)
+        total += len(rows)
+    bump_table_versions(db, "claimant_service_reach")
+    db.commit()
+    return total
@@ -1,8 +1,15 @@
 # This is the database.py file for database configuration.
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from fastapi import Request, Response
+from typing import Optional
+import bisect
+import logging
 import os
+import threading
+import time
 
 #SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db" # For SQLite
 # Use TEST_DATABASE_URL if running in test mode, otherwise use DATABASE_URL
@@ -10,6 +17,8 @@ import os
 from sqlalchemy import event # Add event
 import platform # To check OS for SpatiaLite extension path
 
+logger = logging.getLogger(__name__)
+
 TESTING = os.getenv("TESTING", "false").lower() == "true"
 if TESTING:
     # Use a named in-memory SQLite for the app's engine during testing, with shared cache
@@ -49,7 +58,7 @@ if TESTING:
         try:
             # Check if enable_load_extension is available
             if not hasattr(dbapi_conn, 'enable_load_extension'):
-                print("Warning: dbapi_conn does not support enable_load_extension. SpatiaLite may not load.")
+                logger.warning("dbapi_conn does not support enable_load_extension. SpatiaLite may not load.")
                 # Try loading directly if enable_load_extension is not present or needed by this sqlite3 version
                 # This path is less likely to succeed if enable_load_extension=False by default
             else:
@@ -59,36 +68,233 @@ if TESTING:
             for ext_path in possible_ext_paths:
                 try:
                     cursor.execute(f"SELECT load_extension('{ext_path}')")
-                    print(f"Successfully loaded SpatiaLite extension: {ext_path} (for app.database.engine)")
+                    logger.info("Loaded SpatiaLite extension", extra={"extension": ext_path})
                     loaded = True
                     break # Stop trying if one path works
                 except Exception as e_load:
-                    print(f"Failed to load SpatiaLite extension from {ext_path}: {e_load} (for app.database.engine)")
+                    logger.debug("Failed to load SpatiaLite extension", extra={"extension": ext_path, "error": str(e_load)})
 
             if not loaded:
-                 print("SpatiaLite extension could not be loaded for app.database.engine. Spatial features may be limited or fail.")
+                 logger.warning("SpatiaLite extension could not be loaded for app.database.engine. Spatial features may be limited or fail.")
 
             # Re-disable if it was enabled and if possible (though usually left enabled for session)
             # if hasattr(dbapi_conn, 'enable_load_extension'):
             #     dbapi_conn.enable_load_extension(False)
 
         except Exception as e:
-            print(f"General error during SpatiaLite loading for app.database.engine: {e}")
+            logger.warning("General error during SpatiaLite loading for app.database.engine", extra={"error": str(e)})
         finally:
             cursor.close()
-else:
+
+
+# Connection pool settings for PostgreSQL engines (SQLite engines keep SQLAlchemy's defaults)
+POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT_SECONDS = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+POOL_RECYCLE_SECONDS = int(os.getenv("DATABASE_POOL_RECYCLE", "1800")) # Under typical server/proxy idle timeouts
+POOL_PRE_PING = os.getenv("DATABASE_POOL_PRE_PING", "true").lower() == "true"
+STATEMENT_TIMEOUT_MS = int(os.getenv("DATABASE_STATEMENT_TIMEOUT_MS", "0")) # 0 = no limit
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolMetrics:
+    """
+    How long requests wait to check a connection out of the pool. A pool that is too small for
+    the traffic shows up here long before it causes pool timeouts. The wait includes opening a
+    new connection when the pool grows into its overflow.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._buckets = [0] * (len(WAIT_BUCKETS) + 1) # The last one counts waits above every bound
+
+    def record(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            self._buckets[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            buckets, running = {}, 0
+            for bound, count in zip(WAIT_BUCKETS, self._buckets):
+                running += count
+                buckets[str(bound)] = running # Cumulative, as in a Prometheus histogram
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_buckets": buckets,
+            }
+
+
+class _TimedCheckout:
+    # Times QueuePool._do_get, where a checkout blocks when every connection is in use
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # dispose() and invalidation replace the pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class AsyncTimedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, async_driver: bool = False) -> dict:
+    # create_engine / create_async_engine keyword arguments for the configured pool
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    options = {
+        "poolclass": AsyncTimedQueuePool if async_driver else TimedQueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT_SECONDS,
+        "pool_recycle": POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": POOL_PRE_PING,
+    }
+    if STATEMENT_TIMEOUT_MS > 0:
+        # Set per connection, so a runaway query is cancelled by the server rather than holding a pooled connection
+        if async_driver:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+if not TESTING:
     SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/servicedb")
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replica (DATABASE_READ_URL). GET requests read from it, everything else goes to the
+# primary. After a write the client is pinned to the primary for READ_STICKY_SECONDS via a cookie,
+# so it reads its own writes even while the replica is still catching up.
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("DATABASE_READ_URL")
+READ_STICKY_SECONDS = float(os.getenv("DATABASE_READ_STICKY_SECONDS", "5"))
+READ_STICKY_COOKIE = "db_primary_until"
+_READ_METHODS = ("GET", "HEAD")
+
+if SQLALCHEMY_READ_DATABASE_URL:
+    read_engine = create_engine(SQLALCHEMY_READ_DATABASE_URL, **engine_options(SQLALCHEMY_READ_DATABASE_URL))
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+else:
+    read_engine, ReadSessionLocal = engine, None
+
+# Optional async engine for the read endpoints (DATABASE_ASYNC=true): asyncpg for PostgreSQL,
+# aiosqlite for SQLite. Requests then wait on the database in the event loop instead of each
+# holding a threadpool thread for the whole round trip.
+ASYNC_DATABASE = os.getenv("DATABASE_ASYNC", "false").lower() == "true"
+_ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_database_url(url: str) -> str:
+    # Same database, async driver: postgresql[+psycopg2]:// -> postgresql+asyncpg://
+    parsed = make_url(url)
+    return parsed.set(drivername=_ASYNC_DRIVERS[parsed.get_backend_name()]).render_as_string(hide_password=False)
+
+AsyncReadSessionLocal = None
+if ASYNC_DATABASE:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    async_engine = create_async_engine(
+        async_database_url(SQLALCHEMY_DATABASE_URL), **engine_options(SQLALCHEMY_DATABASE_URL, async_driver=True)
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    if SQLALCHEMY_READ_DATABASE_URL:
+        async_read_engine = create_async_engine(
+            async_database_url(SQLALCHEMY_READ_DATABASE_URL),
+            **engine_options(SQLALCHEMY_READ_DATABASE_URL, async_driver=True)
+        )
+        AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+
+def use_primary_db(request: Request):
+    # Route dependency for GET endpoints that write (e.g. storing a lazily computed travel extent).
+    # Listed in the decorator's dependencies, so it runs before get_db.
+    request.state.primary_db = True
+
+
+def _use_replica(request: Optional[Request], response: Optional[Response]) -> bool:
+    """
+    Whether this request's session should come from the read replica. Requests that may write
+    go to the primary and pin the client to it for READ_STICKY_SECONDS; a GET from a pinned
+    client also goes to the primary. Outside a request (request is None) it is always the primary.
+    """
+    if request is None:
+        return False
+    if request.method not in _READ_METHODS:
+        if response is not None:
+            response.set_cookie(
+                READ_STICKY_COOKIE, f"{time.time() + READ_STICKY_SECONDS:.3f}",
+                max_age=max(1, int(READ_STICKY_SECONDS)), httponly=True, samesite="lax",
+            )
+        return False
+    if getattr(request.state, "primary_db", False):
+        return False
+    try:
+        return float(request.cookies.get(READ_STICKY_COOKIE, 0)) < time.time()
+    except ValueError:
+        return True # A mangled cookie just loses its stickiness
+
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request = None, response: Response = None):
+    use_replica = ReadSessionLocal is not None and _use_replica(request, response)
+    db = ReadSessionLocal() if use_replica else SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+# Dependency to get an async DB session (only when ASYNC_DATABASE is enabled)
+async def get_async_db(request: Request = None, response: Response = None):
+    use_replica = AsyncReadSessionLocal is not None and _use_replica(request, response)
+    async with (AsyncReadSessionLocal() if use_replica else AsyncSessionLocal()) as db:
+        yield db
+
+
+def pool_stats() -> dict:
+    # Checkout wait metrics and current state of every timed pool in this worker process
+    engines = {"primary": engine, "replica": read_engine if ReadSessionLocal is not None else None}
+    if ASYNC_DATABASE:
+        engines["primary_async"] = async_engine.sync_engine
+        engines["replica_async"] = async_read_engine.sync_engine if AsyncReadSessionLocal is not None else None
+    stats = {}
+    for name, pool_engine in engines.items():
+        pool = pool_engine.pool if pool_engine is not None else None
+        if isinstance(pool, _TimedCheckout):
+            stats[name] = dict(
+                pool.metrics.snapshot(), size=pool.size(), checked_out=pool.checkedout(), overflow=max(0, pool.overflow())
+            )
+    return stats
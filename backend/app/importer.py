@@ -0,0 +1,285 @@
+# This is the importer.py file for bulk Open Referral UK (ORUK) service imports.
+# Records are stream-parsed from JSON or CSV and written in batches, so memory use is bounded by
+# the batch size rather than the size of the directory dump.
+import csv
+import io
+import json
+import re
+import time
+from typing import IO, Iterator, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import costs, crud, models
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100 # Only the first errors are returned; the count covers all of them
+_READ_CHUNK_SIZE = 64 * 1024
+
+# Columns written by the importer, in COPY order
+_SERVICE_COLUMNS = [
+    "name", "description", "url", "email", "fees", "category",
+    "is_free", "min_cost", "max_cost", "currency",
+    "latitude", "longitude", "location",
+]
+
+
+# --- Stream parsers -------------------------------------------------------------------------
+
+def iter_json_records(stream: IO[bytes]) -> Iterator[dict]:
+    """
+    Yields the objects of a JSON array one at a time without loading the whole document.
+    Accepts a top-level array, or an ORUK API page object whose records are under "content".
+    """
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(stream, encoding="utf-8-sig")
+    buffer = ""
+
+    def fill() -> bool:
+        nonlocal buffer
+        chunk = reader.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            return False
+        buffer += chunk
+        return True
+
+    # Find the opening bracket of the record array
+    array_start = re.compile(r'^\s*\[|"content"\s*:\s*\[')
+    while True:
+        match = array_start.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        if not fill():
+            raise ValueError("No JSON array of services found")
+
+    separators = re.compile(r"[\s,]*")
+    position = 0
+    while True:
+        # Skip separators between records
+        position = separators.match(buffer, position).end()
+        if position >= len(buffer):
+            if fill():
+                continue
+            raise ValueError("Unexpected end of JSON input")
+        if buffer[position] == "]":
+            return
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Most likely the record is split across chunks; read more and retry
+            if fill():
+                continue
+            raise
+        if position > _READ_CHUNK_SIZE:
+            # Drop consumed text so the buffer stays around one chunk in size
+            buffer, position = buffer[position:], 0
+        yield record
+
+
+def iter_csv_records(stream: IO[bytes]) -> Iterator[dict]:
+    # Flattened ORUK services CSV with a header row; empty cells are treated as missing
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for row in reader:
+        yield {key.strip(): value for key, value in row.items() if key and value not in (None, "")}
+
+
+# --- ORUK record mapping --------------------------------------------------------------------
+
+def _first(items) -> Optional[dict]:
+    return items[0] if isinstance(items, list) and items and isinstance(items[0], dict) else None
+
+def _oruk_category(record: dict) -> Optional[str]:
+    if record.get("category"):
+        return record["category"]
+    # ORUK v1/v2: service_taxonomys[].taxonomy.name; v3: attributes[].taxonomy_term.name
+    taxonomy = _first(record.get("service_taxonomys"))
+    if taxonomy and isinstance(taxonomy.get("taxonomy"), dict):
+        return taxonomy["taxonomy"].get("name")
+    attribute = _first(record.get("attributes"))
+    if attribute and isinstance(attribute.get("taxonomy_term"), dict):
+        return attribute["taxonomy_term"].get("name")
+    return None
+
+def _oruk_fees(record: dict) -> Optional[str]:
+    if record.get("fees"):
+        return record["fees"]
+    if record.get("fees_description"): # ORUK v3
+        return record["fees_description"]
+    cost_option = _first(record.get("cost_options"))
+    if cost_option:
+        if cost_option.get("amount_description"):
+            return cost_option["amount_description"]
+        if cost_option.get("amount") is not None:
+            return f"{cost_option.get('currency') or '£'}{cost_option['amount']}"
+    return None
+
+def _oruk_costs(record: dict, fees: Optional[str]) -> dict:
+    # Numeric ORUK cost_options amounts are used as given; otherwise the fees text is parsed
+    amounts, currency = [], None
+    for cost_option in record.get("cost_options") or []:
+        if isinstance(cost_option, dict) and cost_option.get("amount") not in (None, ""):
+            amounts.append(float(cost_option["amount"]))
+            currency = currency or cost_option.get("currency")
+    if not amounts:
+        return costs.parse_fees(fees)
+    return {
+        "is_free": max(amounts) == 0,
+        "min_cost": min(amounts),
+        "max_cost": max(amounts),
+        "currency": _currency(costs.currency_code(currency) or "GBP"), # ORUK is a UK standard
+    }
+
+def _currency(code: Optional[str]) -> Optional[str]:
+    # services.currency holds ISO 4217 codes (String(3)); anything longer is rejected with the record
+    if code is not None and len(code) > 3:
+        raise ValueError(f"invalid currency {code!r}, expected a 3-letter code")
+    return code
+
+def _oruk_coordinates(record: dict) -> tuple[Optional[float], Optional[float]]:
+    latitude, longitude = record.get("latitude"), record.get("longitude")
+    service_at_location = _first(record.get("service_at_locations"))
+    if (latitude is None or longitude is None) and service_at_location:
+        location = service_at_location.get("location") or {}
+        latitude, longitude = location.get("latitude"), location.get("longitude")
+    if latitude is None or longitude is None:
+        return None, None
+    latitude, longitude = float(latitude), float(longitude)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f"invalid coordinates ({latitude}, {longitude})")
+    return latitude, longitude
+
+def oruk_to_service_row(record: dict) -> dict:
+    # Maps one ORUK service record (JSON or flattened CSV) onto the services table columns
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+    name = (record.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    latitude, longitude = _oruk_coordinates(record)
+    fees = _oruk_fees(record)
+    return {
+        "name": name,
+        "description": record.get("description"),
+        "url": record.get("url"),
+        "email": record.get("email"),
+        "fees": fees,
+        "category": _oruk_category(record),
+        **_oruk_costs(record, fees),
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+
+
+# --- Writers --------------------------------------------------------------------------------
+
+def _with_locations(rows: list[dict]) -> list[dict]:
+    # Same location representation as crud.create_service, built for the whole batch
+    for row in rows:
+        if row["latitude"] is None:
+            row["location"] = None
+        elif models.USE_GEOMETRY:
+            row["location"] = f"SRID=4326;POINT({row['longitude']} {row['latitude']})"
+        else:
+            row["location"] = {"type": "Point", "coordinates": [row["longitude"], row["latitude"]]}
+    return rows
+
+def _copy_rows(db: Session, rows: list[dict]) -> None:
+    # PostgreSQL COPY ... FROM STDIN (CSV); empty unquoted fields load as NULL
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if row[column] is None else row[column] for column in _SERVICE_COLUMNS])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY services ({', '.join(_SERVICE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+def _write_batch(db: Session, rows: list[dict]) -> Optional[str]:
+    """
+    Writes one batch in its own transaction. A database error (constraint, type, ...) rolls back
+    just this batch and is returned, so the import carries on with the next one; batches already
+    committed stay imported.
+    """
+    rows = _with_locations(rows)
+    bind = db.get_bind()
+    try:
+        if bind.dialect.driver == "psycopg2":
+            _copy_rows(db, rows) # Raw cursor: errors are the driver's own, not SQLAlchemy's
+        else:
+            db.execute(insert(models.Service), rows) # executemany
+        crud.bump_table_versions(db, "services")
+        db.commit()
+    except (SQLAlchemyError, bind.dialect.dbapi.Error) as e:
+        db.rollback()
+        return str(getattr(e, "orig", None) or e).strip()
+    return None
+
+
+def import_services(db: Session, records: Iterator[dict], batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """
+    Maps and writes ORUK service records in batches of batch_size (one transaction each).
+    Records that cannot be mapped, and the records of batches the database rejects, are skipped
+    and reported. Returns throughput statistics.
+    """
+    started = time.perf_counter()
+    imported, failed, errors = 0, 0, []
+    batch, batch_record_numbers = [], []
+
+    def fail(record_number: int, error: str) -> None:
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"row": record_number, "error": error})
+
+    def write() -> None:
+        # Every record of a batch the database rejected is reported with the database's error
+        nonlocal imported
+        error = _write_batch(db, batch)
+        if error is None:
+            imported += len(batch)
+        else:
+            for record_number in batch_record_numbers:
+                fail(record_number, f"batch not written: {error}")
+        batch.clear()
+        batch_record_numbers.clear()
+
+    for record_number, record in enumerate(records, start=1):
+        try:
+            batch.append(oruk_to_service_row(record))
+        except (ValueError, TypeError) as e:
+            fail(record_number, str(e))
+            continue
+        batch_record_numbers.append(record_number)
+        if len(batch) >= batch_size:
+            write()
+    if batch:
+        write()
+
+    # Imported rows bypass the per-row maintenance in crud, so refresh reachability in bulk;
+    # the in-process indexes reload themselves as the services version has moved on
+    if imported:
+        crud.rebuild_reachability(db)
+
+    seconds = time.perf_counter() - started
+    return {
+        "imported": imported,
+        "failed": failed,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(imported / seconds, 1) if seconds > 0 else float(imported),
+    }
+
+
+def import_services_file(db: Session, stream: IO[bytes], file_format: str, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    if file_format == "csv":
+        records = iter_csv_records(stream)
+    elif file_format == "json":
+        records = iter_json_records(stream)
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+    return import_services(db, records, batch_size=batch_size)
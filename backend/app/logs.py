@@ -0,0 +1,53 @@
+# This is the logs.py file for the application's structured logging.
+# Modules log through logging.getLogger(__name__) under the "app" logger. Records are written as one
+# JSON object per line, with any extra= fields as top-level keys, so they can be searched by field.
+# DEBUG records, which the hot paths write on every call, are sampled: at LOG_DEBUG_SAMPLE_RATE 0.01
+# one in a hundred is written, enough to see what those paths do without paying for every call.
+import json
+import logging
+import os
+import random
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json") # "json" or "text"
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    # Passes every record at INFO and above, and a random sample_rate share of the DEBUG ones
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.sample_rate
+
+
+def configure_logging() -> None:
+    # Idempotent: the "app" logger gets a single handler however often this is called
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    if any(getattr(handler, "_app_handler", False) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler._app_handler = True
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+    logger.addHandler(handler)
@@ -1,10 +1,27 @@
 # This is the main.py file for the FastAPI application.
-from fastapi import FastAPI, Depends, HTTPException # Add HTTPException
+from fastapi import FastAPI, Body, Depends, HTTPException, Query, Request, Response # Add HTTPException
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from . import crud, models, schemas # Add schemas
-from .database import SessionLocal, engine, get_db # Add get_db
+from . import async_crud, crud, importer, models, pagination, schemas, serializers, tiles # Add schemas
+from .admin import require_admin
+from .cache import make_key, response_cache
+from .metrics import REGISTRY, MetricsMiddleware
+from .profiling import ProfilingMiddleware, profile_store
+from .slow_queries import slow_queries
+from .database import ASYNC_DATABASE, SessionLocal, engine, get_async_db, get_db, pool_stats, use_primary_db # Add get_db
 
 import os # Import os
+import csv
+import hashlib
+import io
+import json
+import logging
+import tempfile
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
 
 # Create database tables on startup
 # In a production environment, you would typically use Alembic migrations for this.
@@ -13,37 +30,300 @@ if not (os.getenv("TESTING", "false").lower() == "true"):
     models.Base.metadata.create_all(bind=engine)
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the in-process spatial index up front when PostGIS is not available.
+    # If this fails (e.g. tables not created yet) the index is built lazily on first use instead.
+    # Go through the get_db dependency (or its override) so the index is built from the database requests will use.
+    db_dependency = app.dependency_overrides.get(get_db, get_db)()
+    try:
+        crud.warm_service_index(next(db_dependency))
+    except Exception as e:
+        logger.warning("Could not warm the spatial index at startup, it will load on first use", extra={"error": str(e)})
+    finally:
+        db_dependency.close()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ProfilingMiddleware) # Inside the metrics middleware, so profiled requests' latency includes the profiler
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to Open Referral UK Service Finder API"}
 
+@app.get("/cache/stats", response_model=schemas.CacheStats)
+def read_cache_stats():
+    # Hit/miss counters of the response cache in this worker process
+    return response_cache.stats()
+
+@app.get("/metrics")
+def read_metrics():
+    # Prometheus text exposition: per-route latency, in-flight requests, SQL per request and pool usage
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/database/pool-stats", response_model=dict[str, schemas.PoolStats])
+def read_pool_stats():
+    # Connection checkout waits per pool ("primary", "replica", and their async counterparts) in this worker process
+    return pool_stats()
+
 from typing import Optional # Import Optional
 
+@app.get("/admin/slow-queries", response_model=schemas.SlowQueryLog, dependencies=[Depends(require_admin)])
+def read_slow_queries():
+    # Plans of sampled slow statements in this worker process (see slow_queries.py)
+    return {
+        "threshold_ms": slow_queries.threshold_ms,
+        "sample_rate": slow_queries.sample_rate,
+        "slow_statements": slow_queries.slow_statements,
+        "entries": slow_queries.entries(),
+    }
+
+@app.delete("/admin/slow-queries", status_code=204, dependencies=[Depends(require_admin)])
+def clear_slow_queries():
+    slow_queries.clear()
+
+@app.get("/admin/profiles", response_model=list[schemas.ProfileSummary], dependencies=[Depends(require_admin)])
+def read_profiles():
+    # Requests profiled in this worker process with X-Profile: 1 (see profiling.py), most recent first
+    return profile_store.summaries()
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def download_profile(profile_id: str):
+    # Folded stacks, e.g. flamegraph.pl profile.folded > profile.svg, or open in speedscope
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        profile["folded"], media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+    )
+
+# The read endpoints below are async and get their session from get_read_db: an AsyncSession when
+# DATABASE_ASYNC=true, otherwise the usual sync session, whose queries async_crud.run sends to the
+# threadpool. Writes stay on sync endpoints and get_db. Either way, with DATABASE_READ_URL set a GET
+# reads from the replica unless the client has just written (see database._use_replica).
+def _sync_read_db(db: Session = Depends(get_db)) -> Session:
+    return db
+
+get_read_db = get_async_db if ASYNC_DATABASE else _sync_read_db
+
 # US1: View a list of all available services
 # US2: Filter services by category, location, and cost
 @app.get("/services/", response_model=list[schemas.Service])
-def read_services(
+async def read_services(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    # Keyset pagination: pass the X-Next-Cursor header of the previous page to get the next one
+    cursor: Optional[str] = None,
+    order_by: str = Query("id", pattern="^(id|name)$"),
+    include_total: bool = False, # Adds X-Total-Count (approximate on PostgreSQL)
+    # Sparse fieldset, e.g. fields=name,category; id is always included
+    fields: Optional[str] = None,
     category: Optional[str] = None,
     fees: Optional[str] = None,
-    # Add location query params here e.g.
-    # min_lat: Optional[float] = None, max_lat: Optional[float] = None,
-    # min_lon: Optional[float] = None, max_lon: Optional[float] = None,
-    db: Session = Depends(get_db)
+    # Structured cost filters, e.g. max_cost=10 for services with an option under £10
+    max_cost: Optional[float] = Query(None, ge=0),
+    free_only: bool = False,
+    # Bounding box (e.g. the map viewport); all four must be given together
+    min_lat: Optional[float] = None, max_lat: Optional[float] = None,
+    min_lon: Optional[float] = None, max_lon: Optional[float] = None,
+    # Radius filter: near=lat,lon&radius_m=...
+    near: Optional[str] = None,
+    radius_m: Optional[float] = None,
+    db: Session = Depends(get_read_db)
 ):
-    services = crud.get_services(
-        db,
-        skip=skip,
-        limit=limit,
+    _check_bbox(min_lat, max_lat, min_lon, max_lon)
+
+    near_lat = near_lon = None
+    if near is not None or radius_m is not None:
+        near_lat, near_lon = _parse_near(near)
+        if radius_m is None or radius_m <= 0:
+            raise HTTPException(status_code=400, detail="radius_m must be a positive number of metres when near is given")
+
+    order_by, after = _parse_cursor(cursor, order_by)
+    serializer = _sparse_serializer(serializers.services, _parse_fields(fields, schemas.Service))
+    filters = dict(
         category=category,
-        fees=fees
-        # Pass location params to crud.get_services
-        # min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon
+        fees=fees,
+        max_cost=max_cost, free_only=free_only,
+        min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon,
+        near_lat=near_lat, near_lon=near_lon, radius_m=radius_m,
+    )
+
+    def load(session: Session):
+        # Only the requested columns are read, plus the sort key for the next-page cursor
+        columns = serializer.select_columns(pagination.SORT_KEYS[order_by])
+        services = crud.get_services(session, skip=skip, limit=limit, order_by=order_by, after=after, columns=columns, **filters)
+        headers = _pagination_headers(services, limit, order_by)
+        if include_total:
+            headers["X-Total-Count"] = str(crud.count_services(session, **filters))
+        return services, headers
+
+    params = dict(
+        skip=skip, limit=limit, order_by=order_by, after=after, include_total=include_total, fields=tuple(serializer.names), **filters
+    )
+    return await _cached_list_response(request, db, "services", ("services",), params, serializer, load)
+
+def _check_bbox(min_lat: Optional[float], max_lat: Optional[float], min_lon: Optional[float], max_lon: Optional[float]) -> None:
+    bbox = (min_lat, max_lat, min_lon, max_lon)
+    if any(v is not None for v in bbox) and any(v is None for v in bbox):
+        raise HTTPException(status_code=400, detail="min_lat, max_lat, min_lon and max_lon must be given together")
+    if min_lat is not None and (min_lat > max_lat or min_lon > max_lon):
+        raise HTTPException(status_code=400, detail="Bounding box minimums must not exceed maximums")
+
+def _parse_cursor(cursor: Optional[str], order_by: str) -> tuple[str, Optional[list]]:
+    # A cursor carries its own sort order, so follow-on pages cannot mix orders
+    if cursor is None:
+        return order_by, None
+    try:
+        return pagination.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _parse_fields(fields: Optional[str], schema) -> Optional[set[str]]:
+    # "name,category" -> {"id", "name", "category"}; None means every field
+    if fields is None:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(schema.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(schema.model_fields)}",
+        )
+    return requested | {"id"}
+
+def _sparse_serializer(serializer: serializers.RowSerializer, fields: Optional[set[str]]) -> serializers.RowSerializer:
+    return serializer if fields is None else serializer.only(fields)
+
+def _pagination_headers(rows: list, limit: int, order_by: str) -> dict:
+    # A full page may have more after it; a short page is the last one
+    if rows and len(rows) == limit:
+        return {"X-Next-Cursor": pagination.encode_cursor(order_by, rows[-1])}
+    return {}
+
+def _etag(*parts) -> str:
+    # Strong validator: the same parts always produce the same representation
+    return '"' + hashlib.sha1(repr(parts).encode()).hexdigest()[:27] + '"'
+
+def _not_modified(request: Request, etag: str) -> bool:
+    # If-None-Match uses weak comparison (RFC 9110), so W/ prefixes are ignored
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+async def _cached_list_response(
+    request: Request, db, endpoint: str, tables: tuple, params: dict, serializer: serializers.RowSerializer, load
+) -> Response:
+    # The tables' change versions identify the response, so they give both the ETag and the cache key:
+    # an unchanged list is answered with 304 Not Modified, or from the cache, without loading rows.
+    # load(session) returns (rows, headers) and only runs on a miss; concurrent identical misses share one call.
+    # The rows are column tuples selected for the serializer, which encodes them without Pydantic.
+    key = make_key(endpoint, await async_crud.get_table_versions(db, tables), params)
+    etag = _etag(*key)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    def load_and_dump(session: Session):
+        rows, headers = load(session)
+        return serializer.dump(rows), headers
+
+    async def render():
+        return await async_crud.run(db, load_and_dump)
+
+    body, headers = await response_cache.get_or_compute_async(key, render)
+    return Response(content=body, media_type="application/json", headers={**headers, "ETag": etag})
+
+def _parse_near(near: Optional[str]) -> tuple[float, float]:
+    # Parses "lat,lon" into floats, rejecting anything that is not a valid coordinate
+    try:
+        lat_str, lon_str = (near or "").split(",")
+        lat, lon = float(lat_str), float(lon_str)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="near must be given as 'lat,lon'")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="near is not a valid latitude/longitude")
+    return lat, lon
+
+# Full exports, streamed from a server-side cursor EXPORT_BATCH_SIZE rows at a time instead of
+# paging through the list endpoints, so memory stays flat however large the table is.
+# Not cached: each export reads the tables as they are.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "geojson": "application/geo+json"}
+EXPORT_FORMAT_PATTERN = "^(ndjson|geojson)$"
+
+def _export_response(db, name: str, export_format: str, serializer: serializers.RowSerializer, geometry, statement_fn, **kwargs) -> StreamingResponse:
+    # NDJSON is one object per line; GeoJSON is a FeatureCollection with the fields as properties
+    async def body():
+        if export_format == "geojson":
+            yield b'{"type":"FeatureCollection","features":['
+        first = True
+        async for rows in async_crud.stream(db, statement_fn, serializer.select_columns(), batch_size=EXPORT_BATCH_SIZE, **kwargs):
+            if export_format == "geojson":
+                yield (b"" if first else b",") + serializer.dump_features(rows, geometry)
+            else:
+                yield serializer.dump_ndjson(rows)
+            first = False
+        if export_format == "geojson":
+            yield b"]}"
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'},
     )
-    return services
+
+@app.get("/services/export")
+async def export_services(
+    format: str = Query("ndjson", pattern=EXPORT_FORMAT_PATTERN),
+    category: Optional[str] = None,
+    fees: Optional[str] = None,
+    max_cost: Optional[float] = Query(None, ge=0),
+    free_only: bool = False,
+    min_lat: Optional[float] = None, max_lat: Optional[float] = None,
+    min_lon: Optional[float] = None, max_lon: Optional[float] = None,
+    db: Session = Depends(get_read_db)
+):
+    _check_bbox(min_lat, max_lat, min_lon, max_lon)
+    return _export_response(
+        db, "services", format, serializers.services, serializers.service_geometry, crud.get_services_export_statement,
+        category=category, fees=fees, max_cost=max_cost, free_only=free_only,
+        min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon,
+    )
+
+# Vector tiles for the map, so it draws only the services visible at each zoom level instead of
+# a marker per service. Cached like the list endpoints: by the services table's change version.
+@app.get("/tiles/services/{z}/{x}/{y}.mvt")
+async def read_service_tile(
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    category: Optional[str] = None,
+    fees: Optional[str] = None,
+    max_cost: Optional[float] = Query(None, ge=0),
+    free_only: bool = False,
+    db: Session = Depends(get_read_db)
+):
+    if not tiles.valid_tile(z, x, y):
+        raise HTTPException(status_code=400, detail=f"Tile coordinates out of range (zoom 0-{tiles.MAX_ZOOM}, x and y below 2^zoom)")
+    filters = dict(category=category, fees=fees, max_cost=max_cost, free_only=free_only)
+    # The tile is built from data at least as new as this version: in JSON mode the spatial index
+    # reloads itself once the services version moves past the one it was loaded at
+    key = make_key("service-tiles", await async_crud.get_table_versions(db, ("services",)), dict(z=z, x=x, y=y, **filters))
+    etag = _etag(*key)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    async def render():
+        return await async_crud.get_service_tile(db, z, x, y, **filters)
+
+    tile = await response_cache.get_or_compute_async(key, render)
+    return Response(content=tile, media_type=tiles.MEDIA_TYPE, headers={"ETag": etag})
 
 # US7: Add new services to the directory
 @app.post("/services/", response_model=schemas.Service, status_code=201)
@@ -51,6 +331,52 @@ def create_new_service(service: schemas.ServiceCreate, db: Session = Depends(get
     # The crud.create_service function now handles lat/lon from ServiceCreate
     return crud.create_service(db=db, service=service)
 
+# Bulk ORUK directory import. The body is spooled to a temporary file on disk and stream-parsed
+# from there, so memory stays bounded for large dumps. (Not a SpooledTemporaryFile: before Python 3.11
+# it lacks readable(), which the importer's io.TextIOWrapper needs.)
+@app.post("/services/import", response_model=schemas.ServiceImportResult)
+async def import_oruk_services(
+    request: Request,
+    format: str = Query("json", pattern="^(json|csv)$"),
+    batch_size: int = Query(importer.DEFAULT_BATCH_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    with tempfile.TemporaryFile() as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        try:
+            return await run_in_threadpool(importer.import_services_file, db, spool, format, batch_size)
+        except ValueError as e: # Includes malformed JSON
+            raise HTTPException(status_code=400, detail=f"Could not parse import: {e}")
+
+# Batch edits and removals. Declared before the /{service_id} routes, which would otherwise match "batch".
+MAX_BATCH_ITEMS = 1000
+
+def _check_batch_ids(ids: list[int]) -> None:
+    if len(ids) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    seen = set()
+    for row_id in ids:
+        if row_id in seen:
+            raise HTTPException(status_code=400, detail=f"Duplicate id in batch: {row_id}")
+        seen.add(row_id)
+
+def _batch_result(ids: list[int], applied: set[int]) -> dict:
+    results = [{"id": row_id, "status": 200 if row_id in applied else 404} for row_id in ids]
+    return {"applied": len(applied), "not_found": len(ids) - len(applied), "results": results}
+
+@app.patch("/services/batch", response_model=schemas.BatchResult)
+def update_services_batch(updates: list[schemas.ServiceBatchUpdate], db: Session = Depends(get_db)):
+    ids = [item.id for item in updates]
+    _check_batch_ids(ids)
+    return _batch_result(ids, crud.batch_update_services(db, updates))
+
+@app.delete("/services/batch", response_model=schemas.BatchResult)
+def remove_services_batch(ids: list[int] = Body(...), db: Session = Depends(get_db)):
+    _check_batch_ids(ids)
+    return _batch_result(ids, crud.batch_delete_services(db, ids))
+
 # US8: Edit or update existing service information
 @app.patch("/services/{service_id}", response_model=schemas.Service)
 def update_existing_service(service_id: int, service: schemas.ServiceUpdate, db: Session = Depends(get_db)):
@@ -72,18 +398,137 @@ def remove_service(service_id: int, db: Session = Depends(get_db)):
 def create_new_claimant(claimant: schemas.ClaimantCreate, db: Session = Depends(get_db)):
     return crud.create_claimant(db=db, claimant=claimant)
 
+# Bulk claimant import: a JSON array of ClaimantCreate objects, or CSV (Content-Type: text/csv)
+# with a header row of name,home_latitude,home_longitude[,travel_radius_m]
+@app.post("/claimants/bulk", response_model=schemas.ClaimantBulkResult)
+async def bulk_create_claimants(
+    request: Request,
+    batch_size: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        rows = _parse_csv_rows(body)
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of claimants")
+
+    # The inserts are blocking, so keep them off the event loop
+    created_ids, errors = await run_in_threadpool(crud.bulk_create_claimants, db, rows, batch_size)
+    return {"created": len(created_ids), "ids": created_ids, "errors": errors}
+
+def _parse_csv_rows(body: bytes) -> list[dict]:
+    try:
+        text = body.decode("utf-8-sig") # Tolerate a BOM from spreadsheet exports
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV body must be UTF-8")
+    # Empty cells mean "not given" (e.g. use the default travel radius)
+    return [
+        {key.strip(): value for key, value in row.items() if key and value not in (None, "")}
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+
 # Placeholder for US10 - Get Claimants (will be expanded)
 @app.get("/claimants/", response_model=list[schemas.Claimant])
-def read_all_claimants(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    claimants = crud.get_claimants(db, skip=skip, limit=limit)
-    return claimants
+async def read_all_claimants(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    order_by: str = Query("id", pattern="^(id|name)$"),
+    include_total: bool = False,
+    fields: Optional[str] = None,
+    # The travel area polygon is the bulk of each claimant; lists for dropdowns can leave it out
+    include_extent: bool = True,
+    db: Session = Depends(get_read_db)
+):
+    order_by, after = _parse_cursor(cursor, order_by)
+    selected = _parse_fields(fields, schemas.Claimant)
+    if not include_extent:
+        selected = (selected or set(schemas.Claimant.model_fields)) - {"travel_extent_geojson"}
+    serializer = _sparse_serializer(serializers.claimants, selected)
+
+    def load(session: Session):
+        columns = serializer.select_columns(pagination.SORT_KEYS[order_by])
+        claimants = crud.get_claimants(session, skip=skip, limit=limit, order_by=order_by, after=after, columns=columns)
+        headers = _pagination_headers(claimants, limit, order_by)
+        if include_total:
+            headers["X-Total-Count"] = str(crud.count_claimants(session))
+        return claimants, headers
+
+    params = dict(skip=skip, limit=limit, order_by=order_by, after=after, include_total=include_total, fields=tuple(serializer.names))
+    return await _cached_list_response(request, db, "claimants", ("claimants",), params, serializer, load)
+
+@app.get("/claimants/export")
+async def export_claimants(
+    format: str = Query("ndjson", pattern=EXPORT_FORMAT_PATTERN),
+    include_extent: bool = True,
+    db: Session = Depends(get_read_db)
+):
+    serializer = serializers.claimants
+    if not include_extent:
+        serializer = serializer.only(set(schemas.Claimant.model_fields) - {"travel_extent_geojson"})
+    return _export_response(db, "claimants", format, serializer, serializers.claimant_geometry, crud.get_claimants_export_statement)
 
 @app.get("/claimants/{claimant_id}", response_model=schemas.Claimant)
-def read_single_claimant(claimant_id: int, db: Session = Depends(get_db)):
-    db_claimant = crud.get_claimant(db, claimant_id=claimant_id)
-    if db_claimant is None:
+async def read_single_claimant(claimant_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    # The row version is read on its own so an unchanged claimant is answered without loading it.
+    # The claimants table version goes in too: an id can come back after a delete (SQLite reuses
+    # the highest rowid) with its row version starting again at 1, and every delete bumps the table.
+    version = await async_crud.get_claimant_version(db, claimant_id=claimant_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Claimant not found")
-    return db_claimant
+    etag = _etag("claimant", claimant_id, version, await async_crud.get_table_versions(db, ("claimants",)))
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return await async_crud.get_claimant(db, claimant_id=claimant_id)
+
+@app.patch("/claimants/batch", response_model=schemas.BatchResult)
+def update_claimants_batch(updates: list[schemas.ClaimantBatchUpdate], db: Session = Depends(get_db)):
+    ids = [item.id for item in updates]
+    _check_batch_ids(ids)
+    return _batch_result(ids, crud.batch_update_claimants(db, updates))
+
+@app.delete("/claimants/batch", response_model=schemas.BatchResult)
+def remove_claimants_batch(ids: list[int] = Body(...), db: Session = Depends(get_db)):
+    _check_batch_ids(ids)
+    return _batch_result(ids, crud.batch_delete_claimants(db, ids))
+
+# Services within the travel areas of a whole caseload, in one query per CASELOAD_CHUNK claimants rather
+# than a /services/within/claimant/{id} call each. The JSON array is streamed a chunk at a time,
+# one {"claimant_id", "status", "services"} group per requested claimant, in request order.
+CASELOAD_CHUNK = 200
+
+@app.post("/claimants/services-within", responses={200: {"model": list[schemas.ClaimantServices]}})
+async def get_services_for_caseload(caseload: schemas.CaseloadServicesRequest, db: Session = Depends(get_read_db)):
+    claimant_ids = caseload.claimant_ids
+    _check_batch_ids(claimant_ids)
+    filters = caseload.model_dump(exclude={"claimant_ids"})
+    serializer = serializers.services
+
+    async def groups():
+        yield b"["
+        for start in range(0, len(claimant_ids), CASELOAD_CHUNK):
+            chunk = claimant_ids[start:start + CASELOAD_CHUNK]
+            radii, rows = await async_crud.get_services_reachable_by_claimants(db, chunk, serializer.select_columns(), **filters)
+            services_by_claimant = {}
+            for claimant_id, *service in rows:
+                services_by_claimant.setdefault(claimant_id, []).append(service)
+            parts = []
+            for claimant_id in chunk:
+                status = 404 if claimant_id not in radii else 400 if radii[claimant_id] is None else 200
+                services = serializer.dump(services_by_claimant.get(claimant_id, ()))
+                parts.append(b'{"claimant_id":%d,"status":%d,"services":%b}' % (claimant_id, status, services))
+            yield (b"," if start else b"") + b",".join(parts)
+        yield b"]"
+
+    return StreamingResponse(groups(), media_type="application/json")
 
 @app.patch("/claimants/{claimant_id}", response_model=schemas.Claimant)
 def update_existing_claimant(claimant_id: int, claimant: schemas.ClaimantUpdate, db: Session = Depends(get_db)):
@@ -99,17 +544,62 @@ def remove_claimant(claimant_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Claimant not found")
     return deleted_claimant
 
+# Travel area polygon for drawing on the map; generated on first request and then stored
+@app.get("/claimants/{claimant_id}/travel-extent", dependencies=[Depends(use_primary_db)]) # May store the extent
+def read_claimant_travel_extent(claimant_id: int, db: Session = Depends(get_db)):
+    claimant = crud.get_claimant(db, claimant_id=claimant_id)
+    if not claimant:
+        raise HTTPException(status_code=404, detail="Claimant not found")
+    extent = crud.get_travel_extent(db, claimant)
+    if extent is None:
+        raise HTTPException(status_code=400, detail="Claimant does not have a defined travel extent")
+    return extent
+
+# Nearest-N services to a claimant's home, closest first, with distances in metres
+@app.get("/claimants/{claimant_id}/nearest-services", response_model=list[schemas.ServiceWithDistance])
+async def read_nearest_services_for_claimant(
+    claimant_id: int,
+    k: int = Query(10, ge=1, le=100),
+    category: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    claimant = await async_crud.get_claimant(db, claimant_id=claimant_id)
+    if not claimant:
+        raise HTTPException(status_code=404, detail="Claimant not found")
+    if claimant.home_latitude is None or claimant.home_longitude is None:
+        raise HTTPException(status_code=400, detail="Claimant does not have a home location")
+
+    # Columns selected for the serializer, as for the list endpoints: under PostGIS the location
+    # comes back as GeoJSON rather than a geometry the schema cannot take
+    serializer = serializers.services
+    nearest = await async_crud.get_nearest_services(
+        db, latitude=claimant.home_latitude, longitude=claimant.home_longitude,
+        columns=serializer.select_columns(), k=k, category=category
+    )
+    items = serializer.items(row for row, _ in nearest)
+    for item, (_, distance) in zip(items, nearest):
+        item["distance_m"] = distance
+    return items
+
 # US6: Get services within a claimant's travel area
+_REACH_TABLES = ("claimants", "services", "claimant_service_reach")
+
 @app.get("/services/within/claimant/{claimant_id}", response_model=list[schemas.Service])
-def get_services_for_claimant_area(claimant_id: int, db: Session = Depends(get_db)):
-    claimant = crud.get_claimant(db, claimant_id=claimant_id)
+async def get_services_for_claimant_area(claimant_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    # Changes to the claimant, any service or the reachability table change the versions.
+    # Checked before anything else: a deleted claimant bumps the claimants version, so it gets its 404.
+    etag = _etag("within-claimant", claimant_id, await async_crud.get_table_versions(db, _REACH_TABLES))
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    claimant = await async_crud.get_claimant(db, claimant_id=claimant_id)
     if not claimant:
         raise HTTPException(status_code=404, detail="Claimant not found")
 
-    if not claimant.travel_extent_geojson:
+    if claimant.travel_radius_m is None:
         # Or return empty list with a specific message/status if preferred
         raise HTTPException(status_code=400, detail="Claimant does not have a defined travel extent")
 
-    # The travel_extent_geojson is already a dict (from JSONB or from Shapely's mapping)
-    services_within_extent = crud.get_services_within_geojson(db, geometry_filter=claimant.travel_extent_geojson)
-    return services_within_extent
+    # Read from the materialized reachability table rather than running a spatial query per request
+    return await async_crud.get_services_reachable_by_claimant(db, claimant_id=claimant_id)
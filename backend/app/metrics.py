@@ -0,0 +1,141 @@
+# This is the metrics.py file for the Prometheus metrics served at GET /metrics.
+# MetricsMiddleware times every request by route template (/claimants/{claimant_id}, not the raw
+# path, so the label set stays small) and counts the SQL statements each request runs, through
+# SQLAlchemy's cursor execute events. Pool figures are read from database.pool_stats() at scrape time.
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import CollectorRegistry, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import database
+
+logger = logging.getLogger(__name__)
+
+# A registry of our own, so importing the app twice (tests, reloaders) does not register duplicates
+REGISTRY = CollectorRegistry()
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to serve a request, until the last body chunk is sent",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS, registry=REGISTRY,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests being served", ["method"], registry=REGISTRY,
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements executed per request",
+    ["method", "route"], buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100), registry=REGISTRY,
+)
+REQUEST_SQL_DURATION = Histogram(
+    "http_request_sql_seconds", "Time per request spent executing SQL statements",
+    ["method", "route"], buckets=_LATENCY_BUCKETS, registry=REGISTRY,
+)
+
+
+class SqlStats:
+    # Statements run on behalf of one request
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# Set by MetricsMiddleware for the duration of a request. Sync endpoints run in the threadpool with
+# a copy of the context, which still refers to the same SqlStats object.
+_request_sql: ContextVar[Optional[SqlStats]] = ContextVar("request_sql", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _request_sql.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware rather than @app.middleware("http"), so a streamed response is timed until
+    its last chunk and the SQL it runs while streaming is counted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, status = scope["method"], 500
+        stats = SqlStats()
+        token = _request_sql.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.labels(method).inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            REQUESTS_IN_PROGRESS.labels(method).dec()
+            _request_sql.reset(token)
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_DURATION.labels(method, route, str(status)).observe(duration)
+            REQUEST_SQL_STATEMENTS.labels(method, route).observe(stats.statements)
+            REQUEST_SQL_DURATION.labels(method, route).observe(stats.seconds)
+            logger.debug("request", extra={
+                "method": method, "route": route, "status": status, "duration_ms": round(duration * 1000, 2),
+                "sql_statements": stats.statements, "sql_ms": round(stats.seconds * 1000, 2),
+            })
+
+
+class PoolCollector:
+    # Exports database.pool_stats() at scrape time, one label value per pool
+    def collect(self):
+        stats = database.pool_stats()
+        families = {
+            "size": GaugeMetricFamily("db_pool_size", "Connections the pool keeps open", labels=["pool"]),
+            "checked_out": GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["pool"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections open beyond the pool size", labels=["pool"]),
+            "timeouts": CounterMetricFamily("db_pool_checkout_timeouts", "Checkouts that timed out", labels=["pool"]),
+        }
+        wait = HistogramMetricFamily("db_pool_checkout_wait_seconds", "Time waited to check out a connection", labels=["pool"])
+        for pool, values in stats.items():
+            for name, family in families.items():
+                family.add_metric([pool], values[name])
+            buckets = [(bound, count) for bound, count in values["wait_buckets"].items()]
+            buckets.append(("+Inf", values["checkouts"] + values["timeouts"]))
+            wait.add_metric([pool], buckets, values["wait_seconds_total"])
+        yield from families.values()
+        yield wait
+
+
+REGISTRY.register(PoolCollector())
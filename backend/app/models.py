@@ -1,8 +1,12 @@
 # This is the models.py file for SQLAlchemy models.
+import logging
 import os
-from sqlalchemy import Column, Integer, String, Text, Float, JSON # Added JSON
+from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text, Float, JSON, Index, ForeignKey, DDL, event, func # Added JSON
 # Use the Base from database.py to ensure models are registered with the same metadata
 from .database import Base
+
+logger = logging.getLogger(__name__)
+
 # Conditionally import Geometry and set location type
 USE_GEOMETRY = os.getenv("USE_GEOMETRY_FOR_TESTS", "false").lower() == "true" or not (os.getenv("TESTING", "false").lower() == "true")
 
@@ -12,8 +16,9 @@ if USE_GEOMETRY:
 else:
     # Fallback for testing environments where SpatiaLite might not be available
     # Using JSON to store GeoJSON-like point data, or Text
-    print(f"Models.py: TESTING={os.getenv('TESTING')}, USE_GEOMETRY_FOR_TESTS={os.getenv('USE_GEOMETRY_FOR_TESTS')}, Resolved USE_GEOMETRY={USE_GEOMETRY}")
-    print("Models.py: Using JSON for location column in Service model.")
+    logger.info("Using JSON for location column in Service model", extra={
+        "testing": os.getenv("TESTING"), "use_geometry_for_tests": os.getenv("USE_GEOMETRY_FOR_TESTS"),
+    })
     LocationType = JSON
 
 
@@ -21,29 +26,103 @@ class Service(Base):
     __tablename__ = "services"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True)
+    name = Column(String, index=True, nullable=False) # Leads the (name, id) keyset pagination key
     description = Column(Text, nullable=True)
     url = Column(String, nullable=True)
     email = Column(String, nullable=True)
-    fees = Column(String, nullable=True) # Could be Text if long, or structured if cost is numeric
+    fees = Column(String, index=True, nullable=True) # Free text as published; see the cost columns below
+
+    # Structured cost, parsed from fees on every write (see costs.parse_fees). None when unknown.
+    is_free = Column(Boolean, index=True, nullable=True)
+    min_cost = Column(Float, index=True, nullable=True) # Cheapest option; backs the max_cost filter
+    max_cost = Column(Float, index=True, nullable=True)
+    currency = Column(String(3), index=True, nullable=True) # ISO 4217 code, e.g. GBP
     category = Column(String, index=True, nullable=True) # index=True for faster filtering
 
     location = Column(LocationType, nullable=True)
 
-    # If you want to store simple lat/lon separately as well (optional, can be derived from location)
-    # latitude = Column(Float, nullable=True)
-    # longitude = Column(Float, nullable=True)
+    # Plain lat/lon copies of location, kept in sync by crud. They back the bbox/radius
+    # filters in JSON mode, where the location column cannot be queried spatially.
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+
+    # Change tracking for ETags: version is incremented by the ORM on every UPDATE
+    version = Column(Integer, nullable=False, default=1, server_default="1") # Server default covers COPY imports
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_services_latitude_longitude", "latitude", "longitude"),
+        Index("ix_services_name_id", "name", "id"), # Keyset pagination ordered by name
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+if USE_GEOMETRY:
+    # GeoAlchemy2 already creates a GiST index on services.location for ST_Intersects.
+    # ST_DWithin on geography (metres) needs its own functional index on location::geography.
+    from geoalchemy2 import Geography
+    from sqlalchemy import cast
+    Index(
+        "ix_services_location_geography",
+        cast(Service.location, Geography(srid=4326)),
+        postgresql_using="gist",
+    )
+
+    # A leading wildcard (ILIKE '%x%') cannot use a b-tree index; pg_trgm GIN indexes can
+    event.listen(
+        Service.__table__,
+        "before_create",
+        DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+    )
+    for _column in ("category", "fees"):
+        Index(
+            f"ix_services_{_column}_trgm",
+            Service.__table__.c[_column],
+            postgresql_using="gin",
+            postgresql_ops={_column: "gin_trgm_ops"},
+        )
 
 class Claimant(Base):
     __tablename__ = "claimants"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True)
+    name = Column(String, index=True, nullable=False) # Leads the (name, id) keyset pagination key
     home_latitude = Column(Float)
     home_longitude = Column(Float)
 
-    # travel_extent_geojson will store a polygon representing the travel area.
-    # It will be a Geometry type (e.g., Polygon) for PostGIS.
-    # For SQLite testing, it will use the same LocationType fallback (JSON).
-    travel_extent_geojson = Column(LocationType, nullable=True)
-    # Note: LocationType is defined as Geometry or JSON based on USE_GEOMETRY
+    # The travel area is a circle of travel_radius_m metres around the home location.
+    # Reachability is computed from the radius (ST_DWithin on geography under PostGIS); the indexed
+    # column also lets the reachability code find the largest radius cheaply.
+    travel_radius_m = Column(Float, nullable=True, index=True)
+
+    # GeoJSON polygon of the travel area, only used for drawing it on the map. It is generated
+    # lazily (crud.get_travel_extent) and cleared whenever the home location or radius changes.
+    # Plain JSON in both modes, as nothing queries it spatially.
+    travel_extent_geojson = Column(JSON, nullable=True)
+
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Finds the claimants whose travel area could contain a given service
+        Index("ix_claimants_home_latitude_longitude", "home_latitude", "home_longitude"),
+        Index("ix_claimants_name_id", "name", "id"), # Keyset pagination ordered by name
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+class ClaimantServiceReach(Base):
+    # Materialized "service is within claimant's travel radius" pairs.
+    # Maintained incrementally by crud on every claimant/service write; rebuilt in bulk with
+    # `python -m app.cli rebuild-reachability`.
+    __tablename__ = "claimant_service_reach"
+
+    claimant_id = Column(Integer, ForeignKey("claimants.id", ondelete="CASCADE"), primary_key=True)
+    service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+class TableVersion(Base):
+    # Per-table change counters, bumped in the same transaction as every write to the table
+    # (see crud.bump_table_versions). Shared by all worker processes, so ETags and response cache
+    # keys built from them are valid across workers.
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
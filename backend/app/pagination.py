@@ -0,0 +1,96 @@
+# This is the pagination.py file for keyset (cursor) pagination helpers.
+# Instead of OFFSET, which gets slower the deeper the page and can skip or repeat rows while
+# the table changes, each page seeks past the sort key of the last row of the previous page.
+import base64
+import json
+from typing import Optional
+
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+# Allowed sort orders and their key columns; id is always last so the key is unique.
+# Key columns must be NOT NULL (see models): a row-value comparison never matches a NULL, and
+# databases disagree on where NULLs sort, so a NULL name would silently drop out of the pages.
+SORT_KEYS = {
+    "id": ("id",),
+    "name": ("name", "id"),
+}
+
+
+def sort_columns(model, order_by: str) -> list:
+    return [getattr(model, column) for column in SORT_KEYS[order_by]]
+
+
+def encode_cursor(order_by: str, row) -> str:
+    # Opaque to clients: base64url of the sort order and the last row's key values
+    key = [getattr(row, column) for column in SORT_KEYS[order_by]]
+    payload = json.dumps({"o": order_by, "k": key}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, list]:
+    """
+    Returns (order_by, key values). Raises ValueError for anything that was not produced by
+    encode_cursor, so callers can reject it with a 400.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        order_by, key = payload["o"], payload["k"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if order_by not in SORT_KEYS or not isinstance(key, list) or len(key) != len(SORT_KEYS[order_by]):
+        raise ValueError("Invalid cursor")
+    return order_by, key
+
+
+def apply_keyset(query: Query, columns: list, after: Optional[list]) -> Query:
+    # ORDER BY the key columns and, for follow-on pages, seek past the previous page's last key.
+    # A row-value comparison lets the (name, id) index serve both the seek and the ordering.
+    query = query.order_by(*columns)
+    if after is not None:
+        if len(columns) == 1:
+            query = query.filter(columns[0] > after[0])
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*after))
+    return query
+
+
+class _ExplainJson(Executable, ClauseElement):
+    # EXPLAIN (FORMAT JSON) <statement>, compiled and bound by the session's dialect, so the
+    # statement's parameters work with any driver's paramstyle (psycopg2, asyncpg, ...)
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_ExplainJson)
+def _compile_explain_json(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def estimate_count(db: Session, query: Query) -> int:
+    """
+    Row count for the query's filters. On PostgreSQL this is the planner's estimate (pg_class
+    statistics for the whole table, EXPLAIN's row estimate when filtered), so no COUNT(*) scan is
+    run. Other databases get an exact count.
+    """
+    bind = db.get_bind()
+    query = query.order_by(None).limit(None).offset(None)
+    if bind.dialect.name == "postgresql":
+        statement = query.statement
+        if statement.whereclause is None:
+            table = query.column_descriptions[0]["entity"].__table__.name
+            estimate = db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+            ).scalar()
+            if estimate is not None and estimate >= 0: # -1 means the table has never been analyzed
+                return int(estimate)
+        else:
+            plan = db.execute(_ExplainJson(statement)).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+    return db.execute(select(func.count()).select_from(query.subquery())).scalar()
@@ -0,0 +1,159 @@
+# This is the profiling.py file for opt-in per-request profiling.
+# A request sent with "X-Profile: 1" (or ?profile=1) and, when ADMIN_TOKEN is set, a valid
+# X-Admin-Token is profiled by a sampling profiler. The samples are stored as folded stacks
+# ("frame;frame;frame count" lines), the input format of flamegraph.pl and speedscope, and can be
+# downloaded from GET /admin/profiles/{id}. The response carries the id in X-Profile-Id.
+# Other requests only pay for a scan of the headers and query string.
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import parse_qs
+
+from .admin import is_admin
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_STORE_SIZE = int(os.getenv("PROFILE_STORE_SIZE", "20"))
+MAX_STACK_DEPTH = 200
+
+# Leaf frames of threads with nothing to do: idle threadpool workers and the event loop's select
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _folded_stack(frame) -> Optional[str]:
+    # Root-first "a;b;c" for a thread's current frame, or None if the thread is idle
+    if frame.f_code.co_filename.endswith(_IDLE_FILES):
+        return None
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """
+    Samples the stacks of every busy thread in the process at a fixed interval. A request's work
+    is spread over the event loop thread and threadpool threads, so sampling all of them is the
+    only way to see all of it; the flip side is that requests served at the same time show up too.
+    Profile on a quiet worker when that matters.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stopped.wait(self.interval_seconds):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = _folded_stack(frame)
+                if stack is None:
+                    continue
+                if thread_id not in names:
+                    names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                self.samples[f"{names.get(thread_id, thread_id)};{stack}"] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfileStore:
+    # The most recent profiles, oldest dropped first
+    def __init__(self, maxsize: int = PROFILE_STORE_SIZE):
+        self.maxsize = maxsize
+        self._profiles: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: dict) -> None:
+        with self._lock:
+            self._profiles[profile["id"]] = profile
+            while len(self._profiles) > self.maxsize:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def summaries(self) -> list[dict]:
+        # Most recent first, without the stacks
+        with self._lock:
+            return [{k: v for k, v in profile.items() if k != "folded"} for profile in reversed(self._profiles.values())]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+
+def _wants_profile(scope) -> bool:
+    headers = dict(scope["headers"])
+    flagged = headers.get(b"x-profile") in (b"1", b"true") or (
+        b"profile=" in scope["query_string"] and parse_qs(scope["query_string"].decode()).get("profile") in (["1"], ["true"])
+    )
+    if not flagged:
+        return False
+    token = headers.get(b"x-admin-token")
+    return is_admin(token.decode() if token is not None else None)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+        started_at, started = datetime.now(timezone.utc), time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            profile_store.add({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "samples": sum(sampler.samples.values()),
+                "folded": sampler.folded(),
+            })
+
+
+# Process-wide store; each worker process keeps its own profiles
+profile_store = ProfileStore()
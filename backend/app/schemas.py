@@ -1,5 +1,6 @@
 # This is the schemas.py file for Pydantic schemas.
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 # Basic Service Schema (expand according to ORUK standard)
@@ -30,6 +31,11 @@ class ServiceUpdate(BaseModel): # Not inheriting ServiceBase to make all fields
 
 class Service(ServiceBase):
     id: int
+    # Parsed from fees when the service is written; None when the cost is unknown
+    is_free: Optional[bool] = None
+    min_cost: Optional[float] = None
+    max_cost: Optional[float] = None
+    currency: Optional[str] = None
     # location will be handled by the model's conditional type.
     # If it's JSON, it might appear here. If it's Geometry, Pydantic might not show it by default
     # unless there's a specific serializer. For now, let's assume it might be a dict if JSON.
@@ -38,11 +44,15 @@ class Service(ServiceBase):
     class Config:
         from_attributes = True # Replaces orm_mode in Pydantic v2
 
+class ServiceWithDistance(Service):
+    distance_m: float # Great-circle distance from the query point, in metres
+
 # Claimant Schemas
 class ClaimantBase(BaseModel):
     name: str
     home_latitude: float
     home_longitude: float
+    travel_radius_m: Optional[float] = Field(default=None, gt=0) # Defaults to 5 miles on creation
 
 class ClaimantCreate(ClaimantBase):
     pass
@@ -51,11 +61,101 @@ class ClaimantUpdate(BaseModel):
     name: Optional[str] = None
     home_latitude: Optional[float] = None
     home_longitude: Optional[float] = None
-    # travel_radius_miles: Optional[float] = None # If we want to update radius
+    travel_radius_m: Optional[float] = Field(default=None, gt=0)
 
 class Claimant(ClaimantBase):
     id: int
-    travel_extent_geojson: Optional[dict] = None # GeoJSON structure for the travel area
+    travel_extent_geojson: Optional[dict] = None # GeoJSON polygon of the travel area, once generated for the map
 
     class Config:
         from_attributes = True
+
+# Batch PATCH/DELETE: an item per row, applied in one transaction
+class ServiceBatchUpdate(ServiceUpdate):
+    id: int
+
+class ClaimantBatchUpdate(ClaimantUpdate):
+    id: int
+
+class BatchItemResult(BaseModel):
+    id: int
+    status: int # What the single-row endpoint would have returned: 200, or 404 for an unknown id
+
+class BatchResult(BaseModel):
+    applied: int
+    not_found: int
+    results: List[BatchItemResult] # In request order
+
+# POST /claimants/services-within: the services each claimant in a caseload can reach
+class CaseloadServicesRequest(BaseModel):
+    claimant_ids: List[int]
+    category: Optional[str] = None
+    fees: Optional[str] = None
+    max_cost: Optional[float] = Field(default=None, ge=0)
+    free_only: bool = False
+
+class ClaimantServices(BaseModel):
+    claimant_id: int
+    status: int # 200; 404 for an unknown claimant; 400 if the claimant has no travel extent
+    services: List[Service]
+
+# Bulk import results
+class BulkRowError(BaseModel):
+    row: int # 1-based position of the row in the submitted JSON array or CSV body (header excluded)
+    error: str
+
+class ClaimantBulkResult(BaseModel):
+    created: int
+    ids: List[int]
+    errors: List[BulkRowError]
+
+class ServiceImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[BulkRowError] # The first MAX_REPORTED_ERRORS failures only
+    seconds: float
+    rows_per_second: float
+
+# Response cache statistics (per worker process)
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    coalesced: int # Requests that waited for an identical in-flight miss instead of querying
+    evictions: int
+    expirations: int
+    size: int
+    maxsize: int
+    ttl_seconds: float
+    hit_ratio: float # (hits + coalesced) / lookups
+
+class PoolStats(BaseModel):
+    checkouts: int
+    timeouts: int # Checkouts that gave up after DATABASE_POOL_TIMEOUT
+    wait_seconds_total: float
+    wait_seconds_max: float
+    wait_buckets: dict[str, int] # Upper bound in seconds -> checkouts that waited at most that long (cumulative)
+    size: int
+    checked_out: int
+    overflow: int
+
+class SlowQuery(BaseModel):
+    recorded_at: datetime
+    duration_ms: float
+    dialect: str
+    statement: str
+    plan: str # EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL, EXPLAIN QUERY PLAN on SQLite
+
+class SlowQueryLog(BaseModel):
+    threshold_ms: float
+    sample_rate: float
+    slow_statements: int # Statements over the threshold since the last clear, explained or not
+    entries: list[SlowQuery] # Most recent first
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    status: int
+    started_at: datetime
+    duration_ms: float
+    samples: int # Stack samples taken across all busy threads
@@ -0,0 +1,101 @@
+# This is the serializers.py file for the fast JSON encoding of list responses.
+# Going through response_model hydrates an ORM object per row, validates it into the Pydantic
+# schema (from_attributes) and then encodes the result. For the list endpoints we instead select
+# just the schema's columns as plain tuples and encode them in one orjson call. The output is
+# byte-for-byte what schemas.Service / schemas.Claimant produce (see tests/test_serializers.py),
+# except that floats of 1e16 and above are written as 1e16 rather than 1e+16.
+import typing
+from typing import Optional
+
+import orjson
+from sqlalchemy import func
+
+from . import models, schemas
+
+
+class RowSerializer:
+    """
+    Encodes rows selected with .columns into the JSON shape of a response schema.
+    Columns are taken in the schema's field order, so the keys come out in the same order.
+    only() gives a serializer for a subset of the fields (sparse fieldsets).
+    """
+
+    def __init__(self, model, schema, names: Optional[list[str]] = None):
+        self.model, self.schema = model, schema
+        self.names = list(names if names is not None else schema.model_fields)
+        self.columns = [self._column(model, name) for name in self.names]
+        self._subsets: dict[frozenset, RowSerializer] = {}
+        # SQLite hands back whole numbers stored in Float columns as int; Pydantic writes them as floats
+        self._float_positions = [
+            i for i, name in enumerate(self.names) if float in _annotation_types(schema.model_fields[name].annotation)
+        ]
+        # Under PostGIS the location is selected as GeoJSON text and decoded back to a dict
+        self._geojson_positions = [
+            i for i, name in enumerate(self.names) if name == "location" and models.USE_GEOMETRY
+        ]
+
+    def only(self, names) -> "RowSerializer":
+        # Same serializer restricted to the given fields; unknown names are ignored
+        key = frozenset(names)
+        if key not in self._subsets:
+            self._subsets[key] = RowSerializer(self.model, self.schema, [name for name in self.names if name in key])
+        return self._subsets[key]
+
+    def select_columns(self, extra_names=()) -> list:
+        # The columns to select, plus any extra ones (e.g. a sort key) appended after them;
+        # dump() ignores the extras because it pairs values with names positionally
+        return self.columns + [getattr(self.model, name) for name in extra_names if name not in self.names]
+
+    @staticmethod
+    def _column(model, name: str):
+        column = getattr(model, name)
+        if name == "location" and models.USE_GEOMETRY:
+            return func.ST_AsGeoJSON(column).label(name)
+        return column
+
+    def dump(self, rows) -> bytes:
+        return orjson.dumps(self.items(rows))
+
+    def dump_ndjson(self, rows) -> bytes:
+        # One object per line (application/x-ndjson)
+        return b"".join(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE) for item in self.items(rows))
+
+    def dump_features(self, rows, geometry) -> bytes:
+        # Comma-separated GeoJSON Features for the body of a FeatureCollection.
+        # geometry(item) gives each feature's geometry; the item's fields are its properties.
+        return b",".join(
+            orjson.dumps({"type": "Feature", "id": item["id"], "geometry": geometry(item), "properties": item})
+            for item in self.items(rows)
+        )
+
+    def items(self, rows) -> list[dict]:
+        names, float_positions, geojson_positions = self.names, self._float_positions, self._geojson_positions
+        items = []
+        for row in rows:
+            if float_positions or geojson_positions:
+                row = list(row)
+                for i in float_positions:
+                    if row[i] is not None:
+                        row[i] = float(row[i])
+                for i in geojson_positions:
+                    if row[i] is not None:
+                        row[i] = orjson.loads(row[i])
+            items.append(dict(zip(names, row)))
+        return items
+
+
+def _annotation_types(annotation) -> tuple:
+    # Optional[float] -> (float, NoneType)
+    return typing.get_args(annotation) or (annotation,)
+
+
+services = RowSerializer(models.Service, schemas.Service)
+claimants = RowSerializer(models.Claimant, schemas.Claimant)
+
+
+def service_geometry(item: dict) -> Optional[dict]:
+    # The location point becomes the feature's geometry rather than a property
+    return item.pop("location", None)
+
+def claimant_geometry(item: dict) -> dict:
+    return {"type": "Point", "coordinates": [item["home_longitude"], item["home_latitude"]]}
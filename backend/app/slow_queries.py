@@ -0,0 +1,117 @@
+# This is the slow_queries.py file for capturing the plans of slow SQL statements.
+# Every statement is timed through the engine's cursor execute events. A SELECT that takes longer
+# than SLOW_QUERY_MS is, for a SLOW_QUERY_SAMPLE_RATE share of them, run again under
+# EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL or EXPLAIN QUERY PLAN on SQLite, and the plan is kept in
+# a bounded ring buffer served by GET /admin/slow-queries. That shows, for example, whether the
+# reachability query used its GiST index while the endpoint was slow.
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "0.1"))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "50"))
+
+# Only statements that are safe to run a second time are explained; EXPLAIN ANALYZE executes them
+_EXPLAINABLE = ("SELECT", "WITH")
+
+
+class SlowQueryRecorder:
+    """
+    Keeps the most recent explained slow statements. Explaining runs on the connection that ran
+    the statement, inside the same transaction, so it sees the same data; on PostgreSQL it is
+    wrapped in a savepoint, so a failed EXPLAIN does not abort the request's transaction.
+    Re-running a slow statement roughly doubles its cost, which is why only a sample is explained.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, sample_rate: float = SLOW_QUERY_SAMPLE_RATE, maxlen: int = SLOW_QUERY_BUFFER_SIZE):
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self._entries: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.slow_statements = 0 # Over the threshold, explained or not
+
+    def observe(self, conn, cursor, statement: str, parameters, executemany: bool, duration_ms: float) -> None:
+        if duration_ms < self.threshold_ms:
+            return
+        with self._lock:
+            self.slow_statements += 1
+        logger.info("Slow SQL statement", extra={"duration_ms": round(duration_ms, 2), "statement": statement[:200]})
+        if executemany or not statement.lstrip().upper().startswith(_EXPLAINABLE) or random.random() >= self.sample_rate:
+            return
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception as e:
+            logger.warning("Could not explain slow SQL statement", extra={"error": str(e)})
+            return
+        entry = {
+            "recorded_at": datetime.now(timezone.utc),
+            "duration_ms": round(duration_ms, 3),
+            "dialect": conn.dialect.name,
+            "statement": statement,
+            "plan": plan,
+        }
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self) -> list[dict]:
+        # Most recent first
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.slow_statements = 0
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    # Runs on the raw DBAPI cursor, so the EXPLAIN itself does not fire the engine events again
+    cursor = conn.connection.cursor()
+    try:
+        if conn.dialect.name == "postgresql":
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                lines = [row[0] for row in cursor.fetchall()]
+            finally:
+                # Undoes anything the statement did and clears an error state either way
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        else:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            lines = [row[-1] for row in cursor.fetchall()] # (id, parent, notused, detail)
+    finally:
+        cursor.close()
+    return "\n".join(lines)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info["slow_query_started"].pop()) * 1000
+    slow_queries.observe(conn, cursor, statement, parameters, executemany, duration_ms)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("slow_query_started"):
+        connection.info["slow_query_started"].pop()
+
+
+# Process-wide recorder; each worker process keeps its own buffer
+slow_queries = SlowQueryRecorder()
@@ -0,0 +1,208 @@
+# This is the spatial_index.py file for the in-process spatial index.
+# When models.USE_GEOMETRY is False (JSON fallback for Service.location) the database
+# cannot answer spatial queries, so we keep the service points in memory instead.
+import heapq
+import math
+import threading
+from typing import Optional
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+# Mean metres per degree of latitude; a degree of longitude is this times cos(latitude)
+METRES_PER_DEGREE = 111_320.0
+
+# Mean Earth radius, as used for haversine distances
+EARTH_RADIUS_M = 6_371_008.8
+
+# 0.05 degrees is ~5.5km north-south; a default 5 mile travel extent touches ~15 cells.
+DEFAULT_CELL_SIZE_DEGREES = 0.05
+
+
+# Padding for radius_bbox. Geodesic distances on the spheroid, as ST_DWithin on geography measures
+# them, can fit a radius into more degrees than METRES_PER_DEGREE suggests (a degree of latitude is
+# ~111,250m at UK latitudes and 110,574m at the equator), so an unpadded box could drop edge points.
+RADIUS_BBOX_MARGIN = 1.01
+
+
+def radius_bbox(lon: float, lat: float, radius_m: float) -> tuple[float, float, float, float]:
+    # (min_lon, min_lat, max_lon, max_lat) of a box that contains the circle of radius_m around the point.
+    # Only a prefilter: callers follow it with an exact distance check.
+    radius_m *= RADIUS_BBOX_MARGIN
+    dlat = radius_m / METRES_PER_DEGREE
+    # Use the latitude of the box edge nearest the pole, where longitude degrees are shortest
+    edge_lat = min(abs(lat) + dlat, 89.9)
+    dlon = min(radius_m / (METRES_PER_DEGREE * math.cos(math.radians(edge_lat))), 180.0)
+    return lon - dlon, lat - dlat, lon + dlon, lat + dlat
+
+
+def haversine_m(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    # Great-circle distance in metres between two (lon, lat) points
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """
+    A uniform grid over (longitude, latitude) points, keyed by an integer id.
+    Unlike Shapely's STRtree, which is immutable, the grid can be updated in place
+    as services are created, updated and deleted.
+    """
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE_DEGREES):
+        self.cell_size = cell_size
+        self._cells: dict[tuple[int, int], dict[int, tuple[float, float]]] = {}
+        self._points: dict[int, tuple[float, float]] = {}
+        # [min_cx, min_cy, max_cx, max_cy] of every cell ever occupied; bounds nearest-neighbour searches
+        self._cell_bounds: Optional[list[int]] = None
+        self._lock = threading.RLock()
+        # False until the index has been populated from the database (see crud._ensure_service_index),
+        # and the services table version it reflects, so it can be reloaded once that moves on
+        self.loaded = False
+        self.version: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._points
+
+    def _cell_for(self, lon: float, lat: float) -> tuple[int, int]:
+        return (math.floor(lon / self.cell_size), math.floor(lat / self.cell_size))
+
+    def insert(self, item_id: int, lon: float, lat: float) -> None:
+        with self._lock:
+            self.remove(item_id) # Re-inserting an id moves it
+            self._points[item_id] = (lon, lat)
+            cx, cy = self._cell_for(lon, lat)
+            self._cells.setdefault((cx, cy), {})[item_id] = (lon, lat)
+            if self._cell_bounds is None:
+                self._cell_bounds = [cx, cy, cx, cy]
+            else:
+                bounds = self._cell_bounds
+                bounds[0], bounds[1] = min(bounds[0], cx), min(bounds[1], cy)
+                bounds[2], bounds[3] = max(bounds[2], cx), max(bounds[3], cy)
+
+    def remove(self, item_id: int) -> None:
+        with self._lock:
+            point = self._points.pop(item_id, None)
+            if point is None:
+                return
+            cell_key = self._cell_for(*point)
+            cell = self._cells.get(cell_key)
+            if cell is not None:
+                cell.pop(item_id, None)
+                if not cell:
+                    del self._cells[cell_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+            self._cell_bounds = None
+            self.loaded = False
+            self.version = None
+
+    def _bbox_candidates(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+        # Collect the points whose cell overlaps the bounding box, then drop the ones outside it.
+        min_cx, min_cy = self._cell_for(min_lon, min_lat)
+        max_cx, max_cy = self._cell_for(max_lon, max_lat)
+        ids, xs, ys = [], [], []
+        with self._lock:
+            if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) <= len(self._cells):
+                cells = (
+                    self._cells.get((cx, cy))
+                    for cx in range(min_cx, max_cx + 1)
+                    for cy in range(min_cy, max_cy + 1)
+                )
+            else:
+                # Very large box: cheaper to walk the occupied cells than the empty ones
+                cells = (
+                    cell for (cx, cy), cell in self._cells.items()
+                    if min_cx <= cx <= max_cx and min_cy <= cy <= max_cy
+                )
+            for cell in cells:
+                if not cell:
+                    continue
+                for item_id, (lon, lat) in cell.items():
+                    if min_lon <= lon <= max_lon and min_lat <= lat <= max_lat:
+                        ids.append(item_id)
+                        xs.append(lon)
+                        ys.append(lat)
+        return ids, xs, ys
+
+    def query_bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> list[int]:
+        ids, _, _ = self._bbox_candidates(min_lon, min_lat, max_lon, max_lat)
+        return ids
+
+    def query_geojson(self, geometry: dict) -> list[int]:
+        """
+        Returns the ids of points strictly within the GeoJSON geometry (same semantics as ST_Within:
+        points on the boundary are excluded). Candidates are first filtered by the geometry's
+        bounding box, then tested exactly with a single vectorized Shapely call.
+        """
+        geom = shape(geometry)
+        if geom.is_empty:
+            return []
+        ids, xs, ys = self._bbox_candidates(*geom.bounds)
+        if not ids:
+            return []
+        inside = shapely.contains_xy(geom, np.asarray(xs), np.asarray(ys))
+        return [item_id for item_id, is_inside in zip(ids, inside) if is_inside]
+
+    def iter_nearest(self, lon: float, lat: float):
+        """
+        Yields (distance_m, id) pairs in order of increasing great-circle distance from the point.
+        Best-first search: cells are visited in rings around the point's cell, and a candidate is
+        only yielded once no unvisited cell can hold anything closer. Consumers stop iterating
+        when they have enough results, so only the rings that are needed get visited.
+        """
+        hx, hy = self._cell_for(lon, lat)
+        with self._lock:
+            if self._cell_bounds is None:
+                return
+            min_cx, min_cy, max_cx, max_cy = self._cell_bounds
+        max_ring = max(hx - min_cx, max_cx - hx, hy - min_cy, max_cy - hy, 0)
+
+        heap: list[tuple[float, int]] = []
+        for ring in range(max_ring + 1):
+            with self._lock:
+                for cx, cy in _ring_cells(hx, hy, ring):
+                    for item_id, (item_lon, item_lat) in (self._cells.get((cx, cy)) or {}).items():
+                        heapq.heappush(heap, (haversine_m(lon, lat, item_lon, item_lat), item_id))
+
+            # Everything outside the visited square is at least `gap` degrees away in latitude or longitude.
+            # Longitude degrees are shortest at the highest latitude in reach; 0.99 keeps the bound conservative.
+            gap = ring * self.cell_size
+            edge_lat = min(abs(lat) + gap, 89.9)
+            bound = 0.99 * gap * math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(edge_lat))
+            while heap and heap[0][0] <= bound:
+                yield heapq.heappop(heap)
+
+        while heap:
+            yield heapq.heappop(heap)
+
+    def get_point(self, item_id: int) -> Optional[tuple[float, float]]:
+        return self._points.get(item_id)
+
+
+def _ring_cells(hx: int, hy: int, ring: int):
+    # The cells at Chebyshev distance `ring` from (hx, hy)
+    if ring == 0:
+        yield hx, hy
+        return
+    for cx in range(hx - ring, hx + ring + 1):
+        yield cx, hy - ring
+        yield cx, hy + ring
+    for cy in range(hy - ring + 1, hy + ring):
+        yield hx - ring, cy
+        yield hx + ring, cy
+
+
+# Process-wide index of Service.location points (lon, lat) keyed by Service.id.
+# Each worker process keeps its own copy, loaded lazily from the database on first use.
+service_index = GridIndex()
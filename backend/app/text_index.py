@@ -0,0 +1,70 @@
+# This is the text_index.py file for the in-process substring (n-gram) index.
+# On PostgreSQL, ILIKE '%x%' filters are served by pg_trgm GIN indexes (see models.py). SQLite has
+# no equivalent, so in JSON mode we keep a trigram index of the distinct column values in memory.
+import threading
+from typing import Optional
+
+# Trigrams, as in pg_trgm
+NGRAM_SIZE = 3
+
+
+def _ngrams(text: str) -> set[str]:
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+class NgramIndex:
+    """
+    Maps the n-grams of lower-cased values to the values containing them. Columns like category
+    and fees repeat a small set of values across many rows, so the index is keyed by distinct
+    value rather than by row: a search returns the matching values, and the database then
+    filters with value IN (...), which the column's b-tree index can serve.
+    Values are only ever added until the next reload; a value whose rows have all gone just matches nothing.
+    """
+
+    def __init__(self):
+        self._values: dict[str, str] = {} # value -> lower-cased value
+        self._postings: dict[str, set[str]] = {}
+        self._lock = threading.RLock()
+        # False until the index has been populated from the database (see crud._ensure_text_index),
+        # and the services table version it was populated at, so it can be reloaded once that moves on
+        self.loaded = False
+        self.version: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, value: str) -> None:
+        with self._lock:
+            if value in self._values:
+                return
+            folded = value.lower()
+            self._values[value] = folded
+            for gram in _ngrams(folded):
+                self._postings.setdefault(gram, set()).add(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+            self._postings.clear()
+            self.loaded = False
+            self.version = None
+
+    def search(self, substring: str) -> list[str]:
+        # Values containing substring, case-insensitively (like ILIKE '%substring%')
+        needle = substring.lower()
+        with self._lock:
+            grams = _ngrams(needle)
+            if not grams:
+                # Shorter than an n-gram: nothing to look up, check every distinct value
+                candidates = self._values
+            else:
+                postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            # Sharing all n-grams does not guarantee they are adjacent, so confirm each candidate
+            return [value for value in candidates if needle in self._values[value]]
+
+
+# Process-wide indexes of the distinct Service.category and Service.fees values.
+# Like the spatial index, each worker process keeps its own copy, loaded lazily on first use.
+category_index = NgramIndex()
+fees_index = NgramIndex()
@@ -0,0 +1,122 @@
+# This is the tiles.py file for Mapbox Vector Tiles of service locations.
+# On PostGIS the database builds the tiles itself (ST_AsMVT, see crud.get_service_tile). In JSON mode
+# the points come from the in-process spatial index, and this module projects them into the tile
+# and encodes the MVT 2.1 protobuf (https://github.com/mapbox/vector-tile-spec) in pure Python.
+import math
+import struct
+from typing import Iterable, Optional
+
+MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+LAYER = "services"
+# Service columns carried as feature attributes; the service id is the feature id
+PROPERTIES = ("name", "category", "fees", "is_free")
+
+EXTENT = 4096 # Tile coordinates run from 0 to EXTENT, as with ST_AsMVTGeom's default
+BUFFER = 64 # Points up to this far outside the tile are included, so symbols on the edge are not cut off
+MAX_ZOOM = 22
+
+# Web Mercator stops short of the poles
+MAX_LATITUDE = 85.0511287798
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z: int, x: int, y: int, buffer: int = 0) -> tuple[float, float, float, float]:
+    # (min_lon, min_lat, max_lon, max_lat) of the tile, widened by buffer tile coordinates on each side
+    n = 2 ** z
+    pad = buffer / EXTENT
+
+    def lon(tile_x: float) -> float:
+        return tile_x / n * 360.0 - 180.0
+
+    def lat(tile_y: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return lon(x - pad), lat(y + 1 + pad), lon(x + 1 + pad), lat(y - pad)
+
+
+def tile_point(lon: float, lat: float, z: int, x: int, y: int) -> tuple[int, int]:
+    # The point in tile z/x/y's coordinates: origin at the top left, y pointing down
+    n = 2 ** z
+    sin_lat = math.sin(math.radians(max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)))
+    px = ((lon + 180.0) / 360.0 * n - x) * EXTENT
+    py = ((0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * n - y) * EXTENT
+    return round(px), round(py)
+
+
+# Protobuf wire format
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint(field << 3 | wire_type)
+
+
+def _bytes_field(field: int, payload: bytes) -> bytes:
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _packed_field(field: int, values: Iterable[int]) -> bytes:
+    return _bytes_field(field, b"".join(_varint(value) for value in values))
+
+
+def _value(value) -> Optional[bytes]:
+    # A Value message; None for values MVT cannot hold (null)
+    if isinstance(value, bool): # Before int: bool is a subclass of it
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        return _key(5, 0) + _varint(value) if value >= 0 else _key(6, 0) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack("<d", value)
+    if isinstance(value, str):
+        return _bytes_field(1, value.encode())
+    return None
+
+
+def encode_points(layer: str, features: Iterable[tuple[int, int, int, dict]]) -> bytes:
+    """
+    Encodes (id, tile_x, tile_y, properties) point features as a tile with one layer.
+    Keys and values are shared across features through the layer's tables, and properties that
+    are None are left out, as ST_AsMVT does. A tile without features is empty (b""), also as ST_AsMVT.
+    """
+    keys: dict[str, int] = {}
+    values: dict[bytes, int] = {}
+    encoded = []
+    for feature_id, px, py, properties in features:
+        tags = []
+        for name, value in properties.items():
+            value = _value(value)
+            if value is None:
+                continue
+            tags.append(keys.setdefault(name, len(keys)))
+            tags.append(values.setdefault(value, len(values)))
+        geometry = (1 << 3 | 1, _zigzag(px), _zigzag(py)) # MoveTo, one point
+        encoded.append(_bytes_field(2,
+            _key(1, 0) + _varint(feature_id)
+            + (_packed_field(2, tags) if tags else b"")
+            + _key(3, 0) + _varint(1) # GeomType POINT
+            + _packed_field(4, geometry)
+        ))
+    if not encoded:
+        return b""
+    layer_message = (
+        _key(15, 0) + _varint(2) # Spec version
+        + _bytes_field(1, layer.encode())
+        + b"".join(encoded)
+        + b"".join(_bytes_field(3, name.encode()) for name in keys)
+        + b"".join(_bytes_field(4, value) for value in values)
+        + _key(5, 0) + _varint(EXTENT)
+    )
+    return _bytes_field(3, layer_message)
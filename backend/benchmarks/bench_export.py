@@ -0,0 +1,69 @@
+# This is the bench_export.py file for benchmarking the streamed /services/export and /claimants/export bodies.
+# Runs the same cursor + encoder path as the endpoints (async_crud.stream and the serializers) over a
+# SQLite file (or --database-url) and reports rows per minute and the peak Python memory while streaming.
+# Run from backend/:  python -m benchmarks.bench_export --rows 200000
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("TESTING", "true") # JSON location column unless USE_GEOMETRY_FOR_TESTS=true
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import async_crud, crud, models, serializers
+
+from .synthetic import seed_claimants, seed_services
+
+
+async def export(db, serializer, statement_fn, encode, batch_size: int) -> tuple[int, int]:
+    # (rows, bytes) written; the body is discarded as it is produced, as a client socket would
+    rows_written = bytes_written = 0
+    async for rows in async_crud.stream(db, statement_fn, serializer.select_columns(), batch_size=batch_size):
+        rows_written += len(rows)
+        bytes_written += len(encode(rows))
+    return rows_written, bytes_written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000, help="Services and claimants seeded")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Rows fetched from the cursor at a time")
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url or f"sqlite:///{tempfile.mkdtemp()}/export.db")
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(1)
+    with engine.begin() as connection:
+        seed_services(connection, args.rows, rng)
+        seed_claimants(connection, args.rows, rng)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+
+    services, claimants = serializers.services, serializers.claimants
+    cases = [
+        ("services ndjson", services, crud.get_services_export_statement, services.dump_ndjson),
+        ("services geojson", services, crud.get_services_export_statement, lambda rows: services.dump_features(rows, serializers.service_geometry)),
+        ("claimants ndjson", claimants, crud.get_claimants_export_statement, claimants.dump_ndjson),
+    ]
+    print(f"{args.rows} services and claimants on {engine.dialect.name}, batches of {args.batch_size}")
+    print(f"{'export':<20}{'rows/minute':>14}{'MB written':>12}{'peak MB':>10}")
+    for label, serializer, statement_fn, encode in cases:
+        tracemalloc.start()
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            rows, written = asyncio.run(export(db, serializer, statement_fn, encode, args.batch_size))
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{label:<20}{rows / elapsed * 60:>14.0f}{written / 1e6:>12.1f}{peak / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# This is the bench_list_serialization.py file for benchmarking list response encoding.
+# Compares what response_model=list[schemas.Service] does (ORM objects validated into the schema,
+# then encoded) with the column-tuple + orjson path in app/serializers.py, for one page of results.
+# Run from backend/:  python -m benchmarks.bench_list_serialization --rows 20000 --limit 1000
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("TESTING", "true") # JSON location column, so the schema works on plain SQLite
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import costs, crud, models, schemas, serializers
+
+
+def seed(db, rows: int, rng: random.Random) -> None:
+    batch = []
+    for i in range(rows):
+        latitude, longitude = rng.uniform(50, 55), rng.uniform(-4, 1)
+        fees = rng.choice(["Free", "£5 per session", None])
+        batch.append({
+            "name": f"Service {i}",
+            "description": "Drop-in advice and support for local residents. " * 3,
+            "url": f"https://example.org/services/{i}",
+            "email": f"service{i}@example.org",
+            "fees": fees,
+            "category": rng.choice(["Health", "Housing", "Debt Advice", "Food"]),
+            **costs.parse_fees(fees),
+            "latitude": latitude,
+            "longitude": longitude,
+            "location": {"type": "Point", "coordinates": [longitude, latitude]},
+        })
+    db.execute(insert(models.Service), batch)
+    db.commit()
+
+
+def time_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, args.rows, random.Random(1))
+    adapter = TypeAdapter(list[schemas.Service])
+
+    def pydantic_path():
+        db.expunge_all() # Each request has a fresh session, so objects are hydrated every time
+        return adapter.dump_json(adapter.validate_python(crud.get_services(db, limit=args.limit), from_attributes=True))
+
+    def fast_path():
+        return serializers.services.dump(crud.get_services(db, limit=args.limit, columns=serializers.services.columns))
+
+    assert pydantic_path() == fast_path()
+    pydantic_ms, fast_ms = time_ms(pydantic_path, args.repeat), time_ms(fast_path, args.repeat)
+    print(f"{args.limit} services per page ({len(fast_path()) / 1024:.0f} KiB of JSON), median of {args.repeat}:")
+    print(f"  ORM + Pydantic:     {pydantic_ms:8.2f} ms")
+    print(f"  columns + orjson:   {fast_ms:8.2f} ms  ({pydantic_ms / fast_ms:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
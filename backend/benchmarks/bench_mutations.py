@@ -0,0 +1,83 @@
+# This is the bench_mutations.py file for benchmarking the crud update/delete paths.
+# Measures mutations per second and SQL statements per mutation for update_service,
+# delete_service, update_claimant and delete_claimant against a SQLite file (or --database-url).
+# Run from backend/:  python -m benchmarks.bench_mutations --rows 5000 --ops 2000
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("TESTING", "true") # JSON location column unless USE_GEOMETRY_FOR_TESTS=true
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+
+from .synthetic import random_location, seed_claimants, seed_services
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000, help="Services and claimants seeded")
+    parser.add_argument("--ops", type=int, default=2000, help="Mutations timed per operation")
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url or f"sqlite:///{tempfile.mkdtemp()}/mutations.db")
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(1)
+    with engine.begin() as connection:
+        seed_services(connection, args.rows, rng)
+        seed_claimants(connection, args.rows, rng)
+
+    statements = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+    ops = min(args.ops, args.rows)
+
+    def rename_service(db, i):
+        return crud.update_service(db, i, schemas.ServiceUpdate(name=f"Renamed {i}", fees="£3 per session"))
+
+    def move_service(db, i):
+        _, latitude, longitude = random_location(rng)
+        return crud.update_service(db, i, schemas.ServiceUpdate(latitude=latitude, longitude=longitude))
+
+    def rename_claimant(db, i):
+        return crud.update_claimant(db, i, schemas.ClaimantUpdate(name=f"Renamed {i}"))
+
+    def move_claimant(db, i):
+        _, latitude, longitude = random_location(rng)
+        return crud.update_claimant(db, i, schemas.ClaimantUpdate(home_latitude=latitude, home_longitude=longitude))
+
+    cases = [
+        ("update_service (name, fees)", rename_service),
+        ("update_service (location)", move_service),
+        ("update_claimant (name)", rename_claimant),
+        ("update_claimant (home)", move_claimant),
+        ("update_service (missing id)", lambda db, i: crud.update_service(db, args.rows + i, schemas.ServiceUpdate(name="x"))),
+        ("delete_service", lambda db, i: crud.delete_service(db, i)),
+        ("delete_claimant", lambda db, i: crud.delete_claimant(db, i)),
+    ]
+    print(f"{args.rows} services and claimants on {engine.dialect.name}, {ops} mutations each")
+    print(f"{'operation':<30}{'per second':>12}{'statements each':>18}")
+    for label, mutate in cases:
+        statements = 0
+        started = time.perf_counter()
+        for i in range(1, ops + 1):
+            with SessionLocal() as db: # A session per mutation, as per request
+                mutate(db, i)
+        elapsed = time.perf_counter() - started
+        print(f"{label:<30}{ops / elapsed:>12.0f}{statements / ops:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
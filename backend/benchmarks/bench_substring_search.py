@@ -0,0 +1,90 @@
+# This is the bench_substring_search.py file for benchmarking the category/fees substring filters.
+# Compares the plain ILIKE '%x%' scan with the n-gram index path used by crud.get_services in
+# JSON (SQLite) mode. Run from backend/:  python -m benchmarks.bench_substring_search --rows 100000
+# On PostgreSQL the same filters are served by the pg_trgm GIN indexes; check with
+#   EXPLAIN ANALYZE SELECT * FROM services WHERE category ILIKE '%legal%';
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("TESTING", "true") # JSON location column, so the schema works on plain SQLite
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from app.text_index import category_index, fees_index
+
+CATEGORIES = [f"{topic} {kind}" for topic in (
+    "Health", "Mental Health", "Housing", "Legal", "Debt", "Employment", "Education", "Food", "Family", "Disability",
+) for kind in ("Advice", "Support", "Services", "Drop-in", "Helpline")]
+
+
+def seed(db, rows: int, rng: random.Random) -> None:
+    batch = []
+    for i in range(rows):
+        batch.append({
+            "name": f"Service {i}",
+            "category": rng.choice(CATEGORIES),
+            # Mostly free text with many distinct values, like real directory data
+            "fees": rng.choice(["Free", "Free", "Donation", f"£{rng.randint(1, 500)} per session", f"£{rng.randint(1, 50)}/hour"]),
+        })
+        if len(batch) == 10_000:
+            db.execute(insert(models.Service), batch)
+            batch = []
+    if batch:
+        db.execute(insert(models.Service), batch)
+    db.commit()
+
+
+def time_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, args.rows, random.Random(1))
+
+    started = time.perf_counter()
+    crud._ensure_text_index(db, models.Service.category, category_index)
+    crud._ensure_text_index(db, models.Service.fees, fees_index)
+    print(f"{args.rows} rows; substring indexes loaded in {(time.perf_counter() - started) * 1000:.1f} ms "
+          f"({len(category_index)} categories, {len(fees_index)} fees values)")
+
+    cases = [
+        ("category", models.Service.category, "legal adv"), # ~2% of rows
+        ("category", models.Service.category, "helpline"),  # ~20% of rows
+        ("fees", models.Service.fees, "£499 "),             # rare
+        ("fees", models.Service.fees, "free"),              # common
+    ]
+    print(f"{'filter':<22}{'rows':>8}{'ILIKE scan ms':>16}{'n-gram index ms':>18}{'speedup':>10}")
+    for name, column, needle in cases:
+        def scan():
+            return db.query(models.Service).filter(column.ilike(f"%{needle}%")).order_by(models.Service.id).limit(args.limit).all()
+
+        def indexed():
+            return crud.get_services(db, limit=args.limit, **{name: needle})
+
+        assert [s.id for s in scan()] == [s.id for s in indexed()]
+        scan_ms, indexed_ms = time_ms(scan, args.repeat), time_ms(indexed, args.repeat)
+        label = f"{name}={needle!r}"
+        print(f"{label:<22}{len(scan()):>8}{scan_ms:>16.2f}{indexed_ms:>18.2f}{scan_ms / indexed_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# This is the synthetic.py file for generating realistic test data at scale for the benchmarks.
+# Services and claimants are spread around UK towns in proportion to their population, with
+# categories and fees drawn from the mix seen in ORUK directory data. Rows are inserted with Core
+# executemany in batches, so a million services load in about a minute on SQLite.
+import random
+
+from sqlalchemy import insert
+
+from app import costs, models
+
+# (town, latitude, longitude, weight ~ population in 100k)
+UK_TOWNS = [
+    ("London", 51.5074, -0.1278, 90), ("Birmingham", 52.4862, -1.8904, 11), ("Manchester", 53.4808, -2.2426, 5.5),
+    ("Leeds", 53.8008, -1.5491, 8), ("Glasgow", 55.8642, -4.2518, 6.3), ("Liverpool", 53.4084, -2.9916, 5),
+    ("Sheffield", 53.3811, -1.4701, 5.8), ("Bristol", 51.4545, -2.5879, 4.7), ("Edinburgh", 55.9533, -3.1883, 5.2),
+    ("Cardiff", 51.4816, -3.1791, 3.6), ("Leicester", 52.6369, -1.1398, 3.5), ("Newcastle upon Tyne", 54.9783, -1.6178, 3),
+    ("Nottingham", 52.9548, -1.1581, 3.2), ("Southampton", 50.9097, -1.4044, 2.5), ("Belfast", 54.5973, -5.9301, 3.4),
+    ("Plymouth", 50.3755, -4.1427, 2.6), ("Norwich", 52.6309, 1.2974, 1.4), ("Exeter", 50.7184, -3.5339, 1.3),
+    ("Inverness", 57.4778, -4.2247, 0.5), ("Aberystwyth", 52.4153, -4.0829, 0.2),
+]
+
+CATEGORIES = [
+    ("Debt Advice", 8), ("Benefits Advice", 8), ("Housing Support", 10), ("Mental Health", 10), ("Food Bank", 7),
+    ("Employment Support", 6), ("Family Support", 6), ("Disability Services", 5), ("Legal Advice", 4),
+    ("Adult Education", 4), ("Health", 8), ("Youth Services", 5), ("Older People", 5), ("Domestic Abuse Support", 3),
+    ("Addiction Recovery", 3), ("Carers Support", 4),
+]
+
+FEES = [
+    ("Free", 45), ("Free of charge", 5), ("No cost", 3), (None, 15), ("Donations welcome", 4),
+    ("£{small} per session", 10), ("£{small}-{medium} depending on income", 5), ("{pence}p per visit", 2),
+    ("Free for under 18s, otherwise £{small}", 6), ("£{medium} per term", 5),
+]
+
+# Degrees; about 6 km north-south, so towns blur into their surroundings
+TOWN_SPREAD_DEGREES = 0.05
+
+
+def _weighted(rng: random.Random, choices: list, weight_index: int = -1):
+    return rng.choices(choices, weights=[choice[weight_index] for choice in choices])[0]
+
+
+def random_location(rng: random.Random) -> tuple[str, float, float]:
+    town, latitude, longitude, _ = _weighted(rng, UK_TOWNS)
+    return town, rng.gauss(latitude, TOWN_SPREAD_DEGREES), rng.gauss(longitude, TOWN_SPREAD_DEGREES * 1.6)
+
+
+def random_fees(rng: random.Random):
+    template = _weighted(rng, FEES)[0]
+    if template is None:
+        return None
+    return template.format(small=rng.randint(1, 20), medium=rng.randint(21, 200), pence=rng.choice((50, 75, 80)))
+
+
+def _location_value(latitude: float, longitude: float):
+    if models.USE_GEOMETRY:
+        return f"SRID=4326;POINT({longitude} {latitude})"
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def seed_services(connection, count: int, rng: random.Random, batch_size: int = 10_000) -> None:
+    parsed_fees = {} # A few hundred distinct strings; parse each once
+    batch = []
+    for i in range(count):
+        town, latitude, longitude = random_location(rng)
+        category = _weighted(rng, CATEGORIES)[0]
+        fees = random_fees(rng)
+        if fees not in parsed_fees:
+            parsed_fees[fees] = costs.parse_fees(fees)
+        batch.append({
+            "name": f"{town} {category} {i}",
+            "description": f"{category} for people living in and around {town}.",
+            "url": f"https://example.org/services/{i}",
+            "email": f"service{i}@example.org",
+            "category": category,
+            "fees": fees,
+            **parsed_fees[fees],
+            "latitude": latitude,
+            "longitude": longitude,
+            "location": _location_value(latitude, longitude),
+        })
+        if len(batch) == batch_size:
+            connection.execute(insert(models.Service), batch)
+            batch = []
+    if batch:
+        connection.execute(insert(models.Service), batch)
+
+
+def seed_claimants(connection, count: int, rng: random.Random, batch_size: int = 10_000) -> None:
+    batch = []
+    for i in range(count):
+        town, latitude, longitude = random_location(rng)
+        batch.append({
+            "name": f"Claimant {i} ({town})",
+            "home_latitude": latitude,
+            "home_longitude": longitude,
+            # 1 to 10 miles
+            "travel_radius_m": rng.choice((1609.344, 3218.688, 4828.032, 8046.72, 16093.44)),
+        })
+        if len(batch) == batch_size:
+            connection.execute(insert(models.Claimant), batch)
+            batch = []
+    if batch:
+        connection.execute(insert(models.Claimant), batch)
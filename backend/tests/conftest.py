@@ -8,6 +8,11 @@ import os
 # Import Base from the app's database module to ensure all models are known
 from app.database import Base, get_db
 from app.main import app
+from app.spatial_index import service_index
+from app.text_index import category_index, fees_index
+from app.cache import response_cache
+from app.slow_queries import slow_queries
+from app.profiling import profile_store
 
 # --- Single Test Database Setup ---
 # Use a named in-memory database with shared cache for the entire test suite
@@ -109,6 +114,13 @@ def manage_tables(test_app_client): # Ensures override is set before table creat
 
     # print(f"conftest.manage_tables: Dropping tables on engine: {test_engine}")
     Base.metadata.drop_all(bind=test_engine)
+    # The in-process spatial and substring indexes outlive the tables, so reset them for the next test
+    service_index.clear()
+    category_index.clear()
+    fees_index.clear()
+    response_cache.clear() # Rows inserted directly do not bump table versions, so entries must not outlive the tables
+    slow_queries.clear()
+    profile_store.clear()
     # print("conftest.manage_tables: Tables dropped.")
 
 @pytest.fixture(scope="function")
@@ -0,0 +1,60 @@
+# This is the test_async_db.py file for the async read path (DATABASE_ASYNC=true).
+# The read endpoints are given an AsyncSession on aiosqlite over the test database; writes keep
+# going through the sync session, as they do in production.
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.database import async_database_url
+from app.main import app, get_read_db
+
+# The same database as conftest's test_engine
+SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///file:main_test_db?mode=memory&cache=shared"
+
+
+@pytest.fixture
+def async_client(test_app_client: TestClient):
+    async_engine = create_async_engine(async_database_url(SQLALCHEMY_TEST_DATABASE_URL), poolclass=NullPool)
+    AsyncTestSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_read_db():
+        async with AsyncTestSession() as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    yield test_app_client
+    del app.dependency_overrides[get_read_db]
+
+def test_async_database_url():
+    assert async_database_url("postgresql://user:pw@db:5432/servicedb") == "postgresql+asyncpg://user:pw@db:5432/servicedb"
+    assert async_database_url("postgresql+psycopg2://db/x") == "postgresql+asyncpg://db/x"
+    assert async_database_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+
+def test_read_endpoints_on_async_session(async_client: TestClient):
+    service = async_client.post("/services/", json={"name": "Clinic", "category": "Health", "latitude": 51.5, "longitude": -0.1}).json()
+    claimant = async_client.post("/claimants/", json={"name": "A", "home_latitude": 51.5, "home_longitude": -0.1}).json()
+
+    response = async_client.get("/services/?category=heal&near=51.5,-0.1&radius_m=1000")
+    assert response.status_code == 200
+    assert [s["id"] for s in response.json()] == [service["id"]]
+    assert async_client.get("/services/", headers={"If-None-Match": response.headers["ETag"]}).status_code == 200 # Different query
+
+    assert [c["name"] for c in async_client.get("/claimants/?include_total=true").json()] == ["A"]
+    single = async_client.get(f"/claimants/{claimant['id']}")
+    assert single.json()["name"] == "A"
+    assert async_client.get(f"/claimants/{claimant['id']}", headers={"If-None-Match": single.headers["ETag"]}).status_code == 304
+    assert async_client.get("/claimants/999").status_code == 404
+
+    assert [s["name"] for s in async_client.get(f"/services/within/claimant/{claimant['id']}").json()] == ["Clinic"]
+    nearest = async_client.get(f"/claimants/{claimant['id']}/nearest-services?k=1").json()
+    assert nearest[0]["id"] == service["id"]
+
+def test_export_on_async_session(async_client: TestClient):
+    async_client.post("/services/", json={"name": "Clinic", "latitude": 51.5, "longitude": -0.1})
+    async_client.post("/services/", json={"name": "Library"})
+    assert [s["name"] for s in map(json.loads, async_client.get("/services/export").text.splitlines())] == ["Clinic", "Library"]
+    features = async_client.get("/services/export?format=geojson").json()["features"]
+    assert [f["geometry"] for f in features] == [{"type": "Point", "coordinates": [-0.1, 51.5]}, None]
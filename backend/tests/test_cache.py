@@ -0,0 +1,138 @@
+# This is the test_cache.py file for the response cache.
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.cache import ResponseCache
+
+
+def _value(value):
+    async def compute():
+        return value
+    return compute
+
+def test_lru_eviction_and_ttl():
+    async def scenario():
+        cache = ResponseCache(maxsize=2, ttl_seconds=60)
+        assert await cache.get_or_compute_async("a", _value(1)) == 1
+        assert await cache.get_or_compute_async("b", _value(2)) == 2
+        assert await cache.get_or_compute_async("a", _value(0)) == 1 # Hit; "b" is now least recently used
+        await cache.get_or_compute_async("c", _value(3))
+        assert await cache.get_or_compute_async("b", _value(20)) == 20 # Was evicted
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (1, 4, 2, 2)
+
+        expiring = ResponseCache(ttl_seconds=0.01)
+        await expiring.get_or_compute_async("a", _value(1))
+        await asyncio.sleep(0.02)
+        assert await expiring.get_or_compute_async("a", _value(2)) == 2
+        assert expiring.stats()["expirations"] == 1
+
+    asyncio.run(scenario())
+
+def test_concurrent_misses_are_coalesced():
+    async def scenario():
+        cache = ResponseCache()
+        release = asyncio.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return "value"
+
+        tasks = [asyncio.create_task(cache.get_or_compute_async("key", compute)) for _ in range(8)]
+        while cache.stats()["coalesced"] < 7:
+            await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(*tasks) == ["value"] * 8
+        assert calls == [1]
+
+    asyncio.run(scenario())
+
+def test_errors_are_shared_but_not_cached():
+    async def scenario():
+        cache = ResponseCache()
+        release = asyncio.Event()
+
+        async def fail():
+            await release.wait()
+            raise ValueError("boom")
+
+        tasks = [asyncio.create_task(cache.get_or_compute_async("key", fail)) for _ in range(3)]
+        while cache.stats()["coalesced"] < 2:
+            await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError] * 3
+        assert await cache.get_or_compute_async("key", _value("ok")) == "ok"
+
+    asyncio.run(scenario())
+
+def test_cancelling_the_leader_does_not_fail_the_waiters():
+    async def scenario():
+        cache = ResponseCache()
+        started, release = asyncio.Event(), asyncio.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            started.set()
+            await release.wait()
+            return len(calls)
+
+        leader = asyncio.create_task(cache.get_or_compute_async("key", compute))
+        await started.wait()
+        waiters = [asyncio.create_task(cache.get_or_compute_async("key", compute)) for _ in range(3)]
+        while cache.stats()["coalesced"] < 3:
+            await asyncio.sleep(0)
+
+        leader.cancel() # e.g. its client disconnected
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        release.set()
+        # One waiter took over the computation and the others shared its result
+        assert await asyncio.gather(*waiters) == [2, 2, 2]
+        assert calls == [1, 1]
+        assert await cache.get_or_compute_async("key", _value(0)) == 2 # Cached
+
+    asyncio.run(scenario())
+
+def test_cancelling_a_waiter_does_not_cancel_the_flight():
+    async def scenario():
+        cache = ResponseCache()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "value"
+
+        leader = asyncio.create_task(cache.get_or_compute_async("key", compute))
+        waiter = asyncio.create_task(cache.get_or_compute_async("key", compute))
+        while cache.stats()["coalesced"] < 1:
+            await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        assert await leader == "value"
+        assert waiter.cancelled()
+
+    asyncio.run(scenario())
+
+def test_list_endpoints_are_cached_until_a_write(test_app_client: TestClient):
+    test_app_client.post("/services/", json={"name": "First", "fees": "Free"})
+    first = test_app_client.get("/services/?limit=1&fees=free")
+    again = test_app_client.get("/services/?fees=free&limit=1") # Same query, different parameter order
+    assert again.json() == first.json()
+    assert again.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+    stats = test_app_client.get("/cache/stats").json()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    test_app_client.post("/services/", json={"name": "Second", "fees": "Free"})
+    assert len(test_app_client.get("/services/?fees=free").json()) == 2
+
+    test_app_client.get("/claimants/")
+    claimant = test_app_client.post("/claimants/", json={"name": "C", "home_latitude": 51.5, "home_longitude": -0.1}).json()
+    assert [c["id"] for c in test_app_client.get("/claimants/").json()] == [claimant["id"]]
+    test_app_client.delete(f"/claimants/{claimant['id']}")
+    assert test_app_client.get("/claimants/").json() == []
@@ -1,11 +1,18 @@
 # This is the test_claimants.py file for claimant-related tests.
+import json
+import math
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 # from typing import Optional # Not needed for these tests yet
 
 # app.main and models are imported by conftest or via fixtures
-from app.models import Claimant as ClaimantModel
+from app import async_crud, crud, models, schemas, serializers
+from app.models import Claimant as ClaimantModel, Service as ServiceModel
+from app.spatial_index import service_index
+from app.schemas import ClaimantUpdate
 # from app.schemas import ClaimantCreate, Claimant as ClaimantSchema # For direct schema use if needed
 
 # Test functions will now receive 'test_app_client' and 'db_session_for_direct_use' as arguments from conftest.py
@@ -31,10 +38,16 @@ def test_create_claimant(test_app_client: TestClient, db_session_for_direct_use:
     assert data["home_latitude"] == claimant_data["home_latitude"]
     assert data["home_longitude"] == claimant_data["home_longitude"]
     assert "id" in data
-    assert "travel_extent_geojson" in data
-    assert data["travel_extent_geojson"] is not None
-    assert data["travel_extent_geojson"]["type"] == "Polygon" # From Shapely's mapping()
-    assert len(data["travel_extent_geojson"]["coordinates"][0]) > 3 # A polygon has multiple points
+    assert data["travel_radius_m"] == pytest.approx(8046.72) # Default 5 miles
+    # The travel extent polygon is only generated when the map asks for it
+    assert data["travel_extent_geojson"] is None
+
+    extent_response = test_app_client.get(f"/claimants/{data['id']}/travel-extent")
+    assert extent_response.status_code == 200
+    extent = extent_response.json()
+    assert extent["type"] == "Polygon"
+    assert len(extent["coordinates"][0]) == 33 # 32 segments plus the closing point
+    assert test_app_client.get(f"/claimants/{data['id']}").json()["travel_extent_geojson"] == extent # Stored once generated
 
     # Verify it's in the database using the provided db_session_for_direct_use
     db_claimant = db_session_for_direct_use.query(ClaimantModel).filter(ClaimantModel.id == data["id"]).first()
@@ -64,6 +77,30 @@ def test_read_claimants_after_creation(test_app_client: TestClient): # No direct
     assert claimant_data1["name"] in names_in_response
     assert claimant_data2["name"] in names_in_response
 
+def test_read_claimants_keyset_pagination(test_app_client: TestClient):
+    for name in ["Carol", "Alice", "Bob"]:
+        test_app_client.post("/claimants/", json={"name": name, "home_latitude": 52.0, "home_longitude": -1.0})
+
+    first = test_app_client.get("/claimants/?limit=2&order_by=name&include_total=true")
+    assert first.status_code == 200
+    assert [c["name"] for c in first.json()] == ["Alice", "Bob"]
+    assert first.headers["X-Total-Count"] == "3"
+
+    second = test_app_client.get(f"/claimants/?limit=2&cursor={first.headers['X-Next-Cursor']}")
+    assert [c["name"] for c in second.json()] == ["Carol"] # The cursor keeps the name order
+    assert "X-Next-Cursor" not in second.headers
+    assert test_app_client.get("/claimants/?cursor=garbage").status_code == 400
+
+def test_read_claimants_without_extent(test_app_client: TestClient):
+    claimant_id = test_app_client.post("/claimants/", json={"name": "A", "home_latitude": 52.0, "home_longitude": -1.0}).json()["id"]
+    test_app_client.get(f"/claimants/{claimant_id}/travel-extent") # Stores the polygon
+
+    assert test_app_client.get("/claimants/").json()[0]["travel_extent_geojson"]["type"] == "Polygon"
+    claimant = test_app_client.get("/claimants/?include_extent=false").json()[0]
+    assert "travel_extent_geojson" not in claimant
+    assert claimant["name"] == "A"
+    assert test_app_client.get("/claimants/?include_extent=false&fields=name").json() == [{"name": "A", "id": claimant_id}]
+
 def test_read_single_claimant(test_app_client: TestClient, db_session_for_direct_use: Session):
     claimant_data = {
         "name": "Specific Claimant",
@@ -79,7 +116,37 @@ def test_read_single_claimant(test_app_client: TestClient, db_session_for_direct
     data = response.json()
     assert data["name"] == claimant_data["name"]
     assert data["id"] == created_claimant_id
-    assert data["travel_extent_geojson"] is not None # Default extent is created
+    assert data["travel_radius_m"] is not None # Default travel radius is set
+
+def test_conditional_get_claimant(test_app_client: TestClient):
+    claimant_id = test_app_client.post("/claimants/", json={"name": "E", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+    response = test_app_client.get(f"/claimants/{claimant_id}")
+    etag = response.headers["ETag"]
+    assert test_app_client.get(f"/claimants/{claimant_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    test_app_client.patch(f"/claimants/{claimant_id}", json={"name": "E2"})
+    response = test_app_client.get(f"/claimants/{claimant_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["name"] == "E2"
+    assert response.headers["ETag"] != etag
+
+    # The list's ETag depends on the query and on every claimant write
+    list_etag = test_app_client.get("/claimants/").headers["ETag"]
+    assert test_app_client.get("/claimants/", headers={"If-None-Match": list_etag}).status_code == 304
+    assert test_app_client.get("/claimants/?limit=5").headers["ETag"] != list_etag
+    test_app_client.post("/claimants/", json={"name": "F", "home_latitude": 51.5, "home_longitude": -0.1})
+    assert test_app_client.get("/claimants/", headers={"If-None-Match": list_etag}).status_code == 200
+
+def test_conditional_get_claimant_after_id_reuse(test_app_client: TestClient):
+    claimant_id = test_app_client.post("/claimants/", json={"name": "Old", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+    etag = test_app_client.get(f"/claimants/{claimant_id}").headers["ETag"]
+    test_app_client.delete(f"/claimants/{claimant_id}")
+
+    # SQLite hands the highest rowid out again, and the new row starts again at version 1
+    assert test_app_client.post("/claimants/", json={"name": "New", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"] == claimant_id
+    response = test_app_client.get(f"/claimants/{claimant_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["name"] == "New"
 
 def test_read_non_existent_claimant(test_app_client: TestClient):
     response = test_app_client.get("/claimants/99999")
@@ -91,7 +158,7 @@ def test_update_claimant_details(test_app_client: TestClient, db_session_for_dir
     assert create_resp.status_code == 200
     created_claimant = create_resp.json()
     claimant_id = created_claimant["id"]
-    original_extent = created_claimant["travel_extent_geojson"]
+    original_extent = test_app_client.get(f"/claimants/{claimant_id}/travel-extent").json()
 
     update_payload = {"name": "Updated Name", "home_latitude": 12.0, "home_longitude": 12.0}
     response = test_app_client.patch(f"/claimants/{claimant_id}", json=update_payload)
@@ -100,13 +167,14 @@ def test_update_claimant_details(test_app_client: TestClient, db_session_for_dir
     assert data["name"] == "Updated Name"
     assert data["home_latitude"] == 12.0
     assert data["home_longitude"] == 12.0
-    assert data["travel_extent_geojson"] is not None
-    assert data["travel_extent_geojson"] != original_extent # Extent should have been recalculated
+    assert data["travel_extent_geojson"] is None # Stale extent dropped, regenerated on next request
+    new_extent = test_app_client.get(f"/claimants/{claimant_id}/travel-extent").json()
+    assert new_extent != original_extent # Extent should have been recalculated
 
     # Check DB
     db_claimant = db_session_for_direct_use.query(ClaimantModel).filter(ClaimantModel.id == claimant_id).first()
     assert db_claimant.name == "Updated Name"
-    assert db_claimant.travel_extent_geojson != original_extent
+    assert db_claimant.travel_extent_geojson == new_extent
 
 def test_update_claimant_name_only(test_app_client: TestClient, db_session_for_direct_use: Session):
     claimant_data = {"name": "Name Only Original", "home_latitude": 20.0, "home_longitude": 20.0}
@@ -114,7 +182,7 @@ def test_update_claimant_name_only(test_app_client: TestClient, db_session_for_d
     assert create_resp.status_code == 200
     created_claimant = create_resp.json()
     claimant_id = created_claimant["id"]
-    original_extent = created_claimant["travel_extent_geojson"]
+    original_extent = test_app_client.get(f"/claimants/{claimant_id}/travel-extent").json()
     original_lat = created_claimant["home_latitude"]
     original_lon = created_claimant["home_longitude"]
 
@@ -127,6 +195,32 @@ def test_update_claimant_name_only(test_app_client: TestClient, db_session_for_d
     assert data["home_longitude"] == original_lon # Should not change
     assert data["travel_extent_geojson"] == original_extent # Extent should NOT be recalculated
 
+def test_update_claimant_same_home_keeps_extent(test_app_client: TestClient, db_session_for_direct_use: Session):
+    claimant = test_app_client.post("/claimants/", json={"name": "Same Home", "home_latitude": 20.0, "home_longitude": 20.0}).json()
+    extent = test_app_client.get(f"/claimants/{claimant['id']}/travel-extent").json()
+
+    # Home and radius resent unchanged: the stored extent is still valid
+    response = test_app_client.patch(f"/claimants/{claimant['id']}", json={
+        "name": "Same Home 2", "home_latitude": 20.0, "home_longitude": 20.0, "travel_radius_m": claimant["travel_radius_m"],
+    })
+    assert response.json()["travel_extent_geojson"] == extent
+    assert response.json()["name"] == "Same Home 2"
+    assert test_app_client.patch("/claimants/99999", json={"name": "Nobody"}).status_code == 404
+
+def test_update_claimant_is_one_statement(test_app_client: TestClient, db_session_for_direct_use: Session):
+    # UPDATE ... RETURNING replaces the SELECT before and the refresh after; the other statement bumps the table version
+    claimant = test_app_client.post("/claimants/", json={"name": "A", "home_latitude": 20.0, "home_longitude": 20.0}).json()
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session_for_direct_use.get_bind(), "before_cursor_execute", listener)
+    try:
+        updated = crud.update_claimant(db_session_for_direct_use, claimant["id"], ClaimantUpdate(name="B"))
+    finally:
+        event.remove(db_session_for_direct_use.get_bind(), "before_cursor_execute", listener)
+    assert updated.name == "B" and updated.version == crud.get_claimant_version(db_session_for_direct_use, claimant["id"]) == 2
+    assert len(statements) == 2
+    assert statements[0].lstrip().startswith("UPDATE claimants") and "RETURNING" in statements[0]
+
 def test_delete_claimant(test_app_client: TestClient, db_session_for_direct_use: Session):
     claimant_data = {"name": "To Be Deleted", "home_latitude": 30.0, "home_longitude": 30.0}
     create_resp = test_app_client.post("/claimants/", json=claimant_data)
@@ -144,3 +238,187 @@ def test_delete_claimant(test_app_client: TestClient, db_session_for_direct_use:
 def test_delete_non_existent_claimant(test_app_client: TestClient):
     response = test_app_client.delete("/claimants/99999")
     assert response.status_code == 404
+
+def test_batch_update_and_delete_claimants(test_app_client: TestClient, db_session_for_direct_use: Session):
+    ids = [test_app_client.post("/claimants/", json={"name": f"C{i}", "home_latitude": 20.0, "home_longitude": 20.0}).json()["id"] for i in range(3)]
+    extent = test_app_client.get(f"/claimants/{ids[0]}/travel-extent").json()
+    test_app_client.get(f"/claimants/{ids[1]}/travel-extent")
+
+    response = test_app_client.patch("/claimants/batch", json=[
+        {"id": ids[0], "home_latitude": 20.0}, # Unchanged home keeps the extent
+        {"id": ids[1], "home_latitude": 21.0},
+        {"id": ids[2], "name": "Renamed"},
+        {"id": 99999, "name": "Nobody"},
+    ])
+    assert response.json()["applied"] == 3 and response.json()["not_found"] == 1
+    claimants = {c["id"]: c for c in test_app_client.get("/claimants/").json()}
+    assert claimants[ids[0]]["travel_extent_geojson"] == extent
+    assert claimants[ids[1]]["travel_extent_geojson"] is None and claimants[ids[1]]["home_latitude"] == 21.0
+    assert claimants[ids[2]]["name"] == "Renamed"
+
+    response = test_app_client.request("DELETE", "/claimants/batch", json=[ids[1], 99999])
+    assert response.json()["results"] == [{"id": ids[1], "status": 200}, {"id": 99999, "status": 404}]
+    assert sorted(c["id"] for c in test_app_client.get("/claimants/").json()) == [ids[0], ids[2]]
+
+def test_nearest_services_for_claimant(test_app_client: TestClient):
+    claimant_id = test_app_client.post("/claimants/", json={"name": "Near Claimant", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+    for name, category, lat, lon in [
+        ("Food Bank Far", "Food", 52.5, -1.5),
+        ("Food Bank Near", "Food", 51.51, -0.1),
+        ("Clinic Nearest", "Health", 51.501, -0.1),
+        ("Food Bank Mid", "Food", 51.6, -0.1),
+    ]:
+        test_app_client.post("/services/", json={"name": name, "category": category, "latitude": lat, "longitude": lon})
+    test_app_client.post("/services/", json={"name": "Food Bank Unlocated", "category": "Food"})
+
+    response = test_app_client.get(f"/claimants/{claimant_id}/nearest-services?k=2")
+    assert response.status_code == 200
+    data = response.json()
+    assert [s["name"] for s in data] == ["Clinic Nearest", "Food Bank Near"]
+    assert data[0]["distance_m"] == pytest.approx(111, abs=2)
+    assert data[1]["distance_m"] == pytest.approx(1112, abs=5)
+
+    response = test_app_client.get(f"/claimants/{claimant_id}/nearest-services?category=food")
+    assert [s["name"] for s in response.json()] == ["Food Bank Near", "Food Bank Mid", "Food Bank Far"]
+
+def test_nearest_services_errors(test_app_client: TestClient):
+    assert test_app_client.get("/claimants/99999/nearest-services").status_code == 404
+    claimant_id = test_app_client.post("/claimants/", json={"name": "K Claimant", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+    assert test_app_client.get(f"/claimants/{claimant_id}/nearest-services?k=0").status_code == 422
+    assert test_app_client.get(f"/claimants/{claimant_id}/nearest-services").json() == []
+
+def test_nearest_services_see_writes_from_other_processes(test_app_client: TestClient, db_session_for_direct_use: Session):
+    claimant_id = test_app_client.post("/claimants/", json={"name": "Other Writers", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+    far = test_app_client.post("/services/", json={"name": "Far", "latitude": 51.6, "longitude": -0.1}).json()
+    url = f"/claimants/{claimant_id}/nearest-services"
+    assert [s["name"] for s in test_app_client.get(url).json()] == ["Far"] # Loads the spatial index
+
+    # This process's own writes are applied to the index in place, without a reload
+    test_app_client.post("/services/", json={"name": "Mid", "latitude": 51.55, "longitude": -0.1})
+    assert service_index.version == crud.get_table_versions(db_session_for_direct_use, ("services",))[0]
+
+    # Written as another worker would: the rows and a services version bump, but nothing in this process's index
+    db_session_for_direct_use.add(ServiceModel(name="Near", location={"type": "Point", "coordinates": [-0.1, 51.51]}, latitude=51.51, longitude=-0.1))
+    db_session_for_direct_use.query(ServiceModel).filter(ServiceModel.id == far["id"]).delete()
+    crud.bump_table_versions(db_session_for_direct_use, "services")
+    db_session_for_direct_use.commit()
+    assert [s["name"] for s in test_app_client.get(url).json()] == ["Near", "Mid"]
+
+def test_nearest_services_with_geometry_locations(test_app_client: TestClient, monkeypatch):
+    # Under PostGIS the location column is a geometry; the endpoint must select it as GeoJSON
+    # through the serializer rather than validate the ORM row (a WKBElement is not a dict)
+    claimant_id = test_app_client.post("/claimants/", json={"name": "PostGIS Claimant", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+    monkeypatch.setattr(models, "USE_GEOMETRY", True)
+    monkeypatch.setattr(serializers, "services", serializers.RowSerializer(models.Service, schemas.Service))
+    location = {"type": "Point", "coordinates": [-0.1, 51.501]}
+
+    async def get_nearest_services(db, latitude, longitude, columns, k, category=None):
+        names = serializers.services.names
+        assert "ST_AsGeoJSON" in str(columns[names.index("location")])
+        values = {"id": 7, "name": "Clinic", "category": "Health", "location": json.dumps(location)}
+        return [(tuple(values.get(name) for name in names), 111.2)]
+
+    monkeypatch.setattr(async_crud, "get_nearest_services", get_nearest_services)
+    response = test_app_client.get(f"/claimants/{claimant_id}/nearest-services")
+    assert response.status_code == 200
+    (service,) = response.json()
+    assert (service["id"], service["location"], service["distance_m"]) == (7, location, 111.2)
+
+def test_nearest_services_search_is_bounded(test_app_client: TestClient, db_session_for_direct_use: Session, monkeypatch):
+    monkeypatch.setattr(crud, "MAX_NEAREST_CANDIDATES", 60)
+    claimant_id = test_app_client.post("/claimants/", json={"name": "Bounded", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+    for i in range(100):
+        category = "Rare" if i in (10, 90) else "Common"
+        test_app_client.post("/services/", json={"name": f"S{i}", "category": category, "latitude": 51.5 + i / 1000, "longitude": -0.1})
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session_for_direct_use.get_bind(), "before_cursor_execute", listener)
+    try:
+        # Only the 60 nearest candidates are examined: the second "Rare" service is beyond the cap
+        response = test_app_client.get(f"/claimants/{claimant_id}/nearest-services?category=rare&k=5")
+        assert [s["name"] for s in response.json()] == ["S10"]
+        assert test_app_client.get(f"/claimants/{claimant_id}/nearest-services?category=none").json() == []
+    finally:
+        event.remove(db_session_for_direct_use.get_bind(), "before_cursor_execute", listener)
+    # Two batches per request (50, then the last 10 candidates), not one per 50 services in the index
+    assert sum("FROM services" in statement and "services.category" in statement for statement in statements) == 4
+
+def test_claimant_travel_radius(test_app_client: TestClient):
+    response = test_app_client.post("/claimants/", json={"name": "Short Trips", "home_latitude": 51.5, "home_longitude": -0.1, "travel_radius_m": 1000})
+    assert response.status_code == 200
+    claimant_id = response.json()["id"]
+    assert response.json()["travel_radius_m"] == 1000
+
+    # ~556m and ~1.5km north of home
+    near_id = test_app_client.post("/services/", json={"name": "Near", "latitude": 51.505, "longitude": -0.1}).json()["id"]
+    far_id = test_app_client.post("/services/", json={"name": "Far", "latitude": 51.5135, "longitude": -0.1}).json()["id"]
+    assert [s["id"] for s in test_app_client.get(f"/services/within/claimant/{claimant_id}").json()] == [near_id]
+
+    test_app_client.patch(f"/claimants/{claimant_id}", json={"travel_radius_m": 2000})
+    assert [s["id"] for s in test_app_client.get(f"/services/within/claimant/{claimant_id}").json()] == [near_id, far_id]
+
+    # The generated polygon is geodesic: ~2km in both directions despite the latitude
+    ring = test_app_client.get(f"/claimants/{claimant_id}/travel-extent").json()["coordinates"][0]
+    lons = [lon for lon, _ in ring]
+    lats = [lat for _, lat in ring]
+    assert (max(lats) - 51.5) * 111195 == pytest.approx(2000, rel=0.01)
+    assert (max(lons) + 0.1) * 111195 * math.cos(math.radians(51.5)) == pytest.approx(2000, rel=0.01)
+
+    assert test_app_client.post("/claimants/", json={"name": "Bad", "home_latitude": 51.5, "home_longitude": -0.1, "travel_radius_m": 0}).status_code == 422
+    assert test_app_client.get("/claimants/99999/travel-extent").status_code == 404
+
+def test_bulk_create_claimants_json(test_app_client: TestClient, db_session_for_direct_use: Session):
+    service_id = test_app_client.post("/services/", json={"name": "Hub", "latitude": 51.5, "longitude": -0.1}).json()["id"]
+    payload = [
+        {"name": "Bulk One", "home_latitude": 51.501, "home_longitude": -0.1},
+        {"name": "Bulk Bad", "home_latitude": "north", "home_longitude": -0.1},
+        {"name": "Bulk Two", "home_latitude": 53.0, "home_longitude": -1.0, "travel_radius_m": 2000},
+        {"home_latitude": 51.0, "home_longitude": 0.0}, # Missing name
+        {"name": "Bulk Three", "home_latitude": 51.502, "home_longitude": -0.1},
+    ]
+    response = test_app_client.post("/claimants/bulk?batch_size=2", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 3
+    assert [e["row"] for e in data["errors"]] == [2, 4]
+    assert "home_latitude" in data["errors"][0]["error"]
+    assert "name" in data["errors"][1]["error"]
+
+    claimants = {c["name"]: c for c in test_app_client.get("/claimants/").json()}
+    assert set(claimants) == {"Bulk One", "Bulk Two", "Bulk Three"}
+    assert claimants["Bulk Two"]["travel_radius_m"] == 2000
+    # Extents are precomputed for bulk imports, matching what the lazy path would generate
+    one = claimants["Bulk One"]
+    assert one["travel_extent_geojson"] == test_app_client.get(f"/claimants/{one['id']}/travel-extent").json()
+    assert len(one["travel_extent_geojson"]["coordinates"][0]) == 33
+
+    # Reachability is maintained for the imported claimants
+    assert [s["id"] for s in test_app_client.get(f"/services/within/claimant/{one['id']}").json()] == [service_id]
+    assert test_app_client.get(f"/services/within/claimant/{claimants['Bulk Two']['id']}").json() == []
+
+def test_bulk_create_claimants_csv(test_app_client: TestClient):
+    body = "name,home_latitude,home_longitude,travel_radius_m\nCsv One,51.5,-0.1,\nCsv Two,52.0,-1.0,1500\nCsv Bad,,-1.0,\n"
+    response = test_app_client.post("/claimants/bulk", content=body.encode(), headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert [e["row"] for e in data["errors"]] == [3]
+    radii = {c["name"]: c["travel_radius_m"] for c in test_app_client.get("/claimants/").json()}
+    assert radii == {"Csv One": pytest.approx(8046.72), "Csv Two": 1500}
+
+def test_bulk_create_claimants_rejects_non_array(test_app_client: TestClient):
+    assert test_app_client.post("/claimants/bulk", json={"name": "Not a list"}).status_code == 400
+    assert test_app_client.post("/claimants/bulk", content=b"not json", headers={"Content-Type": "application/json"}).status_code == 400
+
+def test_export_claimants(test_app_client: TestClient):
+    for name in ("A", "B"):
+        test_app_client.post("/claimants/", json={"name": name, "home_latitude": 51.5, "home_longitude": -0.1})
+
+    lines = test_app_client.get("/claimants/export").text.splitlines()
+    assert [json.loads(line) for line in lines] == test_app_client.get("/claimants/").json()
+
+    collection = test_app_client.get("/claimants/export?format=geojson&include_extent=false").json()
+    assert [f["properties"]["name"] for f in collection["features"]] == ["A", "B"]
+    assert collection["features"][0]["geometry"] == {"type": "Point", "coordinates": [-0.1, 51.5]}
+    assert "travel_extent_geojson" not in collection["features"][0]["properties"]
@@ -0,0 +1,25 @@
+# This is the test_costs.py file for parsing free-text fees into structured costs.
+import pytest
+
+from app.costs import parse_fees
+
+
+@pytest.mark.parametrize("fees, expected", [
+    ("Free", (True, 0.0, 0.0, None)),
+    ("No charge", (True, 0.0, 0.0, None)),
+    ("£0", (True, 0.0, 0.0, "GBP")),
+    ("£5 - £10 per session", (False, 5.0, 10.0, "GBP")),
+    ("£5-10", (False, 5.0, 10.0, "GBP")),
+    ("£10 to £20", (False, 10.0, 20.0, "GBP")),
+    ("Free for under 18s, otherwise £3", (False, 0.0, 3.0, "GBP")),
+    ("50p per visit", (False, 0.5, 0.5, "GBP")),
+    ("£1,250 per year", (False, 1250.0, 1250.0, "GBP")),
+    ("EUR 12.50", (False, 12.5, 12.5, "EUR")),
+    ("Costs 20 pounds", (False, 20.0, 20.0, "GBP")),
+    ("Donations welcome", (None, None, None, None)),
+    ("Freephone 0800 123 456", (None, None, None, None)), # Not "free", and the numbers have no currency
+    (None, (None, None, None, None)),
+])
+def test_parse_fees(fees, expected):
+    result = parse_fees(fees)
+    assert (result["is_free"], result["min_cost"], result["max_cost"], result["currency"]) == expected
@@ -0,0 +1,85 @@
+# This is the test_database.py file for pool configuration and read-replica routing (app/database.py).
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import database
+from app.database import READ_STICKY_COOKIE, TimedQueuePool, engine_options, get_db
+from app.main import app
+
+
+def test_engine_options(monkeypatch):
+    assert engine_options("sqlite:///./test.db") == {}
+
+    options = engine_options("postgresql://user:pw@db/servicedb")
+    assert options["poolclass"] is TimedQueuePool
+    assert options["pool_pre_ping"] is True
+    assert "connect_args" not in options
+
+    monkeypatch.setattr(database, "STATEMENT_TIMEOUT_MS", 5000)
+    assert engine_options("postgresql://db/x")["connect_args"] == {"options": "-c statement_timeout=5000"}
+    assert engine_options("postgresql://db/x", async_driver=True)["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+
+def test_pool_checkout_waits_are_recorded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/pool.db", poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        with pytest.raises(exc.TimeoutError): # The only connection is checked out
+            engine.connect()
+
+    held = engine.connect()
+    threading.Timer(0.1, held.close).start()
+    engine.pool._timeout = 5
+    with engine.connect(): # Waits for the timer to return the connection
+        pass
+
+    stats = engine.pool.metrics.snapshot()
+    assert stats["checkouts"] == 3
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds_max"] >= 0.05
+    assert stats["wait_buckets"]["0.05"] < stats["wait_buckets"]["5.0"] == 4
+
+    engine.dispose() # Replaces the pool; the metrics carry over
+    assert engine.pool.metrics.checkouts == 3
+
+@pytest.fixture
+def routed_client(test_app_client: TestClient, db_session_for_direct_use: Session, monkeypatch):
+    # The real get_db, with primary and replica sessions (both on the test database) that record which one each request used
+    used = []
+    TestSession = sessionmaker(autoflush=False, bind=db_session_for_direct_use.get_bind())
+
+    def session_factory(name):
+        def make_session():
+            used.append(name)
+            return TestSession()
+        return make_session
+
+    monkeypatch.setattr(database, "SessionLocal", session_factory("primary"))
+    monkeypatch.setattr(database, "ReadSessionLocal", session_factory("replica"))
+    override = app.dependency_overrides.pop(get_db)
+    test_app_client.cookies.clear()
+    yield test_app_client, used
+    app.dependency_overrides[get_db] = override
+    test_app_client.cookies.clear()
+
+def test_reads_go_to_replica_until_client_writes(routed_client):
+    client, used = routed_client
+    client.get("/services/")
+    assert used == ["replica"]
+
+    claimant = client.post("/claimants/", json={"name": "A", "home_latitude": 51.5, "home_longitude": -0.1})
+    assert READ_STICKY_COOKIE in claimant.cookies
+    client.get(f"/claimants/{claimant.json()['id']}") # Reads its own write from the primary
+    assert used[1:] == ["primary", "primary"]
+
+    client.cookies.set(READ_STICKY_COOKIE, "0") # Stickiness has expired
+    client.get("/services/")
+    client.get(f"/claimants/{claimant.json()['id']}/travel-extent") # A GET that writes
+    assert used[3:] == ["replica", "primary"]
+
+def test_pool_stats_endpoint(test_app_client: TestClient):
+    # The SQLite engines used here keep SQLAlchemy's default pools, which are not timed
+    assert test_app_client.get("/database/pool-stats").json() == {}
@@ -0,0 +1,99 @@
+# This is the test_importer.py file for the bulk ORUK service importer.
+import io
+import json
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import importer
+from app.models import Service
+
+ORUK_RECORDS = [
+    {
+        "id": "svc-1",
+        "name": "Community Food Bank",
+        "description": "Emergency food parcels",
+        "url": "https://example.org/food",
+        "email": "food@example.org",
+        "fees": "Free",
+        "service_taxonomys": [{"taxonomy": {"name": "Food"}}],
+        "service_at_locations": [{"location": {"latitude": 51.5, "longitude": -0.1}}],
+    },
+    {
+        "id": "svc-2",
+        "name": "Debt Advice",
+        "cost_options": [{"amount": 10, "currency": "£"}],
+        "attributes": [{"taxonomy_term": {"name": "Money"}}],
+    },
+    {"id": "svc-3", "description": "No name"},
+]
+
+
+def test_iter_json_records_streams_arrays_and_pages():
+    payload = json.dumps(ORUK_RECORDS).encode()
+    assert list(importer.iter_json_records(io.BytesIO(payload))) == ORUK_RECORDS
+
+    page = json.dumps({"totalElements": 3, "content": ORUK_RECORDS}).encode()
+    assert list(importer.iter_json_records(io.BytesIO(page))) == ORUK_RECORDS
+
+def test_iter_json_records_across_chunk_boundaries(monkeypatch):
+    monkeypatch.setattr(importer, "_READ_CHUNK_SIZE", 7) # Force records to straddle reads
+    payload = json.dumps(ORUK_RECORDS * 20, indent=2).encode()
+    assert list(importer.iter_json_records(io.BytesIO(payload))) == ORUK_RECORDS * 20
+
+def test_oruk_to_service_row():
+    row = importer.oruk_to_service_row(ORUK_RECORDS[0])
+    assert row == {
+        "name": "Community Food Bank", "description": "Emergency food parcels", "url": "https://example.org/food",
+        "email": "food@example.org", "fees": "Free", "category": "Food", "latitude": 51.5, "longitude": -0.1,
+        "is_free": True, "min_cost": 0.0, "max_cost": 0.0, "currency": None,
+    }
+    row = importer.oruk_to_service_row(ORUK_RECORDS[1])
+    assert (row["fees"], row["category"], row["latitude"]) == ("£10", "Money", None)
+    assert (row["is_free"], row["min_cost"], row["currency"]) == (False, 10.0, "GBP") # From cost_options
+
+def test_import_services_endpoint_json(test_app_client: TestClient, db_session_for_direct_use: Session):
+    claimant_id = test_app_client.post("/claimants/", json={"name": "Importer", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+
+    response = test_app_client.post("/services/import?batch_size=1", content=json.dumps(ORUK_RECORDS).encode())
+    assert response.status_code == 200
+    result = response.json()
+    assert result["imported"] == 2
+    assert result["failed"] == 1
+    assert result["errors"] == [{"row": 3, "error": "name is required"}]
+    assert result["rows_per_second"] > 0
+
+    services = {s.name: s for s in db_session_for_direct_use.query(Service)}
+    assert services["Community Food Bank"].location == {"type": "Point", "coordinates": [-0.1, 51.5]}
+    assert services["Debt Advice"].location is None
+    # Imported services are reachable, and visible to the spatial filters
+    assert [s["name"] for s in test_app_client.get(f"/services/within/claimant/{claimant_id}").json()] == ["Community Food Bank"]
+    assert [s["name"] for s in test_app_client.get("/services/?near=51.5,-0.1&radius_m=100").json()] == ["Community Food Bank"]
+
+def test_import_services_endpoint_csv(test_app_client: TestClient):
+    body = "name,category,fees,latitude,longitude\nCsv Clinic,Health,Free,51.5,-0.1\n,Health,,,\nCsv Advice,Money,,,\n"
+    response = test_app_client.post("/services/import?format=csv", content=body.encode())
+    assert response.status_code == 200
+    assert (response.json()["imported"], response.json()["failed"]) == (2, 1)
+    assert {s["name"] for s in test_app_client.get("/services/?category=Health").json()} == {"Csv Clinic"}
+
+def test_import_services_rejects_malformed_json(test_app_client: TestClient):
+    assert test_app_client.post("/services/import", content=b'[{"name": "x"').status_code == 400
+    assert test_app_client.post("/services/import", content=b'{"name": "x"}').status_code == 400
+
+def test_import_services_reports_rejected_batches(test_app_client: TestClient, db_session_for_direct_use: Session):
+    # A value the driver cannot bind fails its whole batch; the other batches are still imported
+    records = [{"name": "First"}, {"name": "Second"}, {"name": "Bad", "description": {"not": "text"}}, {"name": "Fourth"}]
+    response = test_app_client.post("/services/import?batch_size=2", content=json.dumps(records).encode())
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported"], result["failed"]) == (2, 2)
+    assert [error["row"] for error in result["errors"]] == [3, 4]
+    assert all(error["error"].startswith("batch not written: ") for error in result["errors"])
+    assert {s.name for s in db_session_for_direct_use.query(Service)} == {"First", "Second"}
+
+def test_import_services_rejects_long_currency():
+    record = {"name": "Odd", "cost_options": [{"amount": 5, "currency": "pounds"}]}
+    result = importer.import_services(None, iter([record]))
+    assert (result["imported"], result["failed"]) == (0, 1)
+    assert result["errors"] == [{"row": 1, "error": "invalid currency 'POUNDS', expected a 3-letter code"}]
@@ -0,0 +1,53 @@
+# This is the test_metrics.py file for GET /metrics and the structured logging setup.
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+from app.logs import DebugSampler, JsonFormatter
+from app.metrics import REGISTRY
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_requests_are_timed_by_route_with_sql_accounting(test_app_client: TestClient):
+    claimant = test_app_client.post("/claimants/", json={"name": "A", "home_latitude": 51.5, "home_longitude": -0.1}).json()
+    labels = {"method": "GET", "route": "/claimants/{claimant_id}"}
+    requests_before = _sample("http_request_sql_statements_count", **labels)
+    statements_before = _sample("http_request_sql_statements_sum", **labels)
+
+    test_app_client.get(f"/claimants/{claimant['id']}")
+    test_app_client.get("/claimants/999999")
+
+    assert _sample("http_request_sql_statements_count", **labels) == requests_before + 2
+    assert _sample("http_request_sql_statements_sum", **labels) > statements_before # Both looked the claimant up
+    assert _sample("http_request_duration_seconds_count", status="404", **labels) >= 1
+    assert _sample("http_requests_in_progress", method="GET") == 0
+
+    test_app_client.get("/no/such/path")
+    assert _sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") >= 1
+
+def test_metrics_endpoint(test_app_client: TestClient):
+    test_app_client.get("/services/")
+    response = test_app_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/services/",status="200"}' in response.text
+    assert "http_request_sql_seconds_sum" in response.text
+
+def test_json_log_records_carry_extra_fields():
+    record = logging.LogRecord("app.crud", logging.INFO, __file__, 1, "Loaded %s", ("values",), None)
+    record.column = "fees"
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Loaded values"
+    assert entry["level"] == "info"
+    assert entry["column"] == "fees"
+
+def test_debug_records_are_sampled():
+    def record(level):
+        return logging.LogRecord("app", level, __file__, 1, "m", (), None)
+
+    assert DebugSampler(0.0).filter(record(logging.INFO))
+    assert not DebugSampler(0.0).filter(record(logging.DEBUG))
+    assert DebugSampler(1.0).filter(record(logging.DEBUG))
@@ -0,0 +1,74 @@
+# This is the test_profiling.py file for opt-in request profiling (X-Profile) and the profile downloads.
+import time
+
+from fastapi.testclient import TestClient
+
+from app import admin, crud
+from app.profiling import ProfileStore, _folded_stack
+
+
+def test_profiled_request_is_downloadable_as_folded_stacks(test_app_client: TestClient, monkeypatch):
+    original = crud.get_services
+
+    def slow_query(*args, **kwargs):
+        # Busy for long enough that the sampler catches the request in it
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(crud, "get_services", slow_query)
+
+    response = test_app_client.get("/services/?limit=5", headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    [summary] = test_app_client.get("/admin/profiles").json()
+    assert summary["id"] == profile_id
+    assert summary["path"] == "/services/" and summary["status"] == 200
+    assert summary["samples"] > 0
+
+    download = test_app_client.get(f"/admin/profiles/{profile_id}")
+    assert download.headers["content-disposition"] == f'attachment; filename="profile-{profile_id}.folded"'
+    lines = download.text.splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("slow_query (test_profiling.py" in line for line in lines)
+
+    assert test_app_client.get("/admin/profiles/unknown").status_code == 404
+
+def test_requests_without_the_flag_are_not_profiled(test_app_client: TestClient, monkeypatch):
+    assert "X-Profile-Id" not in test_app_client.get("/services/").headers
+    assert "X-Profile-Id" in test_app_client.get("/services/?profile=1").headers
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    assert "X-Profile-Id" not in test_app_client.get("/services/", headers={"X-Profile": "1"}).headers
+    profiled = test_app_client.get("/services/", headers={"X-Profile": "1", "X-Admin-Token": "secret"})
+    assert "X-Profile-Id" in profiled.headers
+
+def test_profiling_is_closed_without_an_admin_token(test_app_client: TestClient, monkeypatch):
+    # A deployment that sets no ADMIN_TOKEN (and is not in dev mode) does not profile anyone
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    monkeypatch.setattr(admin, "ADMIN_DEV_MODE", False)
+    assert "X-Profile-Id" not in test_app_client.get("/services/", headers={"X-Profile": "1"}).headers
+    assert "X-Profile-Id" not in test_app_client.get("/services/?profile=1", headers={"X-Admin-Token": ""}).headers
+    assert test_app_client.get("/admin/profiles").status_code == 403
+
+def test_idle_threads_are_skipped():
+    class Code:
+        def __init__(self, name, filename):
+            self.co_name, self.co_filename, self.co_firstlineno = name, filename, 1
+
+    class Frame:
+        def __init__(self, name, filename, back=None):
+            self.f_code, self.f_back = Code(name, filename), back
+
+    busy = Frame("get_services", "/app/crud.py", Frame("main", "/app/main.py"))
+    assert _folded_stack(busy) == "main (main.py:1);get_services (crud.py:1)"
+    assert _folded_stack(Frame("wait", "/usr/lib/python3.11/threading.py", busy)) is None
+
+def test_profile_store_is_bounded():
+    store = ProfileStore(maxsize=2)
+    for i in range(3):
+        store.add({"id": str(i), "folded": ""})
+    assert [profile["id"] for profile in store.summaries()] == ["2", "1"]
+    assert store.get("0") is None
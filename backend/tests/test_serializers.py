@@ -0,0 +1,53 @@
+# This is the test_serializers.py file for the fast list serializers.
+# They must produce exactly the bytes of the Pydantic response schemas they stand in for.
+import random
+
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from app import crud, serializers
+from app.models import Claimant, Service
+from app.schemas import Claimant as ClaimantSchema, Service as ServiceSchema
+
+
+def _reference(schema, objects) -> bytes:
+    # What response_model=list[schema] produces
+    adapter = TypeAdapter(list[schema])
+    return adapter.dump_json(adapter.validate_python(objects, from_attributes=True))
+
+def test_service_serializer_matches_schema(db_session_for_direct_use: Session):
+    rng = random.Random(3)
+    db = db_session_for_direct_use
+    for i in range(200):
+        latitude = rng.choice([None, round(rng.uniform(49, 59), rng.randint(0, 12)), 51.0, 51])
+        longitude = None if latitude is None else rng.uniform(-8, 2)
+        db.add(Service(
+            name=rng.choice([f"Service {i}", "Café \"Ünïcode\"   </script>", "  "]),
+            description=rng.choice([None, "", "Line one\nLine two\ttabbed"]),
+            fees=rng.choice([None, "Free", "£5"]),
+            is_free=rng.choice([None, True, False]),
+            min_cost=rng.choice([None, 0.0, 5, 0.1 + 0.2, 1e-7]),
+            latitude=latitude,
+            longitude=longitude,
+            location=None if latitude is None else {"type": "Point", "coordinates": [longitude, latitude]},
+        ))
+    db.commit()
+
+    rows = crud.get_services(db, limit=1000, columns=serializers.services.columns)
+    assert serializers.services.dump(rows) == _reference(ServiceSchema, crud.get_services(db, limit=1000))
+
+def test_claimant_serializer_matches_schema(test_app_client: TestClient, db_session_for_direct_use: Session):
+    rng = random.Random(5)
+    for i in range(50):
+        claimant = test_app_client.post("/claimants/", json={
+            "name": f"Claimant {i} ✓", "home_latitude": rng.uniform(50, 55), "home_longitude": rng.choice([-1, rng.uniform(-3, 1)]),
+        }).json()
+        if i % 2:
+            test_app_client.get(f"/claimants/{claimant['id']}/travel-extent") # Stores the polygon
+
+    db = db_session_for_direct_use
+    rows = crud.get_claimants(db, limit=1000, columns=serializers.claimants.columns)
+    expected = _reference(ClaimantSchema, crud.get_claimants(db, limit=1000))
+    assert serializers.claimants.dump(rows) == expected
+    assert test_app_client.get("/claimants/?limit=1000").content == expected
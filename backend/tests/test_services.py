@@ -1,10 +1,13 @@
 # This is the test_services.py file for service-related tests.
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 from typing import Optional
 
-from app.models import Service
+from app import crud
+from app.models import ClaimantServiceReach, Service
 # from app.schemas import ServiceCreate # Not strictly needed if using helper
 
 # Helper to create a service directly in DB for testing GET filters
@@ -15,7 +18,10 @@ def _create_service_in_db(db: Session, name: str, description: Optional[str], ca
         description=description,
         category=category,
         fees=fees,
-        location=location_json # Store as JSON if LocationType is JSON (handled by model's conditional type)
+        location=location_json, # Store as JSON if LocationType is JSON (handled by model's conditional type)
+        # Plain lat/lon columns mirror location, as crud.create_service would set them
+        longitude=location_json["coordinates"][0] if location_json else None,
+        latitude=location_json["coordinates"][1] if location_json else None,
     )
     db.add(service)
     db.commit()
@@ -91,6 +97,29 @@ def test_filter_services_by_category(test_app_client: TestClient, db_session_for
     assert len(data) == 1
     assert data[0]["name"] == "Education Service 1"
 
+def test_substring_filters_follow_service_changes(test_app_client: TestClient):
+    service_id = test_app_client.post("/services/", json={"name": "A", "category": "Health", "fees": "Free"}).json()["id"]
+    assert len(test_app_client.get("/services/?category=ealt").json()) == 1 # Loads the substring index
+
+    test_app_client.patch(f"/services/{service_id}", json={"category": "Mental Wellbeing", "fees": "£5 per session"})
+    assert test_app_client.get("/services/?category=ealt").json() == []
+    assert [s["id"] for s in test_app_client.get("/services/?category=wellbeing&fees=SESSION").json()] == [service_id]
+
+def test_substring_filters_see_writes_from_other_processes(test_app_client: TestClient, db_session_for_direct_use: Session):
+    test_app_client.post("/services/", json={"name": "A", "category": "Health"})
+    assert len(test_app_client.get("/services/?category=ealt").json()) == 1 # Loads the substring index
+
+    # Written as another worker would: the row and a services version bump, but nothing in this process's index
+    db_session_for_direct_use.add(Service(name="B", category="Mental Health"))
+    crud.bump_table_versions(db_session_for_direct_use, "services")
+    db_session_for_direct_use.commit()
+    assert [s["name"] for s in test_app_client.get("/services/?category=ealt").json()] == ["A", "B"]
+
+def test_substring_filters_keep_like_wildcards(test_app_client: TestClient):
+    test_app_client.post("/services/", json={"name": "A", "category": "Health"})
+    assert len(test_app_client.get("/services/?category=hea_th").json()) == 1
+    assert len(test_app_client.get("/services/?category=h%25th").json()) == 1
+
 def test_filter_services_by_fees(test_app_client: TestClient, db_session_for_direct_use: Session):
     _create_service_in_db(db_session_for_direct_use, name="Service A", description="DescA", category="General", fees="Free")
     _create_service_in_db(db_session_for_direct_use, name="Service B", description="DescB", category="Specific", fees="Low Cost")
@@ -128,6 +157,199 @@ def test_filter_services_by_category_and_fees(test_app_client: TestClient, db_se
     data = response.json()
     assert len(data) == 0
 
+def test_filter_services_by_cost(test_app_client: TestClient):
+    for name, fees in [("Free", "Free"), ("Cheap", "£5 per session"), ("Sliding", "Free to £50"), ("Dear", "£40"), ("Unknown", "Donations")]:
+        test_app_client.post("/services/", json={"name": name, "fees": fees})
+
+    response = test_app_client.get("/services/?max_cost=10")
+    assert response.status_code == 200
+    assert {s["name"] for s in response.json()} == {"Free", "Cheap", "Sliding"}
+    assert {s["name"] for s in test_app_client.get("/services/?free_only=true").json()} == {"Free"}
+    assert test_app_client.get("/services/?max_cost=-1").status_code == 422
+
+    # Changing fees re-parses the cost
+    cheap_id = next(s["id"] for s in response.json() if s["name"] == "Cheap")
+    updated = test_app_client.patch(f"/services/{cheap_id}", json={"fees": "£15-£25"}).json()
+    assert (updated["is_free"], updated["min_cost"], updated["max_cost"], updated["currency"]) == (False, 15.0, 25.0, "GBP")
+    assert {s["name"] for s in test_app_client.get("/services/?max_cost=10").json()} == {"Free", "Sliding"}
+
+def test_backfill_service_costs(db_session_for_direct_use: Session):
+    # Rows written directly (as before the cost columns existed) have no parsed cost yet
+    _create_service_in_db(db_session_for_direct_use, name="A", description=None, category=None, fees="£7")
+    _create_service_in_db(db_session_for_direct_use, name="B", description=None, category=None, fees="Free")
+    _create_service_in_db(db_session_for_direct_use, name="C", description=None, category=None, fees=None)
+
+    assert crud.backfill_service_costs(db_session_for_direct_use, batch_size=2) == 3
+    db_session_for_direct_use.expire_all()
+    costs = {s.name: (s.is_free, s.min_cost) for s in db_session_for_direct_use.query(Service)}
+    assert costs == {"A": (False, 7.0), "B": (True, 0.0), "C": (None, None)}
+
+def _create_located_services(client: TestClient):
+    # London (Trafalgar Square), ~3km east of it, Oxford and Manchester
+    for name, lat, lon in [
+        ("Central", 51.508, -0.128),
+        ("East", 51.508, -0.085),
+        ("Oxford", 51.752, -1.258),
+        ("Manchester", 53.480, -2.242),
+    ]:
+        assert client.post("/services/", json={"name": name, "latitude": lat, "longitude": lon}).status_code == 201
+    assert client.post("/services/", json={"name": "Nowhere"}).status_code == 201
+
+def test_filter_services_by_bbox(test_app_client: TestClient):
+    _create_located_services(test_app_client)
+
+    response = test_app_client.get("/services/?min_lat=51.0&max_lat=52.0&min_lon=-1.5&max_lon=0.5")
+    assert response.status_code == 200
+    assert {s["name"] for s in response.json()} == {"Central", "East", "Oxford"}
+
+    response = test_app_client.get("/services/?min_lat=51.4&max_lat=51.6&min_lon=-0.2&max_lon=-0.1&category=")
+    assert {s["name"] for s in response.json()} == {"Central"}
+
+def test_filter_services_by_radius(test_app_client: TestClient):
+    _create_located_services(test_app_client)
+
+    response = test_app_client.get("/services/?near=51.508,-0.128&radius_m=2000")
+    assert response.status_code == 200
+    assert {s["name"] for s in response.json()} == {"Central"}
+
+    # East is ~3km away: inside a 3.5km radius, outside a 2.5km one
+    response = test_app_client.get("/services/?near=51.508,-0.128&radius_m=3500")
+    assert {s["name"] for s in response.json()} == {"Central", "East"}
+    response = test_app_client.get("/services/?near=51.508,-0.128&radius_m=2500")
+    assert {s["name"] for s in response.json()} == {"Central"}
+
+    response = test_app_client.get("/services/?near=51.508,-0.128&radius_m=100000")
+    assert {s["name"] for s in response.json()} == {"Central", "East", "Oxford"}
+
+def test_location_filters_follow_service_updates(test_app_client: TestClient):
+    service_id = test_app_client.post("/services/", json={"name": "Mover", "latitude": 51.5, "longitude": -0.1}).json()["id"]
+    test_app_client.patch(f"/services/{service_id}", json={"latitude": 53.48, "longitude": -2.24})
+    assert test_app_client.get("/services/?near=51.5,-0.1&radius_m=5000").json() == []
+    assert [s["id"] for s in test_app_client.get("/services/?near=53.48,-2.24&radius_m=5000").json()] == [service_id]
+
+    test_app_client.patch(f"/services/{service_id}", json={"latitude": None, "longitude": None})
+    assert test_app_client.get("/services/?near=53.48,-2.24&radius_m=5000").json() == []
+
+@pytest.mark.parametrize("query", [
+    "min_lat=51&max_lat=52", # Incomplete bbox
+    "min_lat=52&max_lat=51&min_lon=0&max_lon=1", # Inverted bbox
+    "near=51.5&radius_m=100", # Missing longitude
+    "near=abc,def&radius_m=100",
+    "near=51.5,-0.1", # Missing radius
+    "near=51.5,-0.1&radius_m=-5",
+    "radius_m=100", # Radius without a centre
+])
+def test_invalid_location_filters(test_app_client: TestClient, query: str):
+    response = test_app_client.get(f"/services/?{query}")
+    assert response.status_code == 400
+
+def _read_all_pages(client: TestClient, url: str) -> list[dict]:
+    # Follows X-Next-Cursor until the last (short) page
+    pages, rows = 0, []
+    while True:
+        response = client.get(url)
+        assert response.status_code == 200
+        rows.extend(response.json())
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return rows
+        assert pages < 20, "pagination did not terminate"
+        url = f"/services/?limit=2&cursor={cursor}"
+
+@pytest.mark.parametrize("order_by", ["id", "name"])
+def test_keyset_pagination(test_app_client: TestClient, order_by: str):
+    # Duplicate names make sure the id tiebreaker keeps pages from overlapping
+    for name in ["Delta", "Alpha", "Charlie", "Alpha", "Bravo"]:
+        test_app_client.post("/services/", json={"name": name})
+
+    rows = _read_all_pages(test_app_client, f"/services/?limit=2&order_by={order_by}")
+    keys = [(s["name"], s["id"]) if order_by == "name" else s["id"] for s in rows]
+    assert keys == sorted(keys)
+    assert len({s["id"] for s in rows}) == 5
+
+def test_keyset_pagination_with_filters_and_total(test_app_client: TestClient):
+    _create_located_services(test_app_client)
+    url = "/services/?min_lat=51.0&max_lat=52.0&min_lon=-1.5&max_lon=0.5&limit=2&include_total=true"
+    response = test_app_client.get(url)
+    assert response.headers["X-Total-Count"] == "3"
+    second = test_app_client.get(f"{url}&cursor={response.headers['X-Next-Cursor']}")
+    assert {s["name"] for s in response.json() + second.json()} == {"Central", "East", "Oxford"}
+    assert "X-Next-Cursor" not in second.headers
+
+def test_keyset_sort_names_are_required(db_session_for_direct_use: Session):
+    # A NULL name would never satisfy the (name, id) > cursor comparison, so the column does not allow one
+    from sqlalchemy.exc import IntegrityError
+    db_session_for_direct_use.add(Service(name=None))
+    with pytest.raises(IntegrityError):
+        db_session_for_direct_use.commit()
+    db_session_for_direct_use.rollback()
+
+def test_total_count_explain_is_bound_by_the_dialect():
+    # The EXPLAIN behind X-Total-Count on PostgreSQL takes its parameters in the driver's own style
+    from sqlalchemy.dialects.postgresql import asyncpg, psycopg2
+    from sqlalchemy.orm import Session as PlainSession
+    from app import pagination
+    statement = crud._services_query(PlainSession(), max_cost=5).statement
+    explain = pagination._ExplainJson(statement)
+    assert str(explain.compile(dialect=asyncpg.dialect())).endswith("services.min_cost <= $1::INTEGER")
+    assert str(explain.compile(dialect=psycopg2.dialect())).startswith("EXPLAIN (FORMAT JSON) SELECT")
+
+def test_sparse_fieldsets(test_app_client: TestClient):
+    for name in ["B", "A", "C"]:
+        test_app_client.post("/services/", json={"name": name, "description": "Long text", "category": "Health"})
+
+    response = test_app_client.get("/services/?fields=category,name&limit=2&order_by=name")
+    assert response.status_code == 200
+    assert [list(s) for s in response.json()] == [["name", "category", "id"]] * 2 # Schema order, id always included
+    assert [s["name"] for s in response.json()] == ["A", "B"]
+
+    # order_by=name still paginates when name is not in the fieldset
+    first = test_app_client.get("/services/?fields=category&limit=2&order_by=name")
+    assert first.json()[0] == {"category": "Health", "id": 2}
+    second = test_app_client.get(f"/services/?fields=category&limit=2&cursor={first.headers['X-Next-Cursor']}")
+    assert second.json() == [{"category": "Health", "id": 3}]
+
+    response = test_app_client.get("/services/?fields=name,secret")
+    assert response.status_code == 400
+    assert "secret" in response.json()["detail"]
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "eyJvIjoiZmVlcyIsImsiOlsxXX0"]) # Second: unknown sort order
+def test_invalid_cursor(test_app_client: TestClient, cursor: str):
+    assert test_app_client.get(f"/services/?cursor={cursor}").status_code == 400
+
+def test_export_services(test_app_client: TestClient, monkeypatch):
+    from app import main
+    monkeypatch.setattr(main, "EXPORT_BATCH_SIZE", 2) # Several batches from the cursor
+    ids = [
+        test_app_client.post("/services/", json={"name": f"S{i}", "category": "Food" if i % 2 else "Legal", "fees": "Free", "latitude": 51.5, "longitude": -1 + i / 2}).json()["id"]
+        for i in range(5)
+    ]
+    test_app_client.post("/services/", json={"name": "No location"})
+
+    response = test_app_client.get("/services/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"] == 'attachment; filename="services.ndjson"'
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [s["name"] for s in lines] == [f"S{i}" for i in range(5)] + ["No location"]
+    assert lines == test_app_client.get("/services/").json() # Same objects as the list endpoint
+
+    response = test_app_client.get("/services/export?format=geojson&category=food")
+    assert response.headers["content-type"] == "application/geo+json"
+    collection = response.json()
+    assert collection["type"] == "FeatureCollection"
+    assert [f["id"] for f in collection["features"]] == [ids[1], ids[3]]
+    feature = collection["features"][0]
+    assert feature["geometry"] == {"type": "Point", "coordinates": [-0.5, 51.5]}
+    assert feature["properties"]["name"] == "S1" and "location" not in feature["properties"]
+
+    bbox = "min_lat=51&max_lat=52&min_lon=-1&max_lon=-0.5"
+    assert [s["id"] for s in map(json.loads, test_app_client.get(f"/services/export?{bbox}").text.splitlines())] == ids[:2]
+    assert test_app_client.get("/services/export?format=geojson&category=none").json() == {"type": "FeatureCollection", "features": []}
+    assert test_app_client.get("/services/export?format=csv").status_code == 422
+    assert test_app_client.get("/services/export?min_lat=51").status_code == 400
+
 # Tests for US6: /services/within/claimant/{claimant_id}
 def test_get_services_within_claimant_area_not_found(test_app_client: TestClient):
     response = test_app_client.get("/services/within/claimant/9999") # Non-existent claimant
@@ -147,32 +369,122 @@ def test_get_services_within_claimant_area_no_extent(test_app_client: TestClient
     assert response.json()["detail"] == "Claimant does not have a defined travel extent"
 
 
-def test_get_services_within_claimant_area_test_mode_empty(test_app_client: TestClient, db_session_for_direct_use: Session):
-    # Create a claimant with a (dummy) travel extent
-    # In test mode, USE_GEOMETRY is false, so get_services_within_geojson returns []
-    # from app.models import Claimant as ClaimantModel # Not needed directly
-    # from app.crud import create_circular_buffer_geojson # Not needed directly
-
-    # We need to use the actual claimant creation logic from crud to get the extent generated
-    # Or manually create one that looks like it.
-    # For this test, let's simulate a claimant with an extent.
-    # The actual extent data doesn't matter much here as the spatial query is skipped.
-
+def test_get_services_within_claimant_area_json_mode(test_app_client: TestClient, db_session_for_direct_use: Session):
+    # Answered from the materialized reachability table, which crud keeps up to date on every write.
     # Create claimant using the app's endpoint to ensure travel_extent is generated
     claimant_data = {"name": "Extent Claimant", "home_latitude": 51.5, "home_longitude": -0.1}
     create_claimant_response = test_app_client.post("/claimants/", json=claimant_data) # This uses its own session via override
     assert create_claimant_response.status_code == 200
-    created_claimant = create_claimant_response.json()
-    claimant_id = created_claimant["id"]
+    claimant_id = create_claimant_response.json()["id"]
 
-    # Create some services (their locations don't matter for this specific test case in JSON mode)
+    # Services inserted directly in the DB bypass crud, so the reachability table has to be rebuilt
     _create_service_in_db(db_session_for_direct_use, name="Service Alpha", description="D_A", category="C1", fees="F1", location_json={"type": "Point", "coordinates": [-0.1, 51.5]})
-    _create_service_in_db(db_session_for_direct_use, name="Service Beta", description="D_B", category="C2", fees="F2", location_json={"type": "Point", "coordinates": [0.0, 51.6]})
+    _create_service_in_db(db_session_for_direct_use, name="Service Beta", description="D_B", category="C2", fees="F2", location_json={"type": "Point", "coordinates": [0.0, 51.6]}) # ~8 miles away
+    _create_service_in_db(db_session_for_direct_use, name="Service Gamma", description="D_G", category="C3", fees="F3") # No location
+    assert test_app_client.get(f"/services/within/claimant/{claimant_id}").json() == []
+    assert crud.rebuild_reachability(db_session_for_direct_use) == 1
 
     response = test_app_client.get(f"/services/within/claimant/{claimant_id}")
     assert response.status_code == 200
-    # Because USE_GEOMETRY is False in testing, crud.get_services_within_geojson returns []
-    assert response.json() == []
+    assert [s["name"] for s in response.json()] == ["Service Alpha"]
+
+def test_services_within_claimant_area_follows_service_changes(test_app_client: TestClient):
+    claimant_id = test_app_client.post("/claimants/", json={"name": "Index Claimant", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+    # Load the index before making changes so that create/update/delete have to maintain it
+    assert test_app_client.get(f"/services/within/claimant/{claimant_id}").json() == []
+
+    near_id = test_app_client.post("/services/", json={"name": "Near", "latitude": 51.51, "longitude": -0.11}).json()["id"]
+    far_id = test_app_client.post("/services/", json={"name": "Far", "latitude": 52.5, "longitude": -1.5}).json()["id"]
+    assert [s["id"] for s in test_app_client.get(f"/services/within/claimant/{claimant_id}").json()] == [near_id]
+
+    # Move the far service into the area and the near one out of it
+    test_app_client.patch(f"/services/{far_id}", json={"latitude": 51.49, "longitude": -0.09})
+    test_app_client.patch(f"/services/{near_id}", json={"latitude": 53.0, "longitude": -2.0})
+    assert [s["id"] for s in test_app_client.get(f"/services/within/claimant/{claimant_id}").json()] == [far_id]
+
+    test_app_client.delete(f"/services/{far_id}")
+    assert test_app_client.get(f"/services/within/claimant/{claimant_id}").json() == []
+
+def test_conditional_get_services_within_claimant_area(test_app_client: TestClient):
+    claimant_id = test_app_client.post("/claimants/", json={"name": "E", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+    url = f"/services/within/claimant/{claimant_id}"
+    etag = test_app_client.get(url).headers["ETag"]
+    assert test_app_client.get(url, headers={"If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+
+    test_app_client.post("/services/", json={"name": "Nearby", "latitude": 51.5, "longitude": -0.1})
+    response = test_app_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [s["name"] for s in response.json()] == ["Nearby"]
+
+    test_app_client.delete(f"/claimants/{claimant_id}")
+    assert test_app_client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 404
+
+def test_services_within_caseload(test_app_client: TestClient, db_session_for_direct_use: Session):
+    from app.models import Claimant as ClaimantModel
+    free_id = test_app_client.post("/services/", json={"name": "Free", "category": "Food", "fees": "Free", "latitude": 51.5, "longitude": -0.1}).json()["id"]
+    paid_id = test_app_client.post("/services/", json={"name": "Paid", "category": "Legal", "fees": "£20", "latitude": 51.51, "longitude": -0.1}).json()["id"]
+    leeds_id = test_app_client.post("/services/", json={"name": "Leeds", "category": "Food", "latitude": 53.8, "longitude": -1.55}).json()["id"]
+    london_id = test_app_client.post("/claimants/", json={"name": "London", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+    yorkshire_id = test_app_client.post("/claimants/", json={"name": "Leeds", "home_latitude": 53.8, "home_longitude": -1.55}).json()["id"]
+    no_extent = ClaimantModel(name="No Extent", home_latitude=0, home_longitude=0)
+    db_session_for_direct_use.add(no_extent)
+    db_session_for_direct_use.commit()
+
+    # One group per requested claimant, in request order, with the same services as the single-claimant endpoint
+    response = test_app_client.post("/claimants/services-within", json={"claimant_ids": [yorkshire_id, 9999, london_id, no_extent.id]})
+    assert response.status_code == 200
+    groups = response.json()
+    assert [(g["claimant_id"], g["status"]) for g in groups] == [(yorkshire_id, 200), (9999, 404), (london_id, 200), (no_extent.id, 400)]
+    assert [s["id"] for s in groups[0]["services"]] == [leeds_id]
+    assert groups[1]["services"] == [] and groups[3]["services"] == []
+    assert groups[2]["services"] == test_app_client.get(f"/services/within/claimant/{london_id}").json()
+    assert [s["id"] for s in groups[2]["services"]] == [free_id, paid_id]
+
+    # The list filters apply to every claimant's services
+    def service_ids(**filters):
+        groups = test_app_client.post("/claimants/services-within", json={"claimant_ids": [london_id, yorkshire_id], **filters}).json()
+        return [[s["id"] for s in g["services"]] for g in groups]
+    assert service_ids(category="food") == [[free_id], [leeds_id]]
+    assert service_ids(free_only=True) == [[free_id], []]
+    assert service_ids(max_cost=50) == [[free_id, paid_id], []]
+
+    assert test_app_client.post("/claimants/services-within", json={"claimant_ids": [london_id, london_id]}).status_code == 400
+    assert test_app_client.post("/claimants/services-within", json={"claimant_ids": [london_id], "max_cost": -1}).status_code == 422
+    assert test_app_client.post("/claimants/services-within", json={"claimant_ids": []}).json() == []
+
+def test_services_within_caseload_streams_in_chunks(test_app_client: TestClient, monkeypatch):
+    from app import main
+    monkeypatch.setattr(main, "CASELOAD_CHUNK", 2)
+    service_id = test_app_client.post("/services/", json={"name": "Near", "latitude": 51.5, "longitude": -0.1}).json()["id"]
+    claimant_ids = [
+        test_app_client.post("/claimants/", json={"name": f"C{i}", "home_latitude": 51.5, "home_longitude": -0.1}).json()["id"]
+        for i in range(5)
+    ]
+    groups = test_app_client.post("/claimants/services-within", json={"claimant_ids": claimant_ids}).json()
+    assert [g["claimant_id"] for g in groups] == claimant_ids
+    assert all([s["id"] for s in g["services"]] == [service_id] for g in groups)
+
+def test_reachability_follows_claimant_changes(test_app_client: TestClient, db_session_for_direct_use: Session):
+    london_id = test_app_client.post("/services/", json={"name": "London", "latitude": 51.5, "longitude": -0.1}).json()["id"]
+    leeds_id = test_app_client.post("/services/", json={"name": "Leeds", "latitude": 53.8, "longitude": -1.55}).json()["id"]
+
+    # A new claimant picks up existing services
+    claimant_id = test_app_client.post("/claimants/", json={"name": "Mover", "home_latitude": 51.51, "home_longitude": -0.11}).json()["id"]
+    assert [s["id"] for s in test_app_client.get(f"/services/within/claimant/{claimant_id}").json()] == [london_id]
+
+    # Renaming does not touch the extent; moving home does
+    test_app_client.patch(f"/claimants/{claimant_id}", json={"name": "Renamed"})
+    assert [s["id"] for s in test_app_client.get(f"/services/within/claimant/{claimant_id}").json()] == [london_id]
+    test_app_client.patch(f"/claimants/{claimant_id}", json={"home_latitude": 53.81, "home_longitude": -1.56})
+    assert [s["id"] for s in test_app_client.get(f"/services/within/claimant/{claimant_id}").json()] == [leeds_id]
+
+    # Incremental maintenance and a full rebuild agree
+    incremental = set(db_session_for_direct_use.query(ClaimantServiceReach.claimant_id, ClaimantServiceReach.service_id))
+    assert crud.rebuild_reachability(db_session_for_direct_use) == len(incremental)
+    assert set(db_session_for_direct_use.query(ClaimantServiceReach.claimant_id, ClaimantServiceReach.service_id)) == incremental
+
+    test_app_client.delete(f"/claimants/{claimant_id}")
+    assert db_session_for_direct_use.query(ClaimantServiceReach).count() == 0
 
 # Tests for US7: POST /services/
 def test_create_new_service_no_location(test_app_client: TestClient, db_session_for_direct_use: Session):
@@ -333,3 +645,42 @@ def test_delete_service(test_app_client: TestClient, db_session_for_direct_use:
 def test_delete_non_existent_service(test_app_client: TestClient):
     response = test_app_client.delete("/services/99999")
     assert response.status_code == 404
+
+def test_batch_update_services(test_app_client: TestClient, db_session_for_direct_use: Session):
+    ids = [test_app_client.post("/services/", json={"name": f"S{i}", "category": "Old"}).json()["id"] for i in range(3)]
+    claimant = test_app_client.post("/claimants/", json={"name": "A", "home_latitude": 51.5, "home_longitude": -0.1}).json()
+    etag = test_app_client.get("/services/").headers["ETag"]
+
+    response = test_app_client.patch("/services/batch", json=[
+        {"id": ids[0], "category": "New"},
+        {"id": ids[1], "category": "New"}, # Same change as the first: one UPDATE for both
+        {"id": ids[2], "fees": "Free", "latitude": 51.5, "longitude": -0.1},
+        {"id": 99999, "category": "New"},
+    ])
+    assert response.status_code == 200
+    assert response.json() == {
+        "applied": 3, "not_found": 1,
+        "results": [{"id": ids[0], "status": 200}, {"id": ids[1], "status": 200}, {"id": ids[2], "status": 200}, {"id": 99999, "status": 404}],
+    }
+    rows = {s.id: s for s in db_session_for_direct_use.query(Service)}
+    assert [rows[i].category for i in ids] == ["New", "New", "Old"]
+    assert rows[ids[2]].is_free is True and rows[ids[2]].version == 2
+    # Moving a service refreshes its reachability, and the lists are invalidated
+    assert [s["id"] for s in test_app_client.get(f"/services/within/claimant/{claimant['id']}").json()] == [ids[2]]
+    assert test_app_client.get("/services/", headers={"If-None-Match": etag}).status_code == 200
+    assert [s["id"] for s in test_app_client.get("/services/?category=new").json()] == ids[:2]
+
+def test_batch_delete_services(test_app_client: TestClient, db_session_for_direct_use: Session):
+    ids = [test_app_client.post("/services/", json={"name": f"S{i}", "latitude": 51.5, "longitude": -0.1}).json()["id"] for i in range(3)]
+    claimant = test_app_client.post("/claimants/", json={"name": "A", "home_latitude": 51.5, "home_longitude": -0.1}).json()
+
+    response = test_app_client.request("DELETE", "/services/batch", json=[ids[0], 99999, ids[2]])
+    assert response.json()["results"] == [{"id": ids[0], "status": 200}, {"id": 99999, "status": 404}, {"id": ids[2], "status": 200}]
+    assert [s.id for s in db_session_for_direct_use.query(Service)] == [ids[1]]
+    assert db_session_for_direct_use.query(ClaimantServiceReach).count() == 1
+    assert [s["id"] for s in test_app_client.get(f"/services/within/claimant/{claimant['id']}").json()] == [ids[1]]
+
+def test_batch_rejects_duplicates_and_oversized_batches(test_app_client: TestClient):
+    assert test_app_client.request("DELETE", "/services/batch", json=[1, 1]).status_code == 400
+    assert test_app_client.patch("/services/batch", json=[{"id": i} for i in range(1001)]).status_code == 400
+    assert test_app_client.patch("/services/batch", json=[{"name": "no id"}]).status_code == 422
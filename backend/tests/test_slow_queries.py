@@ -0,0 +1,49 @@
+# This is the test_slow_queries.py file for the slow-query plan recorder and its admin endpoint.
+from fastapi.testclient import TestClient
+
+from app import admin
+from app.slow_queries import slow_queries
+
+
+def test_slow_selects_are_explained(test_app_client: TestClient, monkeypatch):
+    claimant = test_app_client.post("/claimants/", json={"name": "A", "home_latitude": 51.5, "home_longitude": -0.1}).json()
+    test_app_client.delete("/admin/slow-queries")
+    monkeypatch.setattr(slow_queries, "threshold_ms", 0) # Every statement counts as slow
+    monkeypatch.setattr(slow_queries, "sample_rate", 1.0)
+
+    test_app_client.get(f"/claimants/{claimant['id']}")
+
+    log = test_app_client.get("/admin/slow-queries").json()
+    assert log["threshold_ms"] == 0 and log["sample_rate"] == 1.0
+    assert log["slow_statements"] >= len(log["entries"]) > 0
+    lookup = next(entry for entry in log["entries"] if "FROM claimants" in entry["statement"])
+    assert lookup["dialect"] == "sqlite"
+    assert "claimants" in lookup["plan"] # e.g. "SEARCH claimants USING INTEGER PRIMARY KEY (rowid=?)"
+    assert all(entry["statement"].lstrip().upper().startswith(("SELECT", "WITH")) for entry in log["entries"])
+
+    assert test_app_client.delete("/admin/slow-queries").status_code == 204
+    monkeypatch.setattr(slow_queries, "threshold_ms", 10_000)
+    assert test_app_client.get("/admin/slow-queries").json()["entries"] == []
+
+def test_unsampled_slow_statements_are_only_counted(test_app_client: TestClient, monkeypatch):
+    monkeypatch.setattr(slow_queries, "threshold_ms", 0)
+    monkeypatch.setattr(slow_queries, "sample_rate", 0.0)
+    test_app_client.get("/services/")
+    monkeypatch.setattr(slow_queries, "threshold_ms", 10_000)
+    log = test_app_client.get("/admin/slow-queries").json()
+    assert log["slow_statements"] > 0
+    assert log["entries"] == []
+
+def test_admin_token(test_app_client: TestClient, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    assert test_app_client.get("/admin/slow-queries").status_code == 403
+    assert test_app_client.get("/admin/slow-queries", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert test_app_client.get("/admin/slow-queries", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+def test_closed_without_an_admin_token(test_app_client: TestClient, monkeypatch):
+    # Captured statements carry literal values and plans, so a deployment without ADMIN_TOKEN does not serve them
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    monkeypatch.setattr(admin, "ADMIN_DEV_MODE", False)
+    assert test_app_client.get("/admin/slow-queries").status_code == 403
+    assert test_app_client.get("/admin/slow-queries", headers={"X-Admin-Token": ""}).status_code == 403
+    assert test_app_client.delete("/admin/slow-queries").status_code == 403
@@ -0,0 +1,65 @@
+# This is the test_spatial_index.py file for the in-process spatial index.
+import random
+
+from app.crud import create_circular_buffer_geojson
+from app.spatial_index import GridIndex, radius_bbox
+
+
+def test_query_geojson_filters_by_bbox_then_polygon():
+    index = GridIndex()
+    index.insert(1, -0.1, 51.5)   # Centre of the extent
+    index.insert(2, -0.03, 51.57) # Inside the bounding box but outside the circle
+    index.insert(3, 1.0, 52.0)    # Well outside
+    extent = create_circular_buffer_geojson(51.5, -0.1, 5.0)
+
+    assert index.query_bbox(-0.2, 51.4, 0.0, 51.6) == [1, 2]
+    assert index.query_geojson(extent) == [1]
+
+def test_insert_remove_and_move():
+    index = GridIndex()
+    index.insert(1, -0.1, 51.5)
+    index.insert(1, 2.0, 48.0) # Moving an id replaces its old point
+    assert len(index) == 1
+    assert index.query_bbox(-1, 51, 0, 52) == []
+    assert index.query_bbox(1, 47, 3, 49) == [1]
+    index.remove(1)
+    index.remove(1) # Removing twice is a no-op
+    assert len(index) == 0
+
+def test_query_geojson_matches_brute_force():
+    rng = random.Random(42)
+    index = GridIndex()
+    points = {}
+    for item_id in range(5000):
+        points[item_id] = (rng.uniform(-3.0, 1.0), rng.uniform(50.5, 53.5))
+        index.insert(item_id, *points[item_id])
+
+    extent = create_circular_buffer_geojson(51.5, -0.1, 20.0)
+    from shapely.geometry import Point, shape
+    polygon = shape(extent)
+    expected = sorted(i for i, (lon, lat) in points.items() if polygon.contains(Point(lon, lat)))
+    assert sorted(index.query_geojson(extent)) == expected
+
+def test_iter_nearest_matches_brute_force():
+    from itertools import islice
+    from app.spatial_index import haversine_m
+
+    rng = random.Random(7)
+    index = GridIndex()
+    points = {}
+    for item_id in range(3000):
+        points[item_id] = (rng.uniform(-3.0, 1.0), rng.uniform(50.5, 53.5))
+        index.insert(item_id, *points[item_id])
+
+    for lon, lat in [(-0.1, 51.5), (-2.9, 53.4), (5.0, 60.0)]: # The last one is outside the data entirely
+        expected = sorted((haversine_m(lon, lat, *p), i) for i, p in points.items())[:25]
+        assert [item_id for _, item_id in islice(index.iter_nearest(lon, lat), 25)] == [i for _, i in expected]
+
+    # Exhausting the iterator yields every point exactly once
+    assert sorted(item_id for _, item_id in index.iter_nearest(-0.1, 51.5)) == sorted(points)
+    assert list(GridIndex().iter_nearest(-0.1, 51.5)) == []
+
+def test_radius_bbox_covers_geodesic_radius():
+    # A degree of latitude is as short as 110,574m on the spheroid, so the box must reach further than radius / 111,320m
+    min_lon, min_lat, max_lon, max_lat = radius_bbox(-0.1, 51.5, 8000)
+    assert max_lat - 51.5 >= 8000 / 110_574 and 51.5 - min_lat >= 8000 / 110_574
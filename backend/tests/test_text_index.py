@@ -0,0 +1,29 @@
+# This is the test_text_index.py file for the in-process substring index.
+import random
+
+from app.text_index import NgramIndex
+
+
+def test_search_is_case_insensitive_substring_match():
+    index = NgramIndex()
+    for value in ["Mental Health", "Health", "Education", "Housing"]:
+        index.add(value)
+    index.add("Health") # Adding a value twice is a no-op
+    assert len(index) == 4
+
+    assert sorted(index.search("HEALTH")) == ["Health", "Mental Health"]
+    assert index.search("ntal he") == ["Mental Health"]
+    assert sorted(index.search("o")) == ["Education", "Housing"] # Shorter than a trigram
+    assert index.search("Healthy") == []
+    assert index.search("thlae") == [] # Shares trigrams with nothing in this order
+
+def test_search_matches_brute_force():
+    rng = random.Random(7)
+    values = {"".join(rng.choice("abcAB £0") for _ in range(rng.randint(1, 12))) for _ in range(500)}
+    index = NgramIndex()
+    for value in values:
+        index.add(value)
+
+    for needle in ["a", "ab", "aba", "b a", "£0", "bca", "AbCa", "zzz"]:
+        expected = {value for value in values if needle.lower() in value.lower()}
+        assert set(index.search(needle)) == expected
@@ -0,0 +1,160 @@
+# This is the test_tiles.py file for the vector tile encoder and /tiles/services endpoint.
+import struct
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import crud, tiles
+from app.models import Service
+
+# Tile z/x/y containing central London at zoom 10
+LONDON = (10, 511, 340)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+def _fields(data: bytes):
+    # (field number, value) pairs of a protobuf message; length-delimited values are left as bytes
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = struct.unpack("<d", data[pos:pos + 8])[0], pos + 8
+        else:
+            length, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        yield field, value
+
+def _packed(data: bytes) -> list[int]:
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = _read_varint(data, pos)
+        values.append(value)
+    return values
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+def decode_tile(data: bytes) -> dict:
+    # {layer name: (extent, [(id, (x, y), properties)])} for tiles of point features
+    layers = {}
+    for _, layer in _fields(data):
+        name, extent, keys, values, features = None, None, [], [], []
+        for field, value in _fields(layer):
+            if field == 1:
+                name = value.decode()
+            elif field == 2:
+                features.append(dict(_fields(value)))
+            elif field == 3:
+                keys.append(value.decode())
+            elif field == 4:
+                (value_field, decoded), = _fields(value)
+                values.append({1: lambda v: v.decode(), 6: _unzigzag, 7: bool}.get(value_field, lambda v: v)(decoded))
+            elif field == 5:
+                extent = value
+        decoded_features = []
+        for feature in features:
+            tags = _packed(feature.get(2, b""))
+            command, x, y = _packed(feature[4])
+            assert command == 9 and feature[3] == 1 # MoveTo one POINT
+            properties = {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])}
+            decoded_features.append((feature[1], (_unzigzag(x), _unzigzag(y)), properties))
+        layers[name] = (extent, decoded_features)
+    return layers
+
+
+def test_tile_projection():
+    assert tiles.tile_bounds(0, 0, 0) == pytest.approx((-180, -tiles.MAX_LATITUDE, 180, tiles.MAX_LATITUDE))
+    min_lon, min_lat, max_lon, max_lat = tiles.tile_bounds(*LONDON)
+    assert min_lon < -0.1 < max_lon and min_lat < 51.5 < max_lat
+    # The tile's corners map to its coordinate range
+    assert tiles.tile_point(min_lon, max_lat, *LONDON) == (0, 0)
+    assert tiles.tile_point(max_lon, min_lat, *LONDON) == (tiles.EXTENT, tiles.EXTENT)
+    buffered = tiles.tile_bounds(*LONDON, buffer=tiles.BUFFER)
+    assert tiles.tile_point(buffered[0], buffered[3], *LONDON) == (-tiles.BUFFER, -tiles.BUFFER)
+
+def test_encode_points():
+    data = tiles.encode_points("services", [
+        (1, 10, -5, {"name": "A", "category": None, "is_free": True, "count": -3, "cost": 2.5}),
+        (2, 4096, 0, {"name": "A", "count": 7}),
+    ])
+    extent, features = decode_tile(data)["services"]
+    assert extent == tiles.EXTENT
+    assert features == [
+        (1, (10, -5), {"name": "A", "is_free": True, "count": -3, "cost": 2.5}),
+        (2, (4096, 0), {"name": "A", "count": 7}),
+    ]
+    assert tiles.encode_points("services", []) == b""
+
+def test_service_tiles(test_app_client: TestClient):
+    clinic = test_app_client.post("/services/", json={"name": "Clinic", "category": "Health", "fees": "Free", "latitude": 51.5, "longitude": -0.1}).json()
+    food = test_app_client.post("/services/", json={"name": "Food bank", "category": "Food", "latitude": 51.51, "longitude": -0.12}).json()
+    test_app_client.post("/services/", json={"name": "Leeds", "latitude": 53.8, "longitude": -1.55})
+    test_app_client.post("/services/", json={"name": "No location"})
+
+    url = "/tiles/services/{}/{}/{}.mvt".format(*LONDON)
+    response = test_app_client.get(url)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == tiles.MEDIA_TYPE
+    _, features = decode_tile(response.content)[tiles.LAYER]
+    assert [(feature_id, properties) for feature_id, _, properties in features] == [
+        (clinic["id"], {"name": "Clinic", "category": "Health", "fees": "Free", "is_free": True}),
+        (food["id"], {"name": "Food bank", "category": "Food"}),
+    ]
+    assert features[0][1] == tiles.tile_point(-0.1, 51.5, *LONDON)
+    # The whole world at zoom 0 has every located service
+    assert len(decode_tile(test_app_client.get("/tiles/services/0/0/0.mvt").content)[tiles.LAYER][1]) == 3
+
+    _, features = decode_tile(test_app_client.get(url + "?category=foo").content)[tiles.LAYER]
+    assert [feature_id for feature_id, _, _ in features] == [food["id"]]
+    _, features = decode_tile(test_app_client.get(url + "?free_only=true").content)[tiles.LAYER]
+    assert [feature_id for feature_id, _, _ in features] == [clinic["id"]]
+    assert test_app_client.get("/tiles/services/10/0/0.mvt").content == b"" # Nothing there
+
+    assert test_app_client.get("/tiles/services/1/2/0.mvt").status_code == 400
+    assert test_app_client.get("/tiles/services/23/0/0.mvt").status_code == 400
+
+def test_service_tiles_follow_changes(test_app_client: TestClient):
+    service = test_app_client.post("/services/", json={"name": "Clinic", "latitude": 51.5, "longitude": -0.1}).json()
+    url = "/tiles/services/{}/{}/{}.mvt".format(*LONDON)
+    response = test_app_client.get(url)
+    assert test_app_client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    # Moving the service out of the tile bumps the services version, so neither the ETag nor the cache serve the old tile
+    test_app_client.patch(f"/services/{service['id']}", json={"latitude": 53.8, "longitude": -1.55})
+    moved = test_app_client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert moved.status_code == 200
+    assert moved.content == b""
+
+def test_service_tiles_see_writes_from_other_processes(test_app_client: TestClient, db_session_for_direct_use: Session):
+    kept = test_app_client.post("/services/", json={"name": "Kept", "latitude": 51.5, "longitude": -0.1}).json()
+    gone = test_app_client.post("/services/", json={"name": "Gone", "latitude": 51.51, "longitude": -0.12}).json()
+    url = "/tiles/services/{}/{}/{}.mvt".format(*LONDON)
+    response = test_app_client.get(url) # Loads the spatial index and caches the tile
+    assert [feature_id for feature_id, _, _ in decode_tile(response.content)[tiles.LAYER][1]] == [kept["id"], gone["id"]]
+
+    # Written as another worker would, through its own session: the rows and a services version
+    # bump, but nothing in this process's spatial index or response cache
+    with Session(db_session_for_direct_use.get_bind()) as other:
+        added = Service(name="Added", location={"type": "Point", "coordinates": [-0.11, 51.49]}, latitude=51.49, longitude=-0.11)
+        other.add(added)
+        other.query(Service).filter(Service.id == gone["id"]).delete()
+        crud.bump_table_versions(other, "services")
+        other.commit()
+        added_id = added.id
+
+    fresh = test_app_client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert fresh.status_code == 200
+    assert [feature_id for feature_id, _, _ in decode_tile(fresh.content)[tiles.LAYER][1]] == [kept["id"], added_id]
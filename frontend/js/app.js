@@ -25,8 +25,32 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
-    // Render services to the page
-    function renderServices(services) {
+    // Service locations on the map come from vector tiles, so only what is visible at each zoom level is
+    // loaded and drawn, however many services there are. The list beside the map still comes from /services/.
+    function serviceTileUrl(filters = {}) {
+        const queryParams = new URLSearchParams();
+        if (filters.category) queryParams.append('category', filters.category);
+        if (filters.fees) queryParams.append('fees', filters.fees);
+        const query = queryParams.toString();
+        return `${API_BASE_URL}/tiles/services/{z}/{x}/{y}.mvt${query ? '?' + query : ''}`;
+    }
+    let currentTileUrl = serviceTileUrl();
+    const serviceTileLayer = L.vectorGrid.protobuf(currentTileUrl, {
+        vectorTileLayerStyles: {
+            services: {radius: 6, weight: 1, color: '#1f5fa8', fill: true, fillColor: '#3388ff', fillOpacity: 0.8}
+        },
+        interactive: true
+    }).addTo(map);
+    serviceTileLayer.on('click', function (event) {
+        const properties = event.layer.properties;
+        L.popup()
+            .setLatLng(event.latlng)
+            .setContent(`<b>${properties.name}</b><br>${properties.category || ''}`)
+            .openOn(map);
+    });
+
+    // Render services to the page; markers are only drawn for small sets such as a claimant's area
+    function renderServices(services, showMarkers = true) {
         clearMapMarkers(); // Clear existing markers first
         serviceList.innerHTML = ''; // Clear existing service list content
 
@@ -71,7 +95,7 @@ document.addEventListener('DOMContentLoaded', function () {
             serviceList.appendChild(cardDiv.firstChild); // Append the card (div.card.mb-3)
 
             // Add marker to map if location data is available
-            if (service.location && service.location.type === "Point" && service.location.coordinates) {
+            if (showMarkers && service.location && service.location.type === "Point" && service.location.coordinates) {
                 const [lon, lat] = service.location.coordinates;
                 if (typeof lat === 'number' && typeof lon === 'number') {
                     const marker = L.marker([lat, lon]) // Leaflet uses [lat, lon]
@@ -91,19 +115,31 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 
     // Fetch and display services (now with filters)
+    let currentServiceFilters = {}; // Remembered so panning the map can refetch with the same filters
     async function fetchServices(filters = {}) {
+        currentServiceFilters = filters;
         try {
             const queryParams = new URLSearchParams();
             if (filters.category) queryParams.append('category', filters.category);
             if (filters.fees) queryParams.append('fees', filters.fees);
-            // Add location filters to queryParams when implemented
+            // Only load the services inside the current map viewport
+            const bounds = map.getBounds();
+            queryParams.append('min_lat', bounds.getSouth());
+            queryParams.append('max_lat', bounds.getNorth());
+            queryParams.append('min_lon', bounds.getWest());
+            queryParams.append('max_lon', bounds.getEast());
 
             const response = await fetch(`${API_BASE_URL}/services/?${queryParams.toString()}`);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             const services = await response.json();
-            renderServices(services);
+            renderServices(services, false); // The tile layer draws them on the map
+            const tileUrl = serviceTileUrl(filters);
+            if (tileUrl !== currentTileUrl) { // Redraw the tiles only when the filters change
+                currentTileUrl = tileUrl;
+                serviceTileLayer.setUrl(tileUrl);
+            }
         } catch (error) {
             console.error("Could not fetch services:", error);
             serviceList.innerHTML = '<p class="text-danger">Failed to load services.</p>';
@@ -113,6 +149,14 @@ document.addEventListener('DOMContentLoaded', function () {
     // Initial fetch of services (no filters)
     fetchServices();
 
+    // Refetch the viewport when the map is panned or zoomed, unless a claimant's area is being shown
+    map.on('moveend', function () {
+        const selectedClaimant = document.getElementById('claimant-select');
+        if (!selectedClaimant || !selectedClaimant.value) {
+            fetchServices(currentServiceFilters);
+        }
+    });
+
     // Handle filter form submission
     const filterForm = document.getElementById('filter-form');
     if (filterForm) {
@@ -167,7 +211,8 @@ document.addEventListener('DOMContentLoaded', function () {
 
     async function fetchClaimants() {
         try {
-            const response = await fetch(`${API_BASE_URL}/claimants/`);
+            // The polygon is fetched separately when a claimant is selected, so leave it out of the list
+            const response = await fetch(`${API_BASE_URL}/claimants/?include_extent=false`);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
@@ -192,8 +237,8 @@ document.addEventListener('DOMContentLoaded', function () {
             const li = document.createElement('li');
             li.className = 'list-group-item';
             let content = `ID: ${claimant.id}, Name: ${claimant.name}, Home: (${claimant.home_latitude}, ${claimant.home_longitude})`;
-            if (claimant.travel_extent_geojson) {
-                content += ` (Travel extent defined)`;
+            if (claimant.travel_radius_m) {
+                content += ` (Travel radius: ${(claimant.travel_radius_m / 1609.344).toFixed(1)} miles)`;
             } else {
                 content += ` (No travel extent defined)`;
             }
@@ -646,9 +691,11 @@ document.addEventListener('DOMContentLoaded', function () {
             }
 
             if (!claimantId) {
+                serviceTileLayer.addTo(map); // Back to every service, drawn from tiles
                 fetchServices(); // No claimant selected, show all services (or based on filters)
                 return;
             }
+            map.removeLayer(serviceTileLayer); // Only the claimant's services are shown, as markers
 
             // Fetch claimant details to get travel_extent_geojson
             // This assumes the claimant data in the dropdown option is sufficient
@@ -667,8 +714,18 @@ document.addEventListener('DOMContentLoaded', function () {
                 return;
             }
 
-            if (claimant && claimant.travel_extent_geojson) {
-                travelAreaLayer = L.geoJSON(claimant.travel_extent_geojson, {
+            // The travel area polygon is generated on demand by the backend, so ask for it if the
+            // claimant list did not already include it
+            let travelExtent = claimant ? claimant.travel_extent_geojson : null;
+            if (claimant && !travelExtent) {
+                const extentResp = await fetch(`${API_BASE_URL}/claimants/${claimantId}/travel-extent`);
+                if (extentResp.ok) {
+                    travelExtent = await extentResp.json();
+                }
+            }
+
+            if (travelExtent) {
+                travelAreaLayer = L.geoJSON(travelExtent, {
                     style: function (feature) {
                         return {color: "#ff7800", weight: 2, opacity: 0.65, fillOpacity: 0.1};
                     }
@@ -695,7 +752,8 @@ document.addEventListener('DOMContentLoaded', function () {
     // Modify fetchClaimants to also populate the dropdown
     async function fetchClaimants() { // Original fetchClaimants is modified
         try {
-            const response = await fetch(`${API_BASE_URL}/claimants/`);
+            // The polygon is fetched separately when a claimant is selected, so leave it out of the list
+            const response = await fetch(`${API_BASE_URL}/claimants/?include_extent=false`);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }